@@ -10,15 +10,18 @@ import subprocess
 import csv
 import os
 import os.path
-import rpy2.robjects as robjects
 import timeit 
 import time
 import sys
-from scipy.stats import ks_2samp       
-from scipy.stats import chi2_contingency
-from scipy.stats import spearmanr
-from scipy.stats import fisher_exact
-import numpy as np
+import multiprocessing
+import threading
+import bisect
+import mmap
+import array
+import re
+import hashlib
+import json
+import resource
 
 help_txt="""
 python asapa.py-----help:
@@ -32,6 +35,7 @@ Preparation: the subreads files were processed using pbCCS, Lima, and SUPPA2
 \t\t-max_fuzzy_TSS      \tdefault=5,  Max fuzzy TSS dist
 \t\t-max_fuzzy_PAS      \tdefault=5,  Max fuzzy PAS dist
 \t\t-max_fuzzy_junction \tdefault=5,  Max fuzzy junction dist(from cDNA_cupcake)
+\t\t-ccs_chunk          \tdefault=1,  split each subreads.bam into N ccs --chunk jobs, merged by pbmerge
 
 Function1: AS vs AS
 \tUsage: python asapa.py AS_AS 
@@ -39,6 +43,7 @@ Function1: AS vs AS
 \t\t-min_ccsnum         \tdefault=10, min ccs number in AS1(2)form1(2)
 \t\t-min_dSegmentlen    \tdefault=10, min AS differential segment length
 \t\t-min_ccs_usage      \tdefault=0, min ccs usage(used/geneccs)
+\t\t-evidence_bam       \tdefault=slice, slice: per-event bam from minimap.sort.bam, realign: minimap2 per event, none: skip part_ccs2ref
 
 Function2: AS vs ATI 
 \tUsage: python asapa.py AS_ATI
@@ -46,6 +51,7 @@ Function2: AS vs ATI
 \t\t-min_dSegmentlen    \tdefault=10, Min AS differential segment length
 \t\t-min_ccs_usage      \tdefault=0, min ccs usage(used/geneccs)
 \t\t-min_KS_statistic   \tdefault=0.2, Min KS_statistic
+\t\t-evidence_bam       \tdefault=slice, slice: per-event bam from minimap.sort.bam, realign: minimap2 per event, none: skip part_ccs2ref
 
 Function3: AS vs APA 
 \tUsage: python asapa.py AS_APA
@@ -54,6 +60,7 @@ Function3: AS vs APA
 \t\t-min_dSegmentlen    \tdefault=10, Min AS differential segment length
 \t\t-min_ccs_usage      \tdefault=0, min ccs usage(used/geneccs)
 \t\t-min_KS_statistic   \tdefault=0.2, Min KS_statistic
+\t\t-evidence_bam       \tdefault=slice, slice: per-event bam from minimap.sort.bam, realign: minimap2 per event, none: skip part_ccs2ref
 
 Function4: ATI vs APA
 \tUsage: python asapa.py ATI_APA
@@ -63,6 +70,33 @@ Function4: ATI vs APA
 \t\t-min_TSSPASccs_usage\tdefault=0.5, min ccs usage(used/TSSPASccs)
 \t\t-min_correlation    \tdefault=0.5, min spearman correlation
 \t\t-max_bin_extent     \tdefault=1000,  Max distance of binning extension
+\t\t-evidence_bam       \tdefault=slice, slice: per-event bam from minimap.sort.bam, realign: minimap2 per event, none: skip part_ccs2ref
+
+Simulation: synthetic output0_preparation for the four functions, no PacBio data or external tool needed
+\tUsage: python asapa.py simulate
+\tUsage: python asapa.py bench      (simulate in ./output_bench and time the four functions with -evidence_bam none,
+\t                                   then their hot loops one by one as kernel steps,
+\t                                   the start-up of -h and of each function is timed first)
+\t       No reference timing is shipped: a bench writes ./output_bench/bench_report.json, the next bench of the same scale
+\t       in the same path marks the steps more than 20% slower than it. Keep a copy of bench_report.json to compare with later.
+\tOptional parameters:
+\t\t-n                  \tdefault=1,  CPU thread number of the functions run by bench
+\t\t-log                \tdefault=no, yes will write terminal print in output.log
+\t\t-gene_num           \tdefault=1000, number of AS genes
+\t\t-event_num          \tdefault=6,  number of AS events per gene
+\t\t-read_num           \tdefault=60, number of ccs per gene
+\t\t-seed               \tdefault=1,  random seed
+
+End-to-end run: build and the four functions on a synthetic genome with stand-ins of the external tools, in ./output_e2e
+\tUsage: python asapa.py e2e
+\tOptional parameters:
+\t\t-n                  \tdefault=2,  CPU thread number of build and the functions
+\t\t-log                \tdefault=no, yes will write terminal print in output.log
+\t\t-gene_num           \tdefault=40, number of genes
+\t\t-read_num           \tdefault=30, number of ccs per gene and sample
+\t\t-sample_num         \tdefault=2,  number of subreads files
+\t\t-seed               \tdefault=1,  random seed
+\t\t-update             \tdefault=no, yes will replace ./output_e2e/e2e_baseline.json by this run
 
 The output folder will be created in the current path:
 \toutput0_preparation (preparation: subreads to ccs, lima, minimap2, cDNA_cupcake and SUPPA2)
@@ -77,11 +111,6 @@ Conda is recommended
 \t conda install lima
 \t conda install minimap2
 \t conda install samtools
-\t conda install bedtools
-\t conda install perl
-\t conda install R
-\t conda install rpy2
-\t conda install r-dplyr
 \t conda install -c bioconda trim_isoseq_polya
 \t conda install -c bioconda suppa
 
@@ -94,12 +123,34 @@ isoseq_primer1=">primer_5p\nAAGCAGTGGTATCAACGCAGAGTACATGGGG\n>primer_3p\nAAGCAGT
 isoseq_primer2=">primer_5p\nATGTAATACGACTCACTATAGGGC\n>primer_3p\nAAAAAAAAAACGCCTGAGA\n"
 #help
 if (len(sys.argv)==1) or sys.argv[1] in ("h","-h","help","-help"):print(help_txt);sys.exit()
-if sys.argv[1] not in ("build","AS_AS","AS_ATI","AS_APA","ATI_APA"):print(help_txt);sys.exit()
+if sys.argv[1] not in ("build","AS_AS","AS_ATI","AS_APA","ATI_APA","simulate","bench","e2e"):print(help_txt);sys.exit()
+#numpy and scipy are imported only by the analyses that use them, help and build start without loading them.
+if sys.argv[1] in ("AS_AS","AS_ATI","AS_APA","ATI_APA","bench"):
+    import numpy as np
+if sys.argv[1] in ("AS_AS","bench"):
+    from scipy.special import gammaln
+    from scipy.special import chdtrc
+if sys.argv[1] in ("AS_ATI","AS_APA","bench"):
+    from scipy.stats import ks_2samp
+if sys.argv[1] in ("ATI_APA","bench"):
+    from scipy.stats import spearmanr
+if sys.argv[1] in ("simulate","e2e"):
+    import random
+if sys.argv[1]=="e2e":
+    if not os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)),"asapa_e2e_tools.py")):
+        print("ERROR, asapa_e2e_tools.py is not found next to asapa.py, it is needed by e2e.");sys.exit(1)
+    sys.path.insert(0,os.path.dirname(os.path.abspath(__file__)))
+    from asapa_e2e_tools import write_e2e_fake_tools
+#bench times the start-up of a subcommand up to here, with ASAPA_IMPORT_ONLY=yes.
+if os.environ.get("ASAPA_IMPORT_ONLY")=="yes":sys.exit()
 if   sys.argv[1] =="build":	outputfile="output0_preparation"
-elif sys.argv[1] =="AS_AS":	outputfile="toutput1_ASAS"
-elif sys.argv[1] =="AS_ATI":	outputfile="toutput2_ASATI"
-elif sys.argv[1] =="AS_APA":	outputfile="toutput3_ASAPA"
-elif sys.argv[1] =="ATI_APA":	outputfile="toutput4_ATIAPA"
+elif sys.argv[1] =="AS_AS":	outputfile="output1_ASAS"
+elif sys.argv[1] =="AS_ATI":	outputfile="output2_ASATI"
+elif sys.argv[1] =="AS_APA":	outputfile="output3_ASAPA"
+elif sys.argv[1] =="ATI_APA":	outputfile="output4_ATIAPA"
+elif sys.argv[1] =="simulate":	outputfile="output0_preparation"
+elif sys.argv[1] =="bench":	outputfile="output_bench"
+elif sys.argv[1] =="e2e":	outputfile="output_e2e"
 argument_name_list=[]
 argument_index_list=[]  
 if sys.argv[1]=="build":
@@ -110,6 +161,7 @@ if sys.argv[1]=="build":
         max_fuzzy_TSS="5"
         max_fuzzy_PAS="5"
         max_fuzzy_junction="5"
+        ccs_chunk="1"
         ref=sys.argv[2]
         qry=sys.argv[3]
     elif len(sys.argv)>4:
@@ -120,10 +172,11 @@ if sys.argv[1]=="build":
         max_fuzzy_TSS_index=""
         max_fuzzy_PAS_index=""
         max_fuzzy_junction_index=""
+        ccs_chunk_index=""
         i=0
         for x in sys.argv:
             if "-"==x[0]:
-                if x[1:] not in ["n","log","max_fuzzy_TSS","max_fuzzy_PAS","max_fuzzy_junction"]:print("Error, unrecognized parameter: "+x);exit()  
+                if x[1:] not in ["n","log","max_fuzzy_TSS","max_fuzzy_PAS","max_fuzzy_junction","ccs_chunk"]:print("Error, unrecognized parameter: "+x);exit()  
                 elif x[1:] in argument_name_list:print("ERROR: duplicated parameter: "+x);exit()
                 argument_name_list.append(x[1:])
                 argument_index_list.append(i);argument_index_list.append(i+1)
@@ -132,6 +185,7 @@ if sys.argv[1]=="build":
                 if	x[1:]=="max_fuzzy_TSS":		max_fuzzy_TSS_index=i
                 if	x[1:]=="max_fuzzy_PAS":		max_fuzzy_PAS_index=i
                 if	x[1:]=="max_fuzzy_junction":	max_fuzzy_junction_index=i
+                if	x[1:]=="ccs_chunk":		ccs_chunk_index=i
             i+=1    
         if thread_index=="": 			thread	="15"
         else: 					thread	=sys.argv[thread_index+1]
@@ -143,11 +197,14 @@ if sys.argv[1]=="build":
         else: 					max_fuzzy_PAS=sys.argv[max_fuzzy_PAS_index+1]
         if max_fuzzy_junction_index=="":	max_fuzzy_junction="5"
         else: 					max_fuzzy_junction=sys.argv[max_fuzzy_junction_index+1]     
+        if ccs_chunk_index=="":			ccs_chunk="1"
+        else: 					ccs_chunk=sys.argv[ccs_chunk_index+1]
         if int(thread)<=0: print("ERROR, thread must more than 0.");exit()
         if log not in ("yes","no"): print("ERROR, -log should be yes or no.");exit()
         if int(max_fuzzy_TSS)<0: print("ERROR, max_fuzzy_TSS has to be at least 0.");exit()
         if int(max_fuzzy_PAS)<0: print("ERROR, max_fuzzy_PAS has to be at least 0.");exit()
         if int(max_fuzzy_junction)<0: print("ERROR, max_fuzzy_junction has to be at least 0.");exit()
+        if int(ccs_chunk)<1: print("ERROR, ccs_chunk has to be at least 1.");exit()
         inputoutput_index_list=[]       
         i=0
         while i<len(sys.argv):
@@ -175,11 +232,16 @@ if sys.argv[1]=="build":
         print("\t-max_fuzzy_junction\tmax_fuzzy junction dist:\t5 (default)")
     else:
         print("\t-max_fuzzy_junction\tmax_fuzzy_junction dist:\t"+max_fuzzy_junction+" (default = 5)")
+    if ccs_chunk=="1":
+        print("\t-ccs_chunk         \tccs chunks per file:     \t1 (default)")
+    else:
+        print("\t-ccs_chunk         \tccs chunks per file:     \t"+ccs_chunk+" (default = 1)")
 
 if sys.argv[1]=="AS_AS":
     if len(sys.argv)==2:
         thread="15"
         log="no"
+        evidence_bam="slice"
         min_ccsnum="10"
         min_dSegmentlen="10"
         min_ccs_usage="0"
@@ -189,17 +251,19 @@ if sys.argv[1]=="AS_AS":
         i=0
         thread_index=""
         log_index=""
+        evidence_bam_index=""
         min_ccsnum_index=""
         min_dSegmentlen_index=""
         min_ccs_usage_index=""
         for x in sys.argv:
             if "-"==x[0]:
-                if x[1:] not in ["n","log","min_ccsnum","min_dSegmentlen","min_ccs_usage"]:print("Error, unrecognized parameter: "+x);exit()  
+                if x[1:] not in ["n","log","evidence_bam","min_ccsnum","min_dSegmentlen","min_ccs_usage"]:print("Error, unrecognized parameter: "+x);exit()  
                 elif x[1:] in argument_name_list:print("ERROR: duplicated parameter: "+x);exit()
                 argument_name_list.append(x[1:])
                 argument_index_list.append(i);argument_index_list.append(i+1)
                 if	x[1:]=="n":			thread_index=i
                 if	x[1:]=="log":			log_index=i
+                if	x[1:]=="evidence_bam":		evidence_bam_index=i
                 if	x[1:]=="min_ccsnum":		min_ccsnum_index=i
                 if	x[1:]=="min_dSegmentlen":	min_dSegmentlen_index=i
                 if	x[1:]=="min_ccs_usage":		min_ccs_usage_index=i
@@ -208,6 +272,8 @@ if sys.argv[1]=="AS_AS":
         else: 					thread		=sys.argv[thread_index+1]
         if log_index=="":	        	log		="no"
         else: 					log		=sys.argv[log_index+1]
+        if evidence_bam_index=="":		evidence_bam	="slice"
+        else: 					evidence_bam	=sys.argv[evidence_bam_index+1]
         if min_ccsnum_index=="":		min_ccsnum	="10"
         else: 					min_ccsnum	=sys.argv[min_ccsnum_index+1]
         if min_dSegmentlen_index=="":		min_dSegmentlen	="10"
@@ -218,6 +284,7 @@ if sys.argv[1]=="AS_AS":
         else: 					min_ccs_usage	=sys.argv[min_ccs_usage_index+1]  
         if int(thread)<=0: print("ERROR, thread must more than 0.");exit()
         if log not in ("yes","no"): print("ERROR, -log should be yes or no.");exit()
+        if evidence_bam not in ("slice","realign","none"): print("ERROR, -evidence_bam should be slice, realign or none.");exit()
         if int(min_ccsnum)<1: print("ERROR, min_ccsnum has to be at least 1.");exit()
         if int(min_dSegmentlen)<0: print("ERROR, min_dSegmentlen has to be at least 0.");exit()
         if float(min_ccs_usage)<0 or float(min_ccs_usage)>1 : print("ERROR, 0<=min_ccs_usage<=1.");exit()
@@ -232,12 +299,17 @@ if sys.argv[1]=="AS_AS":
     if min_dSegmentlen=="15":
         print("\t-min_dSegmentlen   \t\t10 (default)")
     else:
-        print("\t-min_dSegmentlen   \t\t"+min_dSegmentlen+" (default = 10)")   
+        print("\t-min_dSegmentlen   \t\t"+min_dSegmentlen+" (default = 10)")
+    if evidence_bam=="slice":
+        print("\t-evidence_bam      \t\tslice (default)")
+    else:
+        print("\t-evidence_bam      \t\t"+evidence_bam+" (default = slice)")   
   
 if sys.argv[1]=="AS_APA":
     if len(sys.argv)==2:
         thread="15"
         log="no"
+        evidence_bam="slice"
         min_ccsnum="10"
         min_dSegmentlen="10"
         min_KS_statistic="0.2"
@@ -248,18 +320,20 @@ if sys.argv[1]=="AS_APA":
         i=0
         thread_index=""
         log_index=""
+        evidence_bam_index=""
         min_ccsnum_index=""
         min_dSegmentlen_index=""
         min_KS_statistic_index=""
         min_ccs_usage_index=""
         for x in sys.argv:
             if "-"==x[0]:
-                if x[1:] not in ["n","log","min_ccsnum","min_dSegmentlen","min_KS_statistic","min_ccs_usage"]:print("Error, unrecognized parameter: "+x);exit()  
+                if x[1:] not in ["n","log","evidence_bam","min_ccsnum","min_dSegmentlen","min_KS_statistic","min_ccs_usage"]:print("Error, unrecognized parameter: "+x);exit()  
                 elif x[1:] in argument_name_list:print("ERROR: duplicated parameter: "+x);exit()
                 argument_name_list.append(x[1:])
                 argument_index_list.append(i);argument_index_list.append(i+1)
                 if	x[1:]=="n":			thread_index=i
                 if	x[1:]=="log":			log_index=i
+                if	x[1:]=="evidence_bam":		evidence_bam_index=i
                 if	x[1:]=="min_ccsnum":		min_ccsnum_index=i
                 if	x[1:]=="min_dSegmentlen":	min_dSegmentlen_index=i
                 if	x[1:]=="min_KS_statistic":	min_KS_statistic_index=i
@@ -269,6 +343,8 @@ if sys.argv[1]=="AS_APA":
         else: 					thread		=sys.argv[thread_index+1]
         if log_index=="":	        	log		="no"
         else: 					log		=sys.argv[log_index+1]
+        if evidence_bam_index=="":		evidence_bam	="slice"
+        else: 					evidence_bam	=sys.argv[evidence_bam_index+1]
         if min_ccsnum_index=="":		min_ccsnum	="10"
         else: 					min_ccsnum	=sys.argv[min_ccsnum_index+1]
         if min_dSegmentlen_index=="":		min_dSegmentlen	="10"
@@ -279,6 +355,7 @@ if sys.argv[1]=="AS_APA":
         else: 					min_ccs_usage	=sys.argv[min_ccs_usage_index+1]    
         if int(thread)<=0: print("ERROR, thread must more than 0.");exit()
         if log not in ("yes","no"): print("ERROR, -log should be yes or no.");exit()
+        if evidence_bam not in ("slice","realign","none"): print("ERROR, -evidence_bam should be slice, realign or none.");exit()
         if int(min_ccsnum)<1: print("ERROR, min_ccsnum has to be at least 1.");exit()
         if int(min_dSegmentlen)<0: print("ERROR, min_dSegmentlen has to be at least 0.");exit()
         if float(min_KS_statistic)<0 or float(min_KS_statistic)>1:print("ERROR, 0<=min_KS_statistic<=1.");exit()
@@ -298,12 +375,17 @@ if sys.argv[1]=="AS_APA":
     if min_KS_statistic=="0.2":
         print("\t-min_KS_statistic  \t\t0.2 (default)")
     else:
-        print("\t-min_KS_statistic  \t\t"+min_KS_statistic+" (default = 0.2)")   
+        print("\t-min_KS_statistic  \t\t"+min_KS_statistic+" (default = 0.2)")
+    if evidence_bam=="slice":
+        print("\t-evidence_bam      \t\tslice (default)")
+    else:
+        print("\t-evidence_bam      \t\t"+evidence_bam+" (default = slice)")   
   
 if sys.argv[1]=="AS_ATI":
     if len(sys.argv)==2:
         thread="15"
         log="no"
+        evidence_bam="slice"
         min_ccsnum="10"
         min_dSegmentlen="10"
         min_KS_statistic="0.2"
@@ -314,18 +396,20 @@ if sys.argv[1]=="AS_ATI":
         i=0
         thread_index=""
         log_index=""
+        evidence_bam_index=""
         min_ccsnum_index=""
         min_dSegmentlen_index=""
         min_KS_statistic_index=""
         min_ccs_usage_index=""
         for x in sys.argv:
             if "-"==x[0]:
-                if x[1:] not in ["n","log","min_ccsnum","min_dSegmentlen","min_KS_statistic","min_ccs_usage"]:print("Error, unrecognized parameter: "+x);exit()  
+                if x[1:] not in ["n","log","evidence_bam","min_ccsnum","min_dSegmentlen","min_KS_statistic","min_ccs_usage"]:print("Error, unrecognized parameter: "+x);exit()  
                 elif x[1:] in argument_name_list:print("ERROR: duplicated parameter: "+x);exit()
                 argument_name_list.append(x[1:])
                 argument_index_list.append(i);argument_index_list.append(i+1)
                 if	x[1:]=="n":			thread_index=i
                 if	x[1:]=="log":			log_index=i
+                if	x[1:]=="evidence_bam":		evidence_bam_index=i
                 if	x[1:]=="min_ccsnum":		min_ccsnum_index=i
                 if	x[1:]=="min_dSegmentlen":	min_dSegmentlen_index=i
                 if	x[1:]=="min_KS_statistic":	min_KS_statistic_index=i
@@ -335,6 +419,8 @@ if sys.argv[1]=="AS_ATI":
         else: 					thread		=sys.argv[thread_index+1]
         if log_index=="":	        	log		="no"
         else: 					log		=sys.argv[log_index+1]
+        if evidence_bam_index=="":		evidence_bam	="slice"
+        else: 					evidence_bam	=sys.argv[evidence_bam_index+1]
         if min_ccsnum_index=="":		min_ccsnum	="10"
         else: 					min_ccsnum	=sys.argv[min_ccsnum_index+1]
         if min_dSegmentlen_index=="":		min_dSegmentlen	="10"
@@ -345,6 +431,7 @@ if sys.argv[1]=="AS_ATI":
         else: 					min_ccs_usage	=sys.argv[min_ccs_usage_index+1]   
         if int(thread)<=0: print("ERROR, thread must more than 0.");exit()
         if log not in ("yes","no"): print("ERROR, -log should be yes or no.");exit()
+        if evidence_bam not in ("slice","realign","none"): print("ERROR, -evidence_bam should be slice, realign or none.");exit()
         if int(min_ccsnum)<1: print("ERROR, min_ccsnum has to be at least 1.");exit()
         if int(min_dSegmentlen)<0: print("ERROR, min_dSegmentlen has to be at least 0.");exit()
         if float(min_KS_statistic)<0 or float(min_KS_statistic)>1:print("ERROR, 0<=min_KS_statistic<=1.");exit()
@@ -364,12 +451,17 @@ if sys.argv[1]=="AS_ATI":
     if min_KS_statistic=="0.2":
         print("\t-min_KS_statistic  \t\t0.2 (default)")
     else:
-        print("\t-min_KS_statistic  \t\t"+min_KS_statistic+" (default = 0.2)")   
+        print("\t-min_KS_statistic  \t\t"+min_KS_statistic+" (default = 0.2)")
+    if evidence_bam=="slice":
+        print("\t-evidence_bam      \t\tslice (default)")
+    else:
+        print("\t-evidence_bam      \t\t"+evidence_bam+" (default = slice)")   
 
 if sys.argv[1]=="ATI_APA":
     if len(sys.argv)==2:
         thread="15"
         log="no"
+        evidence_bam="slice"
         min_ccsnum="10"
         min_correlation="0.5"
         max_bin_extent="1000"
@@ -381,19 +473,21 @@ if sys.argv[1]=="ATI_APA":
         i=0
         thread_index=""
         log_index=""
+        evidence_bam_index=""
         min_ccsnum_index=""
         min_correlation_index=""
         min_geneccs_usage_index=""
         min_TSSPASccs_usage_index=""
-	max_bin_extent_index=""
+        max_bin_extent_index=""
         for x in sys.argv:
             if "-"==x[0]:
-                if x[1:] not in ["n","log","min_ccsnum","min_correlation","max_bin_extent","min_geneccs_usage","min_TSSPASccs_usage"]:print("Error, unrecognized parameter: "+x);exit()  
+                if x[1:] not in ["n","log","evidence_bam","min_ccsnum","min_correlation","max_bin_extent","min_geneccs_usage","min_TSSPASccs_usage"]:print("Error, unrecognized parameter: "+x);exit()  
                 elif x[1:] in argument_name_list:print("ERROR: duplicated parameter: "+x);exit()
                 argument_name_list.append(x[1:])
                 argument_index_list.append(i);argument_index_list.append(i+1)
                 if	x[1:]=="n":			thread_index=i
                 if	x[1:]=="log":			log_index=i
+                if	x[1:]=="evidence_bam":		evidence_bam_index=i
                 if	x[1:]=="min_ccsnum":		min_ccsnum_index=i
                 if	x[1:]=="min_correlation":	min_correlation_index=i
                 if	x[1:]=="max_bin_extent":	max_bin_extent_index=i
@@ -404,6 +498,8 @@ if sys.argv[1]=="ATI_APA":
         else: 					thread		=sys.argv[thread_index+1]
         if log_index=="":	        	log		="no"
         else: 					log		=sys.argv[log_index+1]
+        if evidence_bam_index=="":		evidence_bam	="slice"
+        else: 					evidence_bam	=sys.argv[evidence_bam_index+1]
         if min_ccsnum_index=="":		min_ccsnum	="10"
         else: 					min_ccsnum	=sys.argv[min_ccsnum_index+1]
         if min_correlation_index=="":		min_correlation	="0.5"
@@ -416,6 +512,7 @@ if sys.argv[1]=="ATI_APA":
         else: 					min_TSSPASccs_usage	=sys.argv[min_TSSPASccs_usage_index+1] 
         if int(thread)<=0: print("ERROR, thread must more than 0.");exit()
         if log not in ("yes","no"): print("ERROR, -log should be yes or no.");exit()
+        if evidence_bam not in ("slice","realign","none"): print("ERROR, -evidence_bam should be slice, realign or none.");exit()
         if int(min_ccsnum)<1: print("ERROR, min_ccsnum has to be at least 1.");exit()
         if float(min_correlation)<0 or float(min_correlation)>1:print("ERROR, 0<=min_KS_statistic<=1.");exit()
         if int(max_bin_extent)<=0: print("ERROR, max_bin_extent must more than 0.");exit()
@@ -440,156 +537,109 @@ if sys.argv[1]=="ATI_APA":
     if min_correlation=="0.5":
         print("\t-min_correlation    \t\t0.5 (default)")
     else:
-        print("\t-min_correlation    \t\t"+min_correlation+" (default = 0.5)")   
-
+        print("\t-min_correlation    \t\t"+min_correlation+" (default = 0.5)")
+    if evidence_bam=="slice":
+        print("\t-evidence_bam      \t\tslice (default)")
+    else:
+        print("\t-evidence_bam      \t\t"+evidence_bam+" (default = slice)")   
 
+if sys.argv[1] in ("simulate","bench"):
+    if (len(sys.argv)-2)%2!=0:	print("ERROR, the number of parameters is incorrect.");exit()
+    if len(sys.argv)>2 and sys.argv[-1][0]=="-":	print("ERROR, the value of "+sys.argv[-1]+" was not sepecified.");exit()
+    i=0
+    thread_index=""
+    log_index=""
+    gene_num_index=""
+    event_num_index=""
+    read_num_index=""
+    seed_index=""
+    for x in sys.argv:
+        if "-"==x[0]:
+            if x[1:] not in ["n","log","gene_num","event_num","read_num","seed"]:print("Error, unrecognized parameter: "+x);exit()  
+            elif x[1:] in argument_name_list:print("ERROR: duplicated parameter: "+x);exit()
+            argument_name_list.append(x[1:])
+            argument_index_list.append(i);argument_index_list.append(i+1)
+            if	x[1:]=="n":		thread_index=i
+            if	x[1:]=="log":		log_index=i
+            if	x[1:]=="gene_num":	gene_num_index=i
+            if	x[1:]=="event_num":	event_num_index=i
+            if	x[1:]=="read_num":	read_num_index=i
+            if	x[1:]=="seed":		seed_index=i
+        i+=1    
+    if thread_index=="": 		thread		="1"
+    else: 				thread		=sys.argv[thread_index+1]
+    if log_index=="":	        	log		="no"
+    else: 				log		=sys.argv[log_index+1]
+    if gene_num_index=="":		gene_num	="1000"
+    else: 				gene_num	=sys.argv[gene_num_index+1]
+    if event_num_index=="":		event_num	="6"
+    else: 				event_num	=sys.argv[event_num_index+1]
+    if read_num_index=="":		read_num	="60"
+    else: 				read_num	=sys.argv[read_num_index+1]
+    if seed_index=="":			seed		="1"
+    else: 				seed		=sys.argv[seed_index+1]
+    if int(thread)<=0: print("ERROR, thread must more than 0.");exit()
+    if log not in ("yes","no"): print("ERROR, -log should be yes or no.");exit()
+    if int(gene_num)<1: print("ERROR, gene_num has to be at least 1.");exit()
+    if int(event_num)<1: print("ERROR, event_num has to be at least 1.");exit()
+    if int(read_num)<1: print("ERROR, read_num has to be at least 1.");exit()
+    print("\t-gene_num          \t\t"+gene_num+" (default = 1000)")
+    print("\t-event_num         \t\t"+event_num+" (default = 6)")
+    print("\t-read_num          \t\t"+read_num+" (default = 60)")
+    print("\t-seed              \t\t"+seed+" (default = 1)")
 
-#pivot.py
-pivot_script="""
-#!/usr/bin/python
-# -*- coding: UTF-8 -*-
-import subprocess
-import csv
-import sys
-import timeit
-import os
-if (len(sys.argv)<2) or sys.argv[1] in ("h","-h","help","-help"):
-    print ("pivot.py-----help:")
-    print ("pivot.py pivot/unpivot comma/Semicolon head/nohead replace/noreplace input output")     
-    print (" ")
-    sys.exit()
-elif len(sys.argv)!=7:
-    print ("pivot.py-----ERROR, argument number must be 6:")
-    print ("pivot.py pivot/unpivot comma/Semicolon head/nohead replace/noreplace input output")   
-    print (" ")
-    sys.exit()
-runtype		=sys.argv[1]
-delimiter	=sys.argv[2]
-inputhead	=sys.argv[3]
-inputreplace	=sys.argv[4]
-inputfile	=sys.argv[5]
-outputfile	=sys.argv[6]
-tmpfile0="pivot_tmp0_"+str(timeit.default_timer()).replace(",","")
-tmpfile1="pivot_tmp1_"+str(timeit.default_timer()).replace(",","")
-tmpfile2="pivot_tmp2_"+str(timeit.default_timer()).replace(",","")
-tmpfile3="pivot_tmp3_"+str(timeit.default_timer()).replace(",","")
-if os.path.exists(outputfile):
-    subprocess.run(["rm "+outputfile],shell=True)  
-if runtype not in ["pivot","unpivot"]:
-    print("error, argument1 must be pivot/unpivot")
-    exit()
-if delimiter not in ["comma","semicolon"]:
-    print("error, argument2 must be comma/semicolon")
-    exit()
-if inputhead not in ["head","nohead"]:
-    print("error, argument3 must be head/nohead")
-    exit()
-if inputreplace not in ["replace","noreplace"]:
-    print("error, argument4 must be replace/noreplace")
-    exit()
-if inputhead=="head":
-    subprocess.run(["head -n 1 "+inputfile+"  > "+tmpfile0],shell=True) 
-    subprocess.run(["sed '1d' "+inputfile+" |cut -f 1,2 > "+tmpfile1],shell=True) 
-else:
-    subprocess.run(["cut -f 1,2  "+inputfile+" > "+tmpfile1],shell=True) 
-if inputreplace=="replace":
-    subprocess.run(["sort -n  "+tmpfile1+"  > "+tmpfile2],shell=True) 
-
-else:
-    subprocess.run(["sort -n  "+tmpfile1+" |uniq > "+tmpfile2],shell=True) 
-if runtype=="unpivot":  
-    with open (tmpfile2,"r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            eachline=line.strip()
-            eachline_arr=eachline.replace("\\t","_||_").split("_||_")
-            col1=eachline_arr[0]
-            col2=eachline_arr[1]
-            if delimiter=="comma":
-                col2_arr=col2.split(",")
-            elif delimiter=="semicolon":
-                col2_arr=col2.split(";")
-            for x in col2_arr:
-                with open (tmpfile3,"a",encoding="utf-8") as f2:
-                    f2.write(col1+"\\t"+x+"\\n")
-                    f2.close()
-elif runtype=="pivot":     
-    with open (tmpfile2,"r",encoding="ISO-8859-1") as f:
-        line_num=len(f.readlines())
+if sys.argv[1]=="e2e":
+    if (len(sys.argv)-2)%2!=0:	print("ERROR, the number of parameters is incorrect.");exit()
+    if len(sys.argv)>2 and sys.argv[-1][0]=="-":	print("ERROR, the value of "+sys.argv[-1]+" was not sepecified.");exit()
     i=0
-    col2_arr=[]
-    with open (tmpfile2,"r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            eachline=line.strip()
-            eachline_arr=eachline.replace("\\t","_||_").split("_||_")
-            col1=eachline_arr[0]
-            col2=eachline_arr[1];
-            if i==1:
-                col1_last=col1
-                col2_arr.append(col2)
-            if i>1 and col1!=col1_last:
-                if delimiter=="comma":		
-                    col2_str=",".join(col2_arr)
-                    if inputreplace=="noreplace":
-                        col2_arr=list(set(col2_str.split(",")))
-                        col2_str=",".join(col2_arr)
-                elif delimiter=="semicolon":	
-                    col2_str=";".join(col2_arr)
-                    if inputreplace=="noreplace":
-                        col2_arr=list(set(col2_str.split(";")))
-                        col2_str=";".join(col2_arr)
-                with open (tmpfile3,"a",encoding="utf-8") as f2:
-                    f2.write(col1_last+"\\t"+col2_str+"\\n")
-                    f2.close()
-                col1_last=col1
-                col2_arr=[]
-                col2_arr.append(col2)
-            if inputreplace=="replace":
-                if col1==col1_last :	
-                    col2_arr.append(col2)
-            else:
-                if col1==col1_last and col2 not in col2_arr:
-                    col2_arr.append(col2)
-            if i==line_num:
-                if delimiter=="comma":		col2_str=",".join(col2_arr)
-                elif delimiter=="semicolon":	col2_str=";".join(col2_arr)
-                with open (tmpfile3,"a",encoding="utf-8") as f2:
-                    f2.write(col1_last+"\\t"+col2_str+"\\n")
-                    f2.close()  
-if inputhead=="head": 
-    subprocess.run(["cat  "+tmpfile0+" "+tmpfile3+" > "+outputfile],shell=True) 
-    subprocess.run(["rm  "+tmpfile0],shell=True)
-else:
-    subprocess.run(["cat  "+tmpfile3+" > "+outputfile],shell=True) 
-subprocess.run(["rm  "+tmpfile1+" "+tmpfile2+" "+tmpfile3],shell=True) 
-"""
-pivot_script=pivot_script.replace('"','\"')
-#getfastabylist.pl
-getfastabylist_script = """
-#! /usr/bin/perl -w
-use strict;
-die "perl $0 <lst><fa>\\n" unless  @ARGV==2;
-my ($lst,$fa)=@ARGV;
-open IN,$lst||die;
-my %ha;
-map{chomp;$ha{(split)[0]}=1}<IN>;
-close IN;
-
-$fa=~/gz$/?(open IN,"gzip -cd $fa|"||die):(open IN,$fa||die);
-$/=">";<IN>;$/="\\n";
-my %out;
-while(<IN>){
-	my $info=$1 if(/^(\S+)/);
-	$/=">";
-	my $seq=<IN>;
-	$/="\\n";
-	$seq=~s/>|\\r|\*//g;
-	print ">$info\\n$seq" if(exists $ha{$info} && ! exists $out{$info});
-	$out{$info}=1;
-}
-close IN;
-"""
-getfastabylist_script=getfastabylist_script.replace('"','\"') 
+    thread_index=""
+    log_index=""
+    gene_num_index=""
+    read_num_index=""
+    sample_num_index=""
+    seed_index=""
+    update_index=""
+    for x in sys.argv:
+        if "-"==x[0]:
+            if x[1:] not in ["n","log","gene_num","read_num","sample_num","seed","update"]:print("Error, unrecognized parameter: "+x);exit()  
+            elif x[1:] in argument_name_list:print("ERROR: duplicated parameter: "+x);exit()
+            argument_name_list.append(x[1:])
+            argument_index_list.append(i);argument_index_list.append(i+1)
+            if	x[1:]=="n":		thread_index=i
+            if	x[1:]=="log":		log_index=i
+            if	x[1:]=="gene_num":	gene_num_index=i
+            if	x[1:]=="read_num":	read_num_index=i
+            if	x[1:]=="sample_num":	sample_num_index=i
+            if	x[1:]=="seed":		seed_index=i
+            if	x[1:]=="update":	update_index=i
+        i+=1    
+    if thread_index=="": 		thread		="2"
+    else: 				thread		=sys.argv[thread_index+1]
+    if log_index=="":	        	log		="no"
+    else: 				log		=sys.argv[log_index+1]
+    if gene_num_index=="":		gene_num	="40"
+    else: 				gene_num	=sys.argv[gene_num_index+1]
+    if read_num_index=="":		read_num	="30"
+    else: 				read_num	=sys.argv[read_num_index+1]
+    if sample_num_index=="":		sample_num	="2"
+    else: 				sample_num	=sys.argv[sample_num_index+1]
+    if seed_index=="":			seed		="1"
+    else: 				seed		=sys.argv[seed_index+1]
+    if update_index=="":		update		="no"
+    else: 				update		=sys.argv[update_index+1]
+    if int(thread)<=0: print("ERROR, thread must more than 0.");exit()
+    if log not in ("yes","no"): print("ERROR, -log should be yes or no.");exit()
+    if update not in ("yes","no"): print("ERROR, -update should be yes or no.");exit()
+    if int(gene_num)<1: print("ERROR, gene_num has to be at least 1.");exit()
+    if int(read_num)<1: print("ERROR, read_num has to be at least 1.");exit()
+    if int(sample_num)<1: print("ERROR, sample_num has to be at least 1.");exit()
+    print("\t-gene_num          \t\t"+gene_num+" (default = 40)")
+    print("\t-read_num          \t\t"+read_num+" (default = 30)")
+    print("\t-sample_num        \t\t"+sample_num+" (default = 2)")
+    print("\t-seed              \t\t"+seed+" (default = 1)")
+    print("\t-update            \t\t"+update+" (default = no)")
+
+
 #Calculate the median
 def calcMedian(data):
     if len(data)%2==0:
@@ -598,6 +648,570 @@ def calcMedian(data):
         median=sorted(data)[int(len(data)/2)]
     return median
 
+#Text output with a large write buffer. The loop that writes a file keeps one handle open
+#instead of opening, appending and closing the file for every line.
+def open_output(path,mode="a"):
+    return open(path,mode,encoding="utf-8",buffering=1048576)
+
+#Read a table split on whitespace like R read.table, return (header, rows). header is None for nohead.
+def read_table(path,head=False):
+    with open (path,"r",encoding="ISO-8859-1") as f:
+        row_list=[line.split() for line in f if line.strip()!=""]
+    if head:
+        return row_list[0],row_list[1:]
+    return None,row_list
+
+#Read the tab separated columns of each line.
+def read_tsv(path):
+    with open (path,"r",encoding="ISO-8859-1") as f:
+        return [line.rstrip("\n").split("\t") for line in f]
+
+#pivot: col2 of the rows with the same col1 are joined into one row, col2="item1,item2,..."
+#unpivot: col2="item1,item2,..." is split into one row per item.
+#Rows are sorted by col1,col2 first, duplicated rows and duplicated items of pivot are removed unless replace.
+def pivot_rows(row_list,runtype,delimiter=",",replace=False):
+    row_list=[(row[0],row[1] if len(row)>1 else "") for row in row_list]
+    if not replace:
+        row_list=set(row_list)
+    row_list=sorted(row_list)
+    if runtype=="unpivot":
+        return [[col1,x] for col1,col2 in row_list for x in col2.split(delimiter)]
+    dict_col1={}
+    for col1,col2 in row_list:
+        dict_col1.setdefault(col1,[]).extend(col2.split(delimiter))
+    if not replace:
+        return [[col1,delimiter.join(dict.fromkeys(item_list))] for col1,item_list in dict_col1.items()]
+    return [[col1,delimiter.join(item_list)] for col1,item_list in dict_col1.items()]
+
+#Inner hash join like R merge(all.x=FALSE,all.y=FALSE): each row of file_rows is joined with every row of index_rows
+#that has the same key, return the list of (file_row, index_row) sorted by key.
+def hash_join(file_rows,file_col,index_rows,index_col):
+    dict_index={}
+    for index_row in index_rows:
+        dict_index.setdefault(index_row[index_col],[]).append(index_row)
+    join_list=[]
+    for file_row in file_rows:
+        for index_row in dict_index.get(file_row[file_col],[]):
+            join_list.append((file_row,index_row))
+    join_list.sort(key=lambda x:x[0][file_col])
+    return join_list
+
+#Write rows to a tab separated table like R write.table(quote=FALSE), header is skipped if None.
+def write_table(path,header,row_list):
+    with open_output(path,"w") as f:
+        if header is not None:
+            f.write("\t".join(header)+"\n")
+        for row in row_list:
+            f.write("\t".join(row)+"\n")
+
+#FLNC_inform line: ccs_name,align_chr,strand,align_start,align_end,TSS,PAS,TSS_PAS_mark,intron_mark
+#ccs_align_start/ccs_align_end/align_start are 0-based as in PAF.
+def get_FLNC_inform_line(ccs_name,ccs_len,ccs_align_start,ccs_align_end,strand,align_chr,align_start,align_end,max_fuzzy_TSS,max_fuzzy_PAS):
+    align_start	+=1
+    if strand=="+":	PAS=align_end;		TSS=align_start
+    else: 		PAS=align_start;	TSS=align_end
+    if    ccs_align_start<=max_fuzzy_TSS and ccs_len-ccs_align_end<=max_fuzzy_PAS: TSS_PAS_mark="TSS_PAS"
+    elif  ccs_align_start>max_fuzzy_TSS  and ccs_len-ccs_align_end<=max_fuzzy_PAS: TSS_PAS_mark="noTSS_PAS"
+    elif  ccs_align_start<=max_fuzzy_TSS and ccs_len-ccs_align_end>max_fuzzy_PAS:  TSS_PAS_mark="TSS_noPAS"
+    else: TSS_PAS_mark="noTSS_noPAS"
+    if abs((align_end-align_start)-(ccs_align_end-ccs_align_start))<40: intron_mark="nointron"
+    else:intron_mark="normal"
+    return ccs_name+"\t"+align_chr+"\t"+strand+"\t"+str(align_start)+"\t"+str(align_end)+"\t"+str(TSS)+"\t"+str(PAS)+"\t"+TSS_PAS_mark+"\t"+intron_mark
+
+#Read the SAM output of minimap2 (bytes) line by line, forward every line to sam_out and yield (ccs_name, FLNC_inform line) of each alignment.
+#Query and reference coordinates are computed from CIGAR as paftools.js sam2paf does, so no SAM or PAF file is written.
+cigar_pattern=re.compile(rb"(\d+)([MIDNSHP=X])")
+def iter_sam_FLNC_inform(sam_in,sam_out,max_fuzzy_TSS,max_fuzzy_PAS):
+    max_fuzzy_TSS=int(max_fuzzy_TSS)
+    max_fuzzy_PAS=int(max_fuzzy_PAS)
+    for line in sam_in:
+        sam_out.write(line)
+        if line.startswith(b"@"):continue
+        eachline_arr=line.split(b"\t",6)
+        flag=int(eachline_arr[1])
+        if flag&4 or eachline_arr[2]==b"*":continue
+        clip=[0,0];M=0;I=0;D=0;N=0;cigar_num=0
+        for length,op in cigar_pattern.findall(eachline_arr[5]):
+            length=int(length)
+            if op in b"M=X":	M+=length
+            elif op==b"I":	I+=length
+            elif op==b"D":	D+=length
+            elif op==b"N":	N+=length
+            elif op in b"SH":	clip[0 if cigar_num==0 else 1]=length
+            cigar_num+=1
+        ccs_len=M+I+clip[0]+clip[1]
+        align_start=int(eachline_arr[3])-1
+        align_end=align_start+M+D+N
+        if flag&16:	strand="-";ccs_align_start=clip[1];ccs_align_end=ccs_len-clip[0]
+        else:		strand="+";ccs_align_start=clip[0];ccs_align_end=ccs_len-clip[1]
+        ccs_name=eachline_arr[0].decode("ISO-8859-1")
+        yield ccs_name,get_FLNC_inform_line(ccs_name,ccs_len,ccs_align_start,ccs_align_end,strand,eachline_arr[2].decode("ISO-8859-1"),align_start,align_end,max_fuzzy_TSS,max_fuzzy_PAS)
+
+#ccs_name: the ccs names in the order of their ids, the id of a ccs is its line number (from 0).
+#The ccs are referred to by id in ASccs_store and inside the functions, and by name in the output files.
+def write_ccs_name(ccs_list,name_path):
+    with open_output(name_path,"w") as f:
+        for oneccs in ccs_list:
+            f.write(oneccs+"\n")
+    return {oneccs:x for x,oneccs in enumerate(ccs_list)}
+
+ccs_name_arr=None
+def open_ccs_name(name_path):
+    global ccs_name_arr
+    if not os.path.exists(name_path):
+        print("ERROR, "+name_path+" is not found, please run build again.");exit()
+    with open (name_path,"r",encoding="ISO-8859-1") as f:
+        ccs_name_arr=np.array([line.rstrip("\n") for line in f],dtype=object)
+
+#Names of a list of ccs ids, comma joined.
+def get_ccs_str(ccs_id_list):
+    return ",".join(ccs_name_arr[np.asarray(ccs_id_list,dtype=np.int64)])
+
+#ASccs_store: the lines of 3-AS_ccs_info.transcript1/2 grouped by gene in one file, with the ccs name (column 2) replaced by its id.
+#ASccs_store.index: gene, part(1/2), byte offset and byte length of the lines of one gene.
+def write_ASccs_store(dict_gene_lines,store_path,dict_ccs_id):
+    offset=0
+    with open (store_path,"wb") as f, open (store_path+".index","w",encoding="utf-8") as f2:
+        for geneid,dict_part_lines in dict_gene_lines.items():
+            for part in ("1","2"):
+                if part in dict_part_lines:
+                    line_list=[]
+                    for oneline in dict_part_lines[part]:
+                        eachline_arr=oneline.split("\t",2)
+                        eachline_arr[1]=str(dict_ccs_id[eachline_arr[1]])
+                        line_list.append("\t".join(eachline_arr))
+                    part_bytes=("\n".join(line_list)+"\n").encode("utf-8")
+                    f.write(part_bytes)
+                    f2.write(geneid+"\t"+part+"\t"+str(offset)+"\t"+str(len(part_bytes))+"\n")
+                    offset+=len(part_bytes)
+
+#Map ASccs_store into memory once, workers forked afterwards share the mapping.
+dict_ASccs_index={}
+ASccs_store_mmap=None
+def open_ASccs_store(store_path):
+    global ASccs_store_mmap
+    with open (store_path+".index","r",encoding="ISO-8859-1") as f:
+        for line in f:
+            eachline_arr=line.rstrip("\n").split("\t")
+            dict_ASccs_index[eachline_arr[0],eachline_arr[1]]=(int(eachline_arr[2]),int(eachline_arr[3]))
+    if os.path.getsize(store_path)>0:
+        with open (store_path,"rb") as f:
+            ASccs_store_mmap=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+
+#Lines of one gene in transcript1 (part="1") or transcript2 (part="2"), split into columns, the ccs id (column 2) as int.
+def read_ASccs_lines(one_gene,part):
+    if (one_gene,part) not in dict_ASccs_index:
+        return []
+    offset,length=dict_ASccs_index[one_gene,part]
+    line_list=[line.split("\t") for line in ASccs_store_mmap[offset:offset+length].decode("ISO-8859-1").splitlines()]
+    for eachline_arr in line_list:
+        eachline_arr[1]=int(eachline_arr[1])
+    return line_list
+
+#AS_catalog: the SUPPA events of every gene parsed once by build, so the functions do not parse the event ids of each gene again.
+#Each event is a record of 11 int32: type (index in AS_type_list), strand (index in AS_strand_list), min, max, start, end,
+#dSegment start1, end1, start2, end2 (start2 and end2 are 0 except for MX) and dSegment length.
+#The events of a gene are followed by the candidate groups of AS_AS as event indexes within the gene: AS pairs (2 int32),
+#RI1234 (two adjacent RI pairs, 4 int32) and RI123 (RI pair and adjacent A3/A5, 3 int32).
+#AS_catalog.index: gene, chr, int32 offset of the gene, number of events, AS pairs, RI1234 and RI123, event ids (comma joined).
+AS_type_list=["SE","A3","A5","RI","MX"]
+AS_strand_list=["+","minus"]
+#[oneAS_type/chr/strand/min/max/start/end/dSegment_pos/dSegment_length] of one SUPPA event id.
+def get_ASinfo(oneAS):
+    oneAS_arr=oneAS.replace(":-",";minus").replace("-",";").replace(":",";").split(";")
+    oneAS_type				=oneAS_arr[1]
+    oneAS_chr				=oneAS_arr[2]
+    oneAS_strand			=oneAS_arr[-1]
+    oneAS_pos_arr			=list(map(int,oneAS_arr[3:-1]))   
+    oneAS_min				=min(oneAS_pos_arr)
+    oneAS_max				=max(oneAS_pos_arr) 
+    if oneAS_type=="RI":		
+        oneAS_start			=oneAS_pos_arr[1]
+        oneAS_end			=oneAS_pos_arr[2]
+    else:		
+        oneAS_start			=oneAS_min
+        oneAS_end			=oneAS_max
+    if oneAS_type=="RI":		
+        oneAS_dSegment_start		=oneAS_pos_arr[1]+1
+        oneAS_dSegment_end		=oneAS_pos_arr[2]-1 
+        oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
+        oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)       
+    if oneAS_type=="A3":
+        if oneAS_strand=="+":	
+            oneAS_dSegment_start	=oneAS_pos_arr[1]
+            oneAS_dSegment_end		=oneAS_pos_arr[3]-1
+        else:		
+            oneAS_dSegment_start	=oneAS_pos_arr[2]+1
+            oneAS_dSegment_end		=oneAS_pos_arr[0]	
+        oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
+        oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   
+    if oneAS_type=="A5":
+        if oneAS_strand=="+":
+            oneAS_dSegment_start	=oneAS_pos_arr[2]+1
+            oneAS_dSegment_end		=oneAS_pos_arr[0]
+        else:		
+            oneAS_dSegment_start	=oneAS_pos_arr[1]
+            oneAS_dSegment_end		=oneAS_pos_arr[3]-1
+        oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
+        oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   	
+    if oneAS_type=="SE":
+        oneAS_dSegment_start		=oneAS_pos_arr[1]
+        oneAS_dSegment_end		=oneAS_pos_arr[2]
+        oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
+        oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   
+    if oneAS_type=="MX":
+        oneAS_dSegment_start1		=oneAS_pos_arr[1]
+        oneAS_dSegment_end1		=oneAS_pos_arr[2]
+        oneAS_dSegment_start2		=oneAS_pos_arr[5]
+        oneAS_dSegment_end2		=oneAS_pos_arr[6]
+        oneAS_dSegment_start		=oneAS_dSegment_start1
+        oneAS_dSegment_end		=oneAS_dSegment_end2
+        oneAS_dSegment_length		=oneAS_dSegment_end1-oneAS_dSegment_start1+1+oneAS_dSegment_end2-oneAS_dSegment_start2+1
+        oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start1)+"-"+str(oneAS_dSegment_end1)+";"+str(oneAS_dSegment_start2)+"-"+str(oneAS_dSegment_end2)
+    return [oneAS_type,oneAS_chr,oneAS_strand,oneAS_min,oneAS_max,oneAS_start,oneAS_end,oneAS_dSegment_pos,oneAS_dSegment_length]
+
+#AS pairs, RI1234 and RI123 of the events of one gene, as indexes of gene_AS_list.
+def get_AS_candidates(gene_AS_list,dict_ASinfo):
+    gene_AS_num=len(gene_AS_list)
+    if gene_AS_num<=1:
+        return [],[],[]
+    strand		=dict_ASinfo[gene_AS_list[0]][2]
+    ##Index of the AS events: sorted by min for the sweep, RI grouped by intron, A3/A5 by start and end.
+    ##Every query returns AS indexes, which are sorted so the pairs keep the order of gene_AS_list.
+    AS_min_order=sorted(range(gene_AS_num),key=lambda x:dict_ASinfo[gene_AS_list[x]][3])
+    AS_min_sorted=[dict_ASinfo[gene_AS_list[x]][3] for x in AS_min_order]
+    dict_RIintron={}
+    dict_A35pos={}
+    for x,oneAS in enumerate(gene_AS_list):
+        oneAS_info=dict_ASinfo[oneAS]
+        if oneAS_info[0]=="RI":
+            dict_RIintron.setdefault((oneAS_info[5],oneAS_info[6]),[]).append(x)
+        if oneAS_info[0] in ("A3","A5"):
+            dict_A35pos.setdefault((oneAS_info[0],"start",oneAS_info[5]),[]).append(x)
+            dict_A35pos.setdefault((oneAS_info[0],"end",oneAS_info[6]),[]).append(x)
+    AS_pairs=[]
+    RI_pairs=[]
+    for paired_AS1 in gene_AS_list:
+        paired_AS1_info=dict_ASinfo[paired_AS1]
+        AS1_type			=paired_AS1_info[0]
+        paired_AS1_min = paired_AS1_info[3];	        paired_AS1_max = paired_AS1_info[4]
+        ##Paired AS2 starts after AS1 ends: paired_AS1_max<=paired_AS2_min
+        for y in sorted(AS_min_order[bisect.bisect_left(AS_min_sorted,paired_AS1_max):]):
+            paired_AS2=gene_AS_list[y]
+            paired_AS2_info=dict_ASinfo[paired_AS2]
+            AS2_type			=paired_AS2_info[0]
+            mark="yes"
+            if paired_AS1_max==paired_AS2_info[3]:
+                if AS1_type=="RI":
+                    if AS2_type=="A5" and strand=="+":	mark="no"
+                    if AS2_type=="A3" and strand=="-":	mark="no"
+                if AS2_type=="RI":
+                    if AS1_type=="A3" and strand=="+":	mark="no"
+                    if AS1_type=="A5" and strand=="-":	mark="no"
+            if mark=="yes":
+                AS_pairs.append(paired_AS1+"_||_"+paired_AS2)
+        ##RI pairs share the intron
+        if AS1_type=="RI":
+            for y in dict_RIintron[paired_AS1_info[5],paired_AS1_info[6]]:
+                paired_AS2=gene_AS_list[y]
+                paired_AS2_info=dict_ASinfo[paired_AS2]
+                paired_AS2_min = paired_AS2_info[3];		paired_AS2_max = paired_AS2_info[4]
+                if paired_AS1_min<paired_AS2_max and paired_AS2_min<paired_AS1_max:
+                    if paired_AS1_min==paired_AS2_min and paired_AS1_max<paired_AS2_max:RI_pairs.append(paired_AS1+"_||_"+paired_AS2)
+                    if paired_AS1_min>paired_AS2_min and paired_AS1_max==paired_AS2_max:RI_pairs.append(paired_AS1+"_||_"+paired_AS2)
+    #Get_adjacent RI-AS
+    RI1234_arr=[]
+    RI123_arr=[]
+    ##RI pairs indexed by the min and intron start of the first RI
+    dict_RIpair={}
+    for x,oneRIpair in enumerate(RI_pairs):
+        RI3_info=dict_ASinfo[oneRIpair.split("_||_")[0]]
+        dict_RIpair.setdefault((RI3_info[3],RI3_info[5]),[]).append(x)
+    for oneRIpair1 in RI_pairs:
+        RI1=oneRIpair1.split("_||_")[0]
+        RI2=oneRIpair1.split("_||_")[1]
+        RI1_info=dict_ASinfo[RI1]
+        RI2_info=dict_ASinfo[RI2]
+        RI1_min = RI1_info[3];	        	RI1_max = RI1_info[4] 
+        RI2_min = RI2_info[3];	        	RI2_max = RI2_info[4] 
+        RI1_intron_start=RI1_info[5];		RI1_intron_end=RI1_info[6]
+        if RI1_min==RI2_min:
+            for y in dict_RIpair.get((RI1_intron_end,RI1_max),[]):
+                oneRIpair2=RI_pairs[y]
+                RI3=oneRIpair2.split("_||_")[0]
+                RI4=oneRIpair2.split("_||_")[1]
+                if dict_ASinfo[RI3][4]==dict_ASinfo[RI4][4]:
+                    RI1234_arr.append(RI1+"_||_"+RI2+"_||_"+RI3+"_||_"+RI4)
+        AS_index_list=[]
+        if strand=="+":	AS_index_list=dict_A35pos.get(("A3","end",RI1_min),[])+dict_A35pos.get(("A5","start",RI1_max),[])
+        if strand=="-":	AS_index_list=dict_A35pos.get(("A3","start",RI1_max),[])+dict_A35pos.get(("A5","end",RI1_min),[])
+        for y in sorted(AS_index_list):
+            RI123_arr.append(RI1+"_||_"+RI2+"_||_"+gene_AS_list[y])
+    AS_index={oneAS:x for x,oneAS in enumerate(gene_AS_list)}
+    return [[[AS_index[x] for x in onegroup.split("_||_")] for onegroup in group_list] for group_list in (AS_pairs,RI1234_arr,RI123_arr)]
+
+def write_AS_catalog(AS_list,catalog_path):
+    dict_gene_AS={}
+    for oneAS in AS_list:
+        dict_gene_AS.setdefault(oneAS.split(";")[0],{})[oneAS]=None
+    offset=0
+    with open (catalog_path,"wb") as f, open (catalog_path+".index","w",encoding="utf-8") as f2:
+        for geneid,dict_AS in dict_gene_AS.items():
+            gene_AS_list=list(dict_AS)
+            dict_ASinfo={oneAS:get_ASinfo(oneAS) for oneAS in gene_AS_list}
+            gene_arr=array.array("i")
+            for oneAS in gene_AS_list:
+                oneAS_info=dict_ASinfo[oneAS]
+                dSegment_arr=[int(x) for x in oneAS_info[7][len(oneAS_info[1])+1:].replace(";","-").split("-")]+[0,0]
+                gene_arr.extend([AS_type_list.index(oneAS_info[0]),AS_strand_list.index(oneAS_info[2])]+oneAS_info[3:7]+dSegment_arr[:4]+[oneAS_info[8]])
+            group_num_list=[]
+            for group_list in get_AS_candidates(gene_AS_list,dict_ASinfo):
+                group_num_list.append(len(group_list))
+                for onegroup in group_list:
+                    gene_arr.extend(onegroup)
+            gene_arr.tofile(f)
+            f2.write(geneid+"\t"+dict_ASinfo[gene_AS_list[0]][1]+"\t"+str(offset)+"\t"+str(len(gene_AS_list))+"\t"+"\t".join(map(str,group_num_list))+"\t"+",".join(gene_AS_list)+"\n")
+            offset+=len(gene_arr)
+
+#Map AS_catalog into memory once like ASccs_store. A catalog missing from an older build is written from the event ids of ASccs_store.
+dict_AScatalog_index={}
+AS_catalog_arr=None
+def open_AS_catalog(catalog_path):
+    global AS_catalog_arr
+    if not os.path.exists(catalog_path+".index"):
+        print("Note: "+catalog_path+" is not found, it is written from ASccs_store")
+        AS_dict={}
+        if ASccs_store_mmap is not None:
+            for line in iter(ASccs_store_mmap.readline,b""):
+                AS_dict[line.split(b"\t",1)[0].decode("ISO-8859-1")]=None
+            ASccs_store_mmap.seek(0)
+        write_AS_catalog(list(AS_dict),catalog_path)
+    with open (catalog_path+".index","r",encoding="ISO-8859-1") as f:
+        for line in f:
+            eachline_arr=line.rstrip("\n").split("\t")
+            dict_AScatalog_index[eachline_arr[0]]=[eachline_arr[1]]+[int(x) for x in eachline_arr[2:7]]+[eachline_arr[7].split(",")]
+    if os.path.getsize(catalog_path)>0:
+        with open (catalog_path,"rb") as f:
+            AS_catalog_arr=np.frombuffer(mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ),dtype=np.int32)
+
+#dict[AS]=[oneAS_type/chr/strand/min/max/start/end/dSegment_pos/dSegment_length] of all the events of one gene.
+def read_AS_catalog(one_gene):
+    chromosome,offset,event_num,_,_,_,event_list=dict_AScatalog_index[one_gene]
+    dict_ASinfo={}
+    for oneAS,record in zip(event_list,AS_catalog_arr[offset:offset+11*event_num].reshape(-1,11).tolist()):
+        dSegment_pos=chromosome+":"+str(record[6])+"-"+str(record[7])
+        if record[0]==AS_type_list.index("MX"):
+            dSegment_pos+=";"+str(record[8])+"-"+str(record[9])
+        dict_ASinfo[oneAS]=[AS_type_list[record[0]],chromosome,AS_strand_list[record[1]]]+record[2:6]+[dSegment_pos,record[10]]
+    return dict_ASinfo
+
+#AS pairs, RI1234 and RI123 of AS_AS among the events of gene_AS_list, as AS ids joined by "_||_".
+#The groups are sorted by the positions of their events in gene_AS_list, the order in which AS_AS used to find them.
+def read_AS_candidates(one_gene,gene_AS_list):
+    chromosome,offset,event_num,pair_num,RI1234_num,RI123_num,event_list=dict_AScatalog_index[one_gene]
+    AS_pos={oneAS:x for x,oneAS in enumerate(gene_AS_list)}
+    event_pos=[AS_pos.get(oneAS,-1) for oneAS in event_list]
+    offset+=11*event_num
+    candidate_list=[]
+    for group_size,group_num in ((2,pair_num),(4,RI1234_num),(3,RI123_num)):
+        pos_list=[[event_pos[x] for x in onegroup] for onegroup in AS_catalog_arr[offset:offset+group_size*group_num].reshape(-1,group_size).tolist()]
+        candidate_list.append(["_||_".join(gene_AS_list[x] for x in onepos) for onepos in sorted(pos_list) if min(onepos)>=0])
+        offset+=group_size*group_num
+    return candidate_list
+
+#fa.fai: name, sequence length, byte offset of the sequence, bases per line, bytes per line (samtools faidx columns).
+#Only the first record of a duplicated name is indexed.
+def write_fasta_index(fa_path):
+    dict_fai={}
+    offset=0
+    name=None
+    with open (fa_path,"rb") as f:
+        for line in f:
+            if line.startswith(b">"):
+                header_arr=line[1:].split()
+                name=header_arr[0].decode("ISO-8859-1") if header_arr else None
+                if name in dict_fai: name=None
+                if name is not None: dict_fai[name]=[0,offset+len(line),0,0]
+            elif name is not None:
+                bases=len(line.rstrip(b"\r\n"))
+                if dict_fai[name][2]==0:
+                    dict_fai[name][2]=bases
+                    dict_fai[name][3]=len(line)
+                dict_fai[name][0]+=bases
+            offset+=len(line)
+    with open_output(fa_path+".fai","w") as f:
+        for name,fai_arr in dict_fai.items():
+            f.write(name+"\t"+"\t".join([str(x) for x in fai_arr])+"\n")
+
+#Map the fasta into memory once and load its .fai, the .fai is rebuilt if it is missing or older than the fasta.
+dict_fasta_index={}
+fasta_mmap=None
+def open_fasta_index(fa_path):
+    global fasta_mmap
+    if not os.path.exists(fa_path+".fai") or os.path.getmtime(fa_path+".fai")<os.path.getmtime(fa_path):
+        write_fasta_index(fa_path)
+    dict_fasta_index.clear()
+    with open (fa_path+".fai","r",encoding="ISO-8859-1") as f:
+        for line in f:
+            eachline_arr=line.rstrip("\n").split("\t")
+            dict_fasta_index[eachline_arr[0]]=[int(x) for x in eachline_arr[1:5]]
+    fasta_mmap=None
+    if os.path.getsize(fa_path)>0:
+        with open (fa_path,"rb") as f:
+            fasta_mmap=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+
+#Write the records of id_list to out_fa in the order of the fasta, each name once, ">", "\r" and "*" removed.
+def write_fasta_by_list(id_list,out_fa):
+    name_list=sorted(set(x for x in id_list if x in dict_fasta_index),key=lambda x:dict_fasta_index[x][1])
+    with open (out_fa,"wb",buffering=1048576) as f:
+        for name in name_list:
+            length,offset,linebases,linewidth=dict_fasta_index[name]
+            if length>0:seq=fasta_mmap[offset:offset+(length-1)//linebases*linewidth+(length-1)%linebases+1]
+            else:seq=b""
+            seq=seq.replace(b"\r",b"").replace(b"*",b"")
+            f.write(b">"+name.encode("ISO-8859-1")+b"\n"+seq+b"\n")
+
+#Keep the header and the alignments of the reads in ccs_set from minimap.sort.bam, read in one pass.
+#dict_ccs_sam: ccs -> [(line number, sam line)], the line number keeps the coordinate order of the bam.
+sam_header=""
+dict_ccs_sam={}
+def open_bam_by_ccs(bam_path,ccs_set):
+    global sam_header
+    header_list=[]
+    dict_ccs_sam.clear()
+    proc=subprocess.Popen(["samtools","view","-h",bam_path],stdout=subprocess.PIPE,encoding="ISO-8859-1")
+    for line_num,line in enumerate(proc.stdout):
+        if line.startswith("@"):
+            header_list.append(line)
+            continue
+        ccs_name=line.split("\t",1)[0]
+        if ccs_name in ccs_set:
+            dict_ccs_sam.setdefault(ccs_name,[]).append((line_num,line))
+    proc.wait()
+    sam_header="".join(header_list)
+
+#Write the alignments of ccs_list to a sorted and indexed bam, the same as realigning these reads with minimap2.
+def write_bam_by_ccs(ccs_list,bam_path,thread):
+    sam_list=sorted(x for ccs_name in set(ccs_list) for x in dict_ccs_sam.get(ccs_name,[]))
+    sam_text=sam_header+"".join([line for line_num,line in sam_list])
+    subprocess.run(["samtools","view","-b","-@",thread,"-o",bam_path,"-"],input=sam_text,encoding="ISO-8859-1")
+    subprocess.run(["samtools","index",bam_path])
+
+#minimap2 splice index of a reference, cached by the sha1 of the reference content in $ASAPA_CACHE (default ~/.cache/asapa).
+#A reference is indexed once and the .mmi is reused by every build on it. The reference is returned if indexing fails.
+#The reference sha1 is the one of get_file_sha1, shared with the stage keys of build.
+minimap2_index_opt=["-x","splice","-k","14"]
+def get_minimap2_index(ref_path,thread):
+    cache_dir=os.environ.get("ASAPA_CACHE",os.path.join(os.path.expanduser("~"),".cache","asapa"))
+    sha1=hashlib.sha1((" ".join(minimap2_index_opt)+"\t"+get_file_sha1(ref_path)).encode("utf-8"))
+    mmi_path=os.path.join(cache_dir,sha1.hexdigest()+".mmi")
+    if os.path.exists(mmi_path):
+        print("          Use cached minimap2 index "+mmi_path)
+        return mmi_path
+    os.makedirs(cache_dir,exist_ok=True)
+    print("          Build minimap2 index "+mmi_path)
+    result=subprocess.run(["minimap2"]+minimap2_index_opt+["-t",thread,"-d",mmi_path+".tmp",ref_path],stderr=subprocess.DEVNULL)
+    if result.returncode!=0 or not os.path.exists(mmi_path+".tmp"):
+        print("Warning: minimap2 index failed, "+ref_path+" is used.")
+        return ref_path
+    os.replace(mmi_path+".tmp",mmi_path)
+    return mmi_path
+
+#Replace path with a symlink to target.
+def force_symlink(target,path):
+    if os.path.lexists(path):
+        os.remove(path)
+    os.symlink(target,path)
+
+#Run onegene_func on each task with thread_num worker processes.
+#Results are yielded in the order of task_list, so the output does not depend on the number of workers.
+def gene_pool_imap(onegene_func,task_list,thread_num):
+    thread_num=min(int(thread_num),len(task_list))
+    if thread_num<=1:
+        for onetask in task_list:
+            yield onegene_func(onetask)
+        return
+    #fork: workers inherit the parsed parameters and never re-run this script.
+    #maxtasksperchild: workers are replaced regularly so the memory of a huge gene is returned to the system.
+    with multiprocessing.get_context("fork").Pool(processes=thread_num,maxtasksperchild=200) as pool:
+        for result in pool.imap(onegene_func,task_list,chunksize=1):
+            yield result
+
+#Run onesample_func on each sample task (ccs chunk, lima sample) with job_num worker processes, results are yielded in the order of task_list.
+#Sample tasks are few and long, each worker only waits for its external tools, so workers are kept for all the tasks.
+#The workers return the lines to print and the progress is printed by the parent process.
+def sample_pool_imap(onesample_func,task_list,job_num):
+    job_num=min(int(job_num),len(task_list))
+    if job_num<=1:
+        for onetask in task_list:
+            yield onesample_func(onetask)
+        return
+    with multiprocessing.get_context("fork").Pool(processes=job_num) as pool:
+        for result in pool.imap(onesample_func,task_list):
+            yield result
+
+#Progress lines ending with \r are printed at most once per progress_interval seconds,
+#end_progress() prints the last one and ends the line.
+progress_interval=0.5
+progress_time=0
+progress_text=""
+def print_progress(text):
+    global progress_time,progress_text
+    progress_text=text
+    time_now=timeit.default_timer()
+    if time_now-progress_time>=progress_interval:
+        progress_time=time_now
+        print(text,end="\r")
+
+def end_progress():
+    global progress_time,progress_text
+    print(progress_text)
+    progress_time=0
+    progress_text=""
+
+#Run report: wall time, CPU time, peak RSS, bytes read/written and record number of each step,
+#written as run_report.json next to output.log. CPU time and peak RSS of the external tools and pool workers are under child_.
+#Bytes read/written are those of this process (/proc/self/io), external tools are not included.
+list_run_usage=[]
+def get_usage():
+    self_usage=resource.getrusage(resource.RUSAGE_SELF)
+    child_usage=resource.getrusage(resource.RUSAGE_CHILDREN)
+    rchar=wchar=0
+    if os.path.exists("/proc/self/io"):
+        with open ("/proc/self/io","r") as f:
+            for line in f:
+                key,value=line.split(":")
+                if key=="rchar":	rchar=int(value)
+                if key=="wchar":	wchar=int(value)
+    return {"wall":timeit.default_timer(),"cpu":self_usage.ru_utime+self_usage.ru_stime,"child_cpu":child_usage.ru_utime+child_usage.ru_stime,
+        "rss":self_usage.ru_maxrss,"child_rss":child_usage.ru_maxrss,"rchar":rchar,"wchar":wchar}
+
+#ru_maxrss is the peak of the whole run so far (KB on Linux), not of the step alone.
+def record_usage(step,usage_start,record_num=None):
+    usage_end=get_usage()
+    list_run_usage.append({"step":step,
+        "wall_seconds":round(usage_end["wall"]-usage_start["wall"],3),
+        "cpu_seconds":round(usage_end["cpu"]-usage_start["cpu"],3),
+        "child_cpu_seconds":round(usage_end["child_cpu"]-usage_start["child_cpu"],3),
+        "peak_rss_mb":round(usage_end["rss"]/1024,1),
+        "child_peak_rss_mb":round(usage_end["child_rss"]/1024,1),
+        "read_bytes":usage_end["rchar"]-usage_start["rchar"],
+        "write_bytes":usage_end["wchar"]-usage_start["wchar"],
+        "record_num":record_num})
+
+def write_run_report(report_path,usage_start):
+    usage_end=get_usage()
+    dict_report={"command":sys.argv[1:],
+        "start":time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(time.time()-(usage_end["wall"]-usage_start["wall"]))),
+        "wall_seconds":round(usage_end["wall"]-usage_start["wall"],3),
+        "cpu_seconds":round(usage_end["cpu"]-usage_start["cpu"],3),
+        "child_cpu_seconds":round(usage_end["child_cpu"]-usage_start["child_cpu"],3),
+        "peak_rss_mb":round(usage_end["rss"]/1024,1),
+        "child_peak_rss_mb":round(usage_end["child_rss"]/1024,1),
+        "steps":list_run_usage}
+    with open (report_path,"w",encoding="utf-8") as f:
+        json.dump(dict_report,f,indent=1)
+
 print ()
 ##Write a log.
 base_path=os.path.abspath("./")  
@@ -619,16 +1233,310 @@ if log=="yes":
                     pass
         def flush(self):
             pass
-    sys.stdout = Logger(outputfile+"/output.log")
-    sys.stderr = Logger(outputfile+"/output.log") 
+    sys.stdout = Logger(os.path.join(base_path,outputfile,"output.log"))
+    sys.stderr = Logger(os.path.join(base_path,outputfile,"output.log")) 
 
 print()
 time_start=timeit.default_timer()
+run_usage_start=get_usage()
 print(time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(time.time())))  
 
 #################################################################################################################################################################
 #################################################################################################################################################################
 #Start preparation step.
+#Read a fasta stream, yield (header line, sequence) of each record.
+def iter_fasta_record(fasta_in):
+    header=None
+    seq_list=[]
+    for line in fasta_in:
+        line=line.strip()
+        if line.startswith(">"):
+            if header is not None:
+                yield header,"".join(seq_list)
+            header=line
+            seq_list=[]
+        elif line!="":
+            seq_list.append(line)
+    if header is not None:
+        yield header,"".join(seq_list)
+
+#Convert the FLNC bam files to fasta one after another and write them to fasta_out with 15 A appended to each sequence,
+#so that trim_isoseq_polyA finds a polyA tail in every read. fasta_out is closed at the end. Returns the number of reads written.
+#If the reader of fasta_out exits before reading all the reads (broken pipe), samtools is stopped and None is returned, None also if samtools fails.
+def write_polyA10_fasta(bam_list,fasta_out):
+    read_num=0
+    for bam_path in bam_list:
+        proc=subprocess.Popen(["samtools","fasta",bam_path],stdout=subprocess.PIPE,stderr=subprocess.DEVNULL,encoding="ISO-8859-1")
+        try:
+            for header,seq in iter_fasta_record(proc.stdout):
+                fasta_out.write(header+"\n"+seq+"AAAAAAAAAAAAAAA\n")
+                read_num+=1
+        except OSError:
+            proc.kill()
+            proc.wait()
+            proc.stdout.close()
+            try:
+                fasta_out.close()
+            except OSError:
+                pass
+            return None
+        proc.wait()
+        proc.stdout.close()
+        if proc.returncode!=0:
+            read_num=None
+    try:
+        fasta_out.close()
+    except OSError:
+        return None
+    return read_num
+
+#Write the trim_isoseq_polyA output to fa_path, a read whose name (header up to the first space) was seen before is removed as seqkit rmdup -n.
+#Returns the number of reads written.
+def write_nodup_fasta(fasta_in,fa_path):
+    name_set=set()
+    with open_output(fa_path,"w") as f:
+        for header,seq in iter_fasta_record(fasta_in):
+            name=header.split()[0]
+            if name in name_set:continue
+            name_set.add(name)
+            f.write(header+"\n"+"".join([seq[x:x+60]+"\n" for x in range(0,len(seq),60)]))
+    return len(name_set)
+
+#Trim the polyA of one FLNC bam: samtools fasta -> 15 A appended -> trim_isoseq_polyA -> reads with duplicated name removed,
+#connected by pipes without intermediate files. Returns the number of reads written to fa_path and the error lines.
+#If trim_isoseq_polyA fails on /dev/stdin (non-zero exit, or no read out of a non-empty input), the polyA fasta is written to a file and trimmed again.
+def trim_FLNC_onesample(bam_path,fa_path,thread):
+    with open (fa_path[:-3]+".log","w") as log_f:
+        trim_proc=subprocess.Popen(["trim_isoseq_polyA","-i","/dev/stdin","-t",thread,"-G"],stdin=subprocess.PIPE,stdout=subprocess.PIPE,stderr=log_f,encoding="ISO-8859-1")
+        #feed_num stays empty if the feeder hits a broken pipe, so the fallback below is taken.
+        feed_num=[]
+        def feed():
+            read_num=write_polyA10_fasta([bam_path],trim_proc.stdin)
+            if read_num is not None:feed_num.append(read_num)
+        feed_thread=threading.Thread(target=feed)
+        feed_thread.start()
+        read_num=write_nodup_fasta(trim_proc.stdout,fa_path)
+        feed_thread.join()
+        trim_proc.wait()
+    if trim_proc.returncode==0 and (read_num>0 or feed_num==[0]):
+        return read_num,[]
+    print("          trim_isoseq_polyA failed on /dev/stdin, trim again with an intermediate fasta")
+    polyA_path=fa_path[:-3]+".polyA.fa"
+    if write_polyA10_fasta([bam_path],open(polyA_path,"w")) is None:
+        return 0,["ERROR, samtools fasta failed on "+bam_path]
+    with open (fa_path[:-3]+".log","w") as log_f:
+        trim_proc=subprocess.Popen(["trim_isoseq_polyA","-i",polyA_path,"-t",thread,"-G"],stdout=subprocess.PIPE,stderr=log_f,encoding="ISO-8859-1")
+        read_num=write_nodup_fasta(trim_proc.stdout,fa_path)
+        trim_proc.wait()
+    os.remove(polyA_path)
+    return read_num,tool_error("trim_isoseq_polyA",trim_proc.returncode,bam_path)
+
+#Map one fasta to the reference, minimap2 output is streamed into samtools sort and read for the ccs alignment information at the same time.
+#The FLNC_inform lines of the uniquely aligned ccs are written sorted to inform_path. Returns the error lines.
+def map_FLNC_onesample(fa_path,mmi_path,bam_path,inform_path,thread,max_fuzzy_TSS,max_fuzzy_PAS):
+    minimap_proc=subprocess.Popen(["minimap2","-ax","splice","-uf","-k","14","-t",thread,"--secondary=no",mmi_path,fa_path],stdout=subprocess.PIPE,stderr=subprocess.DEVNULL)
+    sort_proc=subprocess.Popen(["samtools","sort","-@",thread,"-o",bam_path,"-"],stdin=subprocess.PIPE,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+    #Multiple alignment: a ccs with more than one distinct FLNC_inform line is deleted (dict value None).
+    dict_ccs_line={}
+    paf_line_num=0
+    for ccs_name,new_line in iter_sam_FLNC_inform(minimap_proc.stdout,sort_proc.stdin,max_fuzzy_TSS,max_fuzzy_PAS):
+        paf_line_num+=1
+        print_progress("          Get ccs information: "+str(paf_line_num))
+        if ccs_name not in dict_ccs_line:
+            dict_ccs_line[ccs_name]=new_line
+        elif dict_ccs_line[ccs_name]!=new_line:
+            dict_ccs_line[ccs_name]=None
+    print_progress("          Get ccs information: "+str(paf_line_num))
+    end_progress()
+    sort_proc.stdin.close()
+    minimap_proc.wait()
+    sort_proc.wait()
+    with open_output(inform_path,"w") as f2:
+        for new_line in sorted(new_line for new_line in dict_ccs_line.values() if new_line is not None):
+            f2.write(new_line+"\n")
+    print("          Delete Non-specific alignment: "+str(list(dict_ccs_line.values()).count(None))+" ccs")
+    return tool_error("minimap2",minimap_proc.returncode,fa_path)+tool_error("samtools sort",sort_proc.returncode,fa_path)
+
+#Read names of each sample fasta that were already found in an earlier sample. The merged fasta keeps a read of the first sample only,
+#so these reads are also left out of the merged alignments and FLNC_inform.uniq.
+def get_sample_dup_names(fa_path_list):
+    name_set=set()
+    dup_list=[]
+    for fa_path in fa_path_list:
+        sample_name_set=set()
+        with open (fa_path,"r",encoding="ISO-8859-1") as f:
+            for line in f:
+                if line.startswith(">"):
+                    sample_name_set.add(line[1:].split()[0])
+        dup_list.append(sample_name_set&name_set)
+        name_set|=sample_name_set
+    return dup_list
+
+#Write the alignments of bam_path to out_path without the reads named in name_set. Returns the error lines.
+def write_bam_without_names(bam_path,out_path,name_set,thread):
+    view_proc=subprocess.Popen(["samtools","view","-h",bam_path],stdout=subprocess.PIPE,stderr=subprocess.DEVNULL,encoding="ISO-8859-1")
+    write_proc=subprocess.Popen(["samtools","view","-b","-@",thread,"-o",out_path,"-"],stdin=subprocess.PIPE,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL,encoding="ISO-8859-1")
+    for line in view_proc.stdout:
+        if line.startswith("@") or line.split("\t",1)[0] not in name_set:
+            write_proc.stdin.write(line)
+    write_proc.stdin.close()
+    view_proc.wait()
+    write_proc.wait()
+    return tool_error("samtools view",view_proc.returncode,bam_path)+tool_error("samtools view -b",write_proc.returncode,out_path)
+
+#build_manifest.json in output0_preparation: stage -> {"key": sha1 of the parameters and input files, "input"/"output": {path: [size, mtime_ns, sha1]}}.
+#A rerun of build skips a stage whose key is unchanged and whose outputs are intact, other stages are removed and run again.
+#The sha1 of an output is null until a later stage uses the output as input, so a file is only read for its sha1 when a key needs it.
+dict_manifest={}
+manifest_path="./build_manifest.json"
+def file_sha1(path):
+    sha1=hashlib.sha1()
+    with open (path,"rb") as f:
+        for block in iter(lambda:f.read(16777216),b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+#sha1 of a file, kept for this run by (real path, size, mtime_ns), so the reference is read once for all the samples and the minimap2 index.
+#A file recorded in the manifest (under any path to it) as input or output with the same size and mtime_ns is not read again.
+dict_file_sha1={}
+def get_file_sha1(path):
+    if not os.path.exists(path):
+        return "missing"
+    file_stat=os.stat(path)
+    file_id=(os.path.realpath(path),file_stat.st_size,file_stat.st_mtime_ns)
+    if file_id in dict_file_sha1:
+        return dict_file_sha1[file_id]
+    for dict_stage in dict_manifest.values():
+        for dict_file in (dict_stage.get("input",{}),dict_stage["output"]):
+            for record_path,(size,mtime_ns,sha1) in dict_file.items():
+                if sha1 is not None and size==file_stat.st_size and mtime_ns==file_stat.st_mtime_ns and os.path.realpath(record_path)==file_id[0]:
+                    dict_file_sha1[file_id]=sha1
+                    return sha1
+    dict_file_sha1[file_id]=file_sha1(path)
+    #Fill the sha1 of the recorded output, it is written with the next record_stage.
+    for dict_stage in dict_manifest.values():
+        if path in dict_stage["output"] and dict_stage["output"][path][:2]==[file_stat.st_size,file_stat.st_mtime_ns]:
+            dict_stage["output"][path][2]=dict_file_sha1[file_id]
+    return dict_file_sha1[file_id]
+
+#[size, mtime_ns, sha1] of a file, sha1 is null if it was not computed in this run.
+def get_file_record(path):
+    file_stat=os.stat(path)
+    return [file_stat.st_size,file_stat.st_mtime_ns,dict_file_sha1.get((os.path.realpath(path),file_stat.st_size,file_stat.st_mtime_ns))]
+
+def load_manifest():
+    if os.path.exists(manifest_path):
+        with open (manifest_path,"r",encoding="utf-8") as f:
+            dict_manifest.update(json.load(f))
+
+#The input records of a key are kept until the stage is recorded.
+dict_key_input={}
+def get_stage_key(param_list,input_path_list):
+    sha1=hashlib.sha1()
+    for x in param_list:
+        sha1.update(("param\t"+str(x)+"\n").encode("utf-8"))
+    for path in input_path_list:
+        sha1.update(("input\t"+os.path.basename(path)+"\t"+get_file_sha1(path)+"\n").encode("utf-8"))
+    stage_key=sha1.hexdigest()
+    dict_key_input[stage_key]={path:get_file_record(path) for path in input_path_list if os.path.exists(path)}
+    return stage_key
+
+#A stage is done if it was recorded with the same key and all of its outputs are unchanged.
+def stage_done(stage,stage_key):
+    if stage not in dict_manifest or dict_manifest[stage]["key"]!=stage_key:
+        return False
+    for path,(size,mtime_ns,sha1) in dict_manifest[stage]["output"].items():
+        if not os.path.exists(path) or os.path.getsize(path)!=size:
+            return False
+        if os.stat(path).st_mtime_ns!=mtime_ns and (sha1 is None or get_file_sha1(path)!=sha1):
+            return False
+    #Inputs touched without a change of content are recorded with their new mtime_ns, so they are not read again by the next build.
+    if dict_manifest[stage].get("input")!=dict_key_input.get(stage_key,{}):
+        dict_manifest[stage]["input"]=dict_key_input.get(stage_key,{})
+        write_manifest()
+    return True
+
+#The error line of an external tool that exited with a non-zero code, as a list that is empty if the tool succeeded.
+def tool_error(tool_name,returncode,target):
+    if returncode==0:
+        return []
+    return ["ERROR, "+tool_name+" failed on "+target+" (exit code "+str(returncode)+")"]
+
+#Print the errors of a failed stage and stop build. The stage is not recorded, so the next build runs it again.
+def stop_stage(stage,error_list):
+    for x in error_list:
+        print(x)
+    print("ERROR, "+stage+" failed and is not recorded in the build manifest, build stopped.")
+    exit(1)
+
+#A stage is recorded only if none of its tools failed (error_list) and all of its outputs exist.
+def record_stage(stage,stage_key,output_path_list,error_list=[]):
+    error_list=error_list+["ERROR, "+path+" is missing" for path in output_path_list if not os.path.exists(path)]
+    if error_list:
+        stop_stage(stage,error_list)
+    dict_output={}
+    for path in output_path_list:
+        dict_output[path]=get_file_record(path)
+    dict_manifest[stage]={"key":stage_key,"input":dict_key_input.get(stage_key,{}),"output":dict_output}
+    write_manifest()
+
+def write_manifest():
+    with open (manifest_path+".tmp","w",encoding="utf-8") as f:
+        json.dump(dict_manifest,f,indent=1)
+    os.replace(manifest_path+".tmp",manifest_path)
+
+#One ccs job: a whole subreads file (chunk_num=1) or one --chunk of it, run in ./1ccs_2lima/out_<qry_name>/1-ccs/. Return the job name and the error lines.
+def ccs_onechunk(task):
+    qry_path,qry_name,chunk_index,chunk_num,job_thread=task
+    ccs_dir=base_path+"/output0_preparation/1ccs_2lima/out_"+qry_name+"/1-ccs/"
+    #For RSII data, conda install pbccs=3.4
+    #cmd="ccs "+qry_path+" --minPasses 1 ./1-ccs/ROI.bam";subprocess.run([cmd],shell=True)      #pbccs=3.4
+    if chunk_num==1:
+        cmd="ccs "+qry_path+" --minPasses 1 --min-rq 0.9 -j "+job_thread+" "+ccs_dir+"ROI.bam"	#pbccs=6.4
+    else:
+        cmd="ccs "+qry_path+" --minPasses 1 --min-rq 0.9 -j "+job_thread+" --chunk "+str(chunk_index)+"/"+str(chunk_num)+" "+ccs_dir+"ROI.chunk"+str(chunk_index)+".bam"
+    result=subprocess.run([cmd],shell=True)
+    job_name=qry_name+(" chunk "+str(chunk_index)+"/"+str(chunk_num) if chunk_num>1 else "")
+    return job_name,tool_error("ccs",result.returncode,job_name)
+
+#lima of one sample in ./1ccs_2lima/out_<qry_name>/, the ccs chunks are merged first. Return the lines to print and the error lines.
+def lima_onesample(task):
+    qry_path,qry_name,chunk_num,job_thread=task
+    sample_dir=base_path+"/output0_preparation/1ccs_2lima/out_"+qry_name+"/"
+    print_list=[];error_list=[]
+    if chunk_num>1:
+        chunk_bam_str=" ".join([sample_dir+"1-ccs/ROI.chunk"+str(x)+".bam" for x in range(1,chunk_num+1)])
+        result=subprocess.run(["pbmerge -o "+sample_dir+"1-ccs/ROI.bam "+chunk_bam_str],shell=True)
+        error_list+=tool_error("pbmerge",result.returncode,qry_name)
+        if error_list:
+            return print_list,error_list
+        subprocess.run(["rm "+chunk_bam_str],shell=True)
+    subprocess.run(["mkdir "+sample_dir+"2-lima"],shell=True)
+    with open (sample_dir+"2-lima/primers.fasta","w",encoding="ISO-8859-1") as f:
+        f.write(isoseq_primer1)
+    cmd="lima "+sample_dir+"1-ccs/ROI.bam "+sample_dir+"2-lima/primers.fasta "+sample_dir+"2-lima/FLNC.bam --isoseq -j "+job_thread;result=subprocess.run([cmd],shell=True) 
+    if "FLNC.primer_5p--primer_3p.bam" not in os.listdir(sample_dir+"2-lima/"):
+        with open (sample_dir+"2-lima/primers.fasta","w",encoding="ISO-8859-1") as f:
+            f.write(isoseq_primer2)
+        cmd="lima "+sample_dir+"1-ccs/ROI.bam "+sample_dir+"2-lima/primers.fasta "+sample_dir+"2-lima/FLNC.bam --isoseq -j "+job_thread;result=subprocess.run([cmd],shell=True) 
+    error_list+=tool_error("lima",result.returncode,qry_name)
+    if "FLNC.primer_5p--primer_3p.bam" not in os.listdir(sample_dir+"2-lima/"):
+        print_list.append("ERROR, premade IsoSeq primer might not suitable, please manually change it to the correct primer sequence.")  
+    if "FLNC.lima.summary" in os.listdir(sample_dir+"2-lima/"):
+        with open(sample_dir+"2-lima/FLNC.lima.summary","r",encoding="ISO-8859-1") as f:
+            summary_2p=f.readlines()[1]
+        ZMWs_above_thresholds=summary_2p.split("(")[-1].split(")")[0].strip()[:-1]
+        if float(ZMWs_above_thresholds)<50:
+            print_list.append("ZMWs_above_thresholds:"+ZMWs_above_thresholds)
+            print_list.append("ERROR, premade IsoSeq primer might not suitable, please manually change it to the correct primer sequence.")  
+    return print_list,error_list
+
+#Move a processed subreads file to ./output0_preparation/qry_complete/, the .pbi written by pbindex for -ccs_chunk is moved with it.
+def move_qry_complete(qry_path):
+    subprocess.run(["mv "+qry_path+" "+base_path+"/output0_preparation/qry_complete/"],shell=True)
+    if os.path.exists(qry_path+".pbi"):
+        subprocess.run(["mv "+qry_path+".pbi "+base_path+"/output0_preparation/qry_complete/"],shell=True)
+
 if sys.argv[1] =="build":
     
     print("Start preparation step.")
@@ -713,79 +1621,92 @@ if sys.argv[1] =="build":
     print("Steps in /output0_preparation/")
     os.chdir("./output0_preparation")  
     os.system("pwd")
-    subprocess.run(["mkdir ./script"],shell=True)
-    with open ("./script/pivot.py","w",encoding="utf-8") as f:
-        f.write(pivot_script)
-        f.close()
-    with open ("./script/getfastabylist.pl","w",encoding="utf-8") as f:
-        f.write(getfastabylist_script)
-        f.close()
         
-    if "./1ccs_2lima" in os.listdir("./"):
+    if "1ccs_2lima" in os.listdir("./"):
         print("Note: ./1ccs_2lima exitst")
-    else: 
-        subprocess.run(["mkdir ./1ccs_2lima"],shell=True)
+    os.makedirs("./1ccs_2lima",exist_ok=True)
+    load_manifest()
     
-    os.chdir("./1ccs_2lima") 
-
-    print()
+    #A subreads file whose ccs and lima outputs are recorded in the manifest with the same content is not processed again.
+    ccslima_param_list=["ccs --minPasses 1 --min-rq 0.9","lima --isoseq",isoseq_primer1,isoseq_primer2]
+    dict_sample_key={}
+    run_qry_list=[]
+    for qry_file in qry_list:
+        qry_path=os.path.join(base_path,qryfile_dir,qry_file)
+        qry_name=qry_file[:-4]
+        dict_sample_key[qry_name]=get_stage_key(ccslima_param_list,[qry_path])
+        if stage_done("1ccs_2lima/out_"+qry_name,dict_sample_key[qry_name]):
+            print("     "+qry_name+": ccs and lima outputs are unchanged, skipped")
+            move_qry_complete(qry_path)
+        else:
+            run_qry_list.append(qry_file)
+    qry_list=run_qry_list
+    qry_len=len(qry_list)
+    #The -n threads are shared by the ccs jobs running at the same time, one job per subreads file or per --chunk.
+    ccs_task_list=[]
+    dict_sample_error={}
+    for qry_file in qry_list:
+        qry_path=os.path.join(base_path,qryfile_dir,qry_file)
+        qry_name=qry_file[:-4]
+        subprocess.run(["rm -rf ./1ccs_2lima/out_"+qry_name],shell=True)
+        subprocess.run(["mkdir ./1ccs_2lima/out_"+qry_name],shell=True)
+        subprocess.run(["mkdir ./1ccs_2lima/out_"+qry_name+"/1-ccs"],shell=True)
+        dict_sample_error[qry_name]=[]
+        if int(ccs_chunk)>1 and not os.path.exists(qry_path+".pbi"):
+            result=subprocess.run(["pbindex "+qry_path],shell=True)
+            dict_sample_error[qry_name]+=tool_error("pbindex",result.returncode,qry_name)
+        for chunk_index in range(1,int(ccs_chunk)+1):
+            ccs_task_list.append([qry_path,qry_name,chunk_index,int(ccs_chunk)])
+    ccs_job_num=max(1,min(int(thread),len(ccs_task_list)))
+    for onetask in ccs_task_list:
+        onetask.append(str(max(1,int(thread)//ccs_job_num)))
+    middle_time1=timeit.default_timer()
+    usage_start=get_usage()
+    print("     1-ccs: "+str(qry_len)+" subreads files, "+str(len(ccs_task_list))+" ccs jobs, "+str(ccs_job_num)+" jobs at a time")
+    print("     "+time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(time.time()))) 
     i=0
-    while i<qry_len:
-        qry_file=qry_list[i]
-        qry_name=qry_list[i][:-4]
-        middle_time1=timeit.default_timer()
-        print("     Subreads file progress "+str(i+1)+"/"+str(qry_len)+": "+qry_name)
-        print("     "+time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(time.time()))) 
-        subprocess.run(["mkdir out_"+qry_name],shell=True)
-        os.chdir("./out_"+qry_name)      
-        print("     1-ccs")
-        subprocess.run(["mkdir 1-ccs"],shell=True)
-        #For RSII data, conda install pbccs=3.4
-        #cmd="ccs ../../"+qryfile_dir+qry_file+" --minPasses 1 ./1-ccs/ROI.bam";subprocess.run([cmd],shell=True)      #pbccs=3.4
-        cmd="ccs ../../../"+qryfile_dir+qry_file+" --minPasses 1 --min-rq 0.9 ./1-ccs/ROI.bam";subprocess.run([cmd],shell=True) 	#pbccs=6.4	
-        print("     2-lima")
-        subprocess.run(["mkdir 2-lima"],shell=True)
-        with open ("./2-lima/primers.fasta","w",encoding="ISO-8859-1") as f:
-            f.write(isoseq_primer1)
-            f.close()    
-        cmd="lima  ./1-ccs/ROI.bam ./2-lima/primers.fasta ./2-lima/FLNC.bam --isoseq ";subprocess.run([cmd],shell=True) 
-        if "FLNC.primer_5p--primer_3p.bam" not in os.listdir("./2-lima/"):
-            with open ("./2-lima/primers.fasta","w",encoding="ISO-8859-1") as f:
-                f.write(isoseq_primer2)
-                f.close()    
-            cmd="lima ./1-ccs/ROI.bam ./2-lima/primers.fasta ./2-lima/FLNC.bam --isoseq";subprocess.run([cmd],shell=True) 
-        if "FLNC.primer_5p--primer_3p.bam" not in os.listdir("./2-lima/"):
-            print("ERROR, premade IsoSeq primer might not suitable, please manually change it to the correct primer sequence.")  
-        if "FLNC.lima.summary" in os.listdir("./2-lima/"):
-            subprocess.run(["sed -n '2p' ./2-lima/FLNC.lima.summary > ./2-lima/summary_2p"],shell=True)
-            with open("./2-lima/summary_2p","r",encoding="ISO-8859-1") as f:
-                summary_2p=f.read()
-            subprocess.run(["rm ./2-lima/summary_2p"],shell=True)
-            ZMWs_above_thresholds=summary_2p.split("(")[-1].split(")")[0].strip()[:-1]
-            if float(ZMWs_above_thresholds)<50:
-                print("ZMWs_above_thresholds:"+ZMWs_above_thresholds)
-                print("ERROR, premade IsoSeq primer might not suitable, please manually change it to the correct primer sequence.")  
-        subprocess.run(["mv ../../../"+qryfile_dir+qry_file+" "+base_path+"/output0_preparation/qry_complete/"],shell=True)
-        middle_time2=timeit.default_timer()
-        print('     The current subreads file is processed: %.0f Seconds'%(middle_time2-middle_time1))
-        
-        os.chdir("../") 
-        print()
-        i+=1   
-    os.chdir("../") 
+    for job_name,error_list in sample_pool_imap(ccs_onechunk,ccs_task_list,ccs_job_num):
+        i+=1
+        dict_sample_error[ccs_task_list[i-1][1]]+=error_list
+        print_progress("          ccs progress "+str(i)+"/"+str(len(ccs_task_list))+", finished: "+job_name)
+    end_progress()
+    lima_task_list=[]
+    lima_job_num=max(1,min(int(thread),qry_len))
+    for qry_file in qry_list:
+        lima_task_list.append([os.path.join(base_path,qryfile_dir,qry_file),qry_file[:-4],int(ccs_chunk),str(max(1,int(thread)//lima_job_num))])
+    print("     2-lima")
+    i=0
+    for print_list,error_list in sample_pool_imap(lima_onesample,lima_task_list,lima_job_num):
+        i+=1
+        qry_name=lima_task_list[i-1][1]
+        print("     Subreads file progress "+str(i)+"/"+str(qry_len)+": "+qry_name)
+        for oneline in print_list:
+            print(oneline)
+        sample_dir="./1ccs_2lima/out_"+qry_name+"/"
+        #A failed subreads file stays in its directory, so the next build processes it again.
+        record_stage("1ccs_2lima/out_"+qry_name,dict_sample_key[qry_name],[sample_dir+"1-ccs/ROI.bam",sample_dir+"2-lima/FLNC.primer_5p--primer_3p.bam",sample_dir+"2-lima/FLNC.lima.report",sample_dir+"2-lima/FLNC.lima.summary"],
+            dict_sample_error[qry_name]+error_list)
+        move_qry_complete(lima_task_list[i-1][0])
+    middle_time2=timeit.default_timer()
+    record_usage("1ccs_2lima",usage_start,qry_len)
+    print('     All subreads files are processed: %.0f Seconds'%(middle_time2-middle_time1))
+    print()
     print ("     Step1 and step2 in all samples were completed.")
     print()
     ##step3-Collect files from step1step2.
     print("     3-all_FLNC")
-    subprocess.run(["mkdir ./3-all_FLNC"],shell=True)
+    usage_start=get_usage()
+    FLNC_read_num=None
     for root, dirs, files in os.walk("./", topdown=False):
         current_folder_arr=dirs
     if "1ccs_2lima" not in current_folder_arr:
         print ("ERROR, folder of ./1ccs_2lima missing.")
         exit()
-    for root2, dirs2, files2 in os.walk("./1ccs_2lima/", topdown=False):
-        sample_num=len(dirs2)
-        outdir_arr=dirs2
+    #Each sample is trimmed and mapped on its own under sample/ of step 3 and step 4, so a subreads file added to an existing build
+    #is the only one processed by ccs, lima, trim_isoseq_polyA and minimap2; the merged files are then rebuilt from the per-sample files.
+    subprocess.run(["mkdir -p ./3-all_FLNC/sample"],shell=True)
+    outdir_arr=sorted(x for x in os.listdir("./1ccs_2lima/") if os.path.isdir("./1ccs_2lima/"+x))
+    sample_num=len(outdir_arr)
     sample_arr=[]
     i=0
     for onesample_outdir in outdir_arr:
@@ -797,343 +1718,485 @@ if sys.argv[1] =="build":
             print("ERROR, "+FLNC_dir+" doesn't have FLNC.primer_5p--primer_3p.bam");exit()
         qry_size = os.path.getsize(FLNC_dir+"/FLNC.primer_5p--primer_3p.bam")
         print("     File collection:"+str(i)+"/"+str(sample_num)+": "+onesample+'_FLNC.bam\t%.3f' % (qry_size / 1024 / 1024)+' Mbytes')
-        subprocess.run(["cp "+FLNC_dir+"/FLNC.primer_5p--primer_3p.bam ./"+onesample+"_FLNC.bam"],shell=True)
-        with open (FLNC_dir+"/FLNC.lima.report","r",encoding="ISO-8859-1") as f:
+        sample_prefix="./3-all_FLNC/sample/"+onesample
+        stage_key=get_stage_key(["samtools fasta","polyA 15","trim_isoseq_polyA -G","rmdup -n"],[FLNC_dir+"FLNC.primer_5p--primer_3p.bam",FLNC_dir+"FLNC.lima.report"])
+        if stage_done("3-all_FLNC/"+onesample,stage_key):
+            print("          Inputs and outputs are unchanged, skipped")
+            continue
+        with open (FLNC_dir+"/FLNC.lima.report","r",encoding="ISO-8859-1") as f, open_output(sample_prefix+".ccs_sample","w") as f2:
             for line in f.readlines():
                 eachline=line.strip()
                 eachline_arr=eachline.split("\t")
                 newline=eachline_arr[0]+"/ccs\t"+onesample
-                with open ("./3-all_FLNC/ccs_sample","a",encoding="utf-8") as f2:
-                    f2.write(newline+"\n")
-                    f2.close()
-    if sample_num==1:
-        subprocess.run(["mv *.bam ./3-all_FLNC/all_FLNC.bam"],shell=True)
+                f2.write(newline+"\n")
+        #The FLNC bam files are unaligned, each is converted to fasta and trimmed without being merged and sorted.
+        print("          Convert FLNC bam to fasta and trim polyA")
+        read_num,error_list=trim_FLNC_onesample(FLNC_dir+"FLNC.primer_5p--primer_3p.bam",sample_prefix+".nopolyA.fa",thread)
+        print("          FLNC reads: "+str(read_num))
+        record_stage("3-all_FLNC/"+onesample,stage_key,[sample_prefix+".ccs_sample",sample_prefix+".nopolyA.fa"],error_list)
+    #A read name found in more than one sample is kept in the first sample only.
+    stage_key=get_stage_key(["merge"],["./3-all_FLNC/sample/"+onesample+x for onesample in sample_arr for x in (".ccs_sample",".nopolyA.fa")])
+    if stage_done("3-all_FLNC",stage_key):
+        print("     Merged FLNC reads are unchanged, skipped")
     else:
-        print("     Merge 5p-3p bam files")
-        cmd="samtools merge ./3-all_FLNC/all_FLNC.bam *.bam";subprocess.run([cmd],shell=True) 
-        subprocess.run(["rm  *.bam"],shell=True)
-    cmd="samtools sort -@  "+thread+" -o ./3-all_FLNC/all_FLNC_sort.bam ./3-all_FLNC/all_FLNC.bam 1>/dev/null 2>&1";subprocess.run([cmd],shell=True) 
-    subprocess.run(["rm ./3-all_FLNC/all_FLNC.bam"],shell=True)
-    #cmd="pbindex ./3-all_FLNC/all_FLNC_sort.bam ";subprocess.run([cmd],shell=True) 
-    cmd="bedtools bamtofastq -i ./3-all_FLNC/all_FLNC_sort.bam -fq ./3-all_FLNC/all_FLNC.fq";subprocess.run([cmd],shell=True) 
-    cmd="awk '{if(NR%4 == 1){print \">\" substr($0, 2)}}{if(NR%4 == 2){print}}' ./3-all_FLNC/all_FLNC.fq > ./3-all_FLNC/all_FLNC.fa";subprocess.run([cmd],shell=True) 
-    subprocess.run(["rm ./3-all_FLNC/all_FLNC.fq"],shell=True)
-    with open("./3-all_FLNC/all_FLNC.fa",'r') as r:
-        with open("./3-all_FLNC/all_FLNC.fa_polyA10","w") as w:
-            for eachline in r:
-                if eachline.startswith(">"):oneline=eachline.strip()+'\n'
-                else:oneline=eachline.strip()+"AAAAAAAAAAAAAAA"+'\n'
-                w.write(oneline)
-    subprocess.run(["rm ./3-all_FLNC/all_FLNC.fa"],shell=True)
-    cmd="trim_isoseq_polyA -i ./3-all_FLNC/all_FLNC.fa_polyA10  -t "+thread+" -G > ./3-all_FLNC/all_FLNC_nopolyA.fa 2> ./3-all_FLNC/all_FLNC_nopolyA.log";subprocess.run([cmd],shell=True) 
-    subprocess.run(["rm ./3-all_FLNC/all_FLNC.fa_polyA10"],shell=True)
-    subprocess.run(["seqkit rmdup -n ./3-all_FLNC/all_FLNC_nopolyA.fa > ./3-all_FLNC/all_FLNC_nopolyA.fa.uniq 2>/dev/null"],shell=True)
-    subprocess.run(["rm ./3-all_FLNC/all_FLNC_nopolyA.fa"],shell=True)
-    subprocess.run(["mv ./3-all_FLNC/all_FLNC_nopolyA.fa.uniq ./3-all_FLNC/all_FLNC_nopolyA.fa"],shell=True)
+        print("     Merge FLNC reads of "+str(sample_num)+" samples")
+        name_set=set()
+        with open_output("./3-all_FLNC/ccs_sample","w") as f2, open_output("./3-all_FLNC/all_FLNC_nopolyA.fa","w") as f3:
+            for onesample in sample_arr:
+                with open ("./3-all_FLNC/sample/"+onesample+".ccs_sample","r",encoding="ISO-8859-1") as f:
+                    for line in f:
+                        f2.write(line)
+                with open ("./3-all_FLNC/sample/"+onesample+".nopolyA.fa","r",encoding="ISO-8859-1") as f:
+                    for header,seq in iter_fasta_record(f):
+                        name=header.split()[0]
+                        if name in name_set:continue
+                        name_set.add(name)
+                        f3.write(header+"\n"+"".join([seq[x:x+60]+"\n" for x in range(0,len(seq),60)]))
+        FLNC_read_num=len(name_set)
+        print("          FLNC reads: "+str(FLNC_read_num))
+        name_set=set()
+        write_fasta_index("./3-all_FLNC/all_FLNC_nopolyA.fa")
+        record_stage("3-all_FLNC",stage_key,["./3-all_FLNC/ccs_sample","./3-all_FLNC/all_FLNC_nopolyA.fa","./3-all_FLNC/all_FLNC_nopolyA.fa.fai"])
 
+    record_usage("3-all_FLNC",usage_start,FLNC_read_num)
     print ("     4-all_FLNC_minimap2ref")
-    subprocess.run(["mkdir ./4-all_FLNC_minimap2ref"],shell=True)
-    print ("          Map and sort")
-    subprocess.run(["cp ../"+ref+" ./4-all_FLNC_minimap2ref/ref.fa"],shell=True)
-    cmd="minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no ./4-all_FLNC_minimap2ref/ref.fa ./3-all_FLNC/all_FLNC_nopolyA.fa > ./4-all_FLNC_minimap2ref/minimap.sam 2>/dev/null";subprocess.run([cmd],shell=True) 
-    cmd="samtools view -bS ./4-all_FLNC_minimap2ref/minimap.sam > ./4-all_FLNC_minimap2ref/minimap.bam -@ "+thread;subprocess.run([cmd],shell=True)
-    cmd="samtools sort ./4-all_FLNC_minimap2ref/minimap.bam -@ "+thread+" -o ./4-all_FLNC_minimap2ref/minimap.sort.bam 1>/dev/null 2>&1";subprocess.run([cmd],shell=True) 
-    cmd="samtools view -h ./4-all_FLNC_minimap2ref/minimap.sort.bam > ./4-all_FLNC_minimap2ref/minimap.sort.sam -@ "+thread;subprocess.run([cmd],shell=True) 
-    cmd="samtools index  ./4-all_FLNC_minimap2ref/minimap.sort.bam ";subprocess.run([cmd],shell=True) 
-    subprocess.run(["rm ./4-all_FLNC_minimap2ref/minimap.sam ./4-all_FLNC_minimap2ref/minimap.bam"],shell=True) 
-    cmd="paftools.js sam2paf ./4-all_FLNC_minimap2ref/minimap.sort.sam > ./4-all_FLNC_minimap2ref/minimap.sort.paf";subprocess.run([cmd],shell=True) 
-    
-    print ("          Get information of ccs alignment(align_start,align_end,TSS,PAS)")
-    with open ("./4-all_FLNC_minimap2ref/FLNC_inform","w",encoding="utf-8") as f2:
-        f2.write("ccs_name"+"\t"+"align_chr"+"\t"+"strand"+"\t"+"align_start"+"\t"+"align_end"+"\t"+"TSS"+"\t"+"PAS"+"\t"+"TSS_PAS_mark"+"\t"+"intron_mark"+"\n")
-        f2.close() 
-    with open  ("./4-all_FLNC_minimap2ref/minimap.sort.paf","r",encoding="ISO-8859-1") as f:
-        paf_line_num=len(f.readlines())
+    usage_start=get_usage()
+    FLNC_inform_num=None
+    subprocess.run(["mkdir -p ./4-all_FLNC_minimap2ref/sample"],shell=True)
+    force_symlink(os.path.join(base_path,ref),"./4-all_FLNC_minimap2ref/ref.fa")
+    force_symlink(os.path.abspath(get_minimap2_index("./4-all_FLNC_minimap2ref/ref.fa",thread)),"./4-all_FLNC_minimap2ref/ref.mmi")
     i=0
-    with open  ("./4-all_FLNC_minimap2ref/minimap.sort.paf","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            print("          Get ccs information: "+str(i-1)+"/"+str(paf_line_num-1), end="\r")
-            eachline= line.strip()
-            eachline_arr=eachline.split("\t")
-            ccs_name	=eachline_arr[0]
-            ccs_len	        =eachline_arr[1]
-            ccs_align_start	=eachline_arr[2]    
-            ccs_align_end	=eachline_arr[3]
-            strand		=eachline_arr[4]
-            align_chr	=eachline_arr[5]
-            align_start	=str(int(eachline_arr[7])+1)   
-            align_end	=eachline_arr[8]
-            if strand=="+":	PAS=align_end;		TSS=align_start
-            else: 		PAS=align_start;	TSS=align_end
-            if    int(ccs_align_start)<=int(max_fuzzy_TSS) and int(ccs_len)-int(ccs_align_end)<=int(max_fuzzy_PAS): TSS_PAS_mark="TSS_PAS"
-            elif  int(ccs_align_start)>int(max_fuzzy_TSS)  and int(ccs_len)-int(ccs_align_end)<=int(max_fuzzy_PAS): TSS_PAS_mark="noTSS_PAS"
-            elif  int(ccs_align_start)<=int(max_fuzzy_TSS) and int(ccs_len)-int(ccs_align_end)>int(max_fuzzy_PAS):  TSS_PAS_mark="TSS_noPAS"
-            else: TSS_PAS_mark="noTSS_noPAS"
-            if abs((int(align_end)-int(align_start))-(int(ccs_align_end)-int(ccs_align_start)))<40: intron_mark="nointron"
-            else:intron_mark="normal"
-            new_line=ccs_name+"\t"+align_chr+"\t"+strand+"\t"+align_start+"\t"+align_end+"\t"+TSS+"\t"+PAS+"\t"+TSS_PAS_mark+"\t"+intron_mark
-            with open ("./4-all_FLNC_minimap2ref/FLNC_inform","a",encoding="utf-8") as f2:
-                f2.write(new_line+"\n") 
-                f2.close() 
-    print()  
-    #Delete multiple alignment
-    subprocess.run(["sort -n ./4-all_FLNC_minimap2ref/FLNC_inform | uniq > ./4-all_FLNC_minimap2ref/FLNC_inform.uniq"],shell=True)
-    subprocess.run(["mv ./4-all_FLNC_minimap2ref/FLNC_inform.uniq ./4-all_FLNC_minimap2ref/FLNC_inform"],shell=True)
-    subprocess.run(["cut -f 1 ./4-all_FLNC_minimap2ref/FLNC_inform > ./4-all_FLNC_minimap2ref/FLNC_inform.f1"],shell=True)
-    subprocess.run(["sort  ./4-all_FLNC_minimap2ref/FLNC_inform.f1|uniq -d > ./4-all_FLNC_minimap2ref/FLNC_inform.f1.non-uniq"],shell=True) 
-    
-    with open ("./4-all_FLNC_minimap2ref/FLNC_inform.f1.non-uniq","r",encoding="ISO-8859-1") as f:
-        delete_list=[col[0] for col in csv.reader(f,delimiter='\t')]
-    with open ("./4-all_FLNC_minimap2ref/FLNC_inform","r",encoding="ISO-8859-1") as f:
-        FLNA_PAS_len=len(f.readlines())
-    i=0;last_ccs="";last_deleted_ccs=""
-    with open ("./4-all_FLNC_minimap2ref/FLNC_inform","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            print("          Delete Non-specific alignment: "+str(i-1)+"/"+str(FLNA_PAS_len-1),end="\r")
-            eachline=line.strip()     
-            eachline_arr=eachline.split("\t")
-            one_ccs=eachline_arr[0]
-            if last_deleted_ccs!="" and one_ccs!=last_ccs:
-                delete_list.remove(last_deleted_ccs)
-                last_deleted_ccs=""
-            if one_ccs  not in delete_list:
-                last_deleted_ccs==""
-                with open ("./4-all_FLNC_minimap2ref/FLNC_inform.uniq","a",encoding="utf-8") as f2:
-                    f2.write(eachline+"\n")
-                    f2.close()
-            else: last_deleted_ccs= one_ccs
-            last_ccs=one_ccs
-    print()
-    subprocess.run(["rm ./4-all_FLNC_minimap2ref/FLNC_inform ./4-all_FLNC_minimap2ref/FLNC_inform.f1 ./4-all_FLNC_minimap2ref/FLNC_inform.f1.non-uniq"],shell=True)
+    for onesample in sample_arr:
+        i+=1
+        sample_prefix="./4-all_FLNC_minimap2ref/sample/"+onesample
+        print ("     Map and sort "+str(i)+"/"+str(sample_num)+": "+onesample)
+        stage_key=get_stage_key([" ".join(minimap2_index_opt),"minimap2 -ax splice -uf -k 14 --secondary=no",max_fuzzy_TSS,max_fuzzy_PAS],["./3-all_FLNC/sample/"+onesample+".nopolyA.fa",os.path.join(base_path,ref)])
+        if stage_done("4-all_FLNC_minimap2ref/"+onesample,stage_key):
+            print("          Inputs and outputs are unchanged, skipped")
+            continue
+        print ("          Get information of ccs alignment(align_start,align_end,TSS,PAS)")
+        error_list=map_FLNC_onesample("./3-all_FLNC/sample/"+onesample+".nopolyA.fa","./4-all_FLNC_minimap2ref/ref.mmi",sample_prefix+".sort.bam",sample_prefix+".FLNC_inform",thread,max_fuzzy_TSS,max_fuzzy_PAS)
+        record_stage("4-all_FLNC_minimap2ref/"+onesample,stage_key,[sample_prefix+".sort.bam",sample_prefix+".FLNC_inform"],error_list)
+    sample_bam_list=["./4-all_FLNC_minimap2ref/sample/"+onesample+".sort.bam" for onesample in sample_arr]
+    sample_fa_list=["./3-all_FLNC/sample/"+onesample+".nopolyA.fa" for onesample in sample_arr]
+    stage_key=get_stage_key(["samtools merge","first sample of a read"],sample_bam_list+["./4-all_FLNC_minimap2ref/sample/"+onesample+".FLNC_inform" for onesample in sample_arr]+sample_fa_list)
+    if stage_done("4-all_FLNC_minimap2ref",stage_key):
+        print("     Merged alignments are unchanged, skipped")
+    else:
+        print ("     Merge alignments of "+str(sample_num)+" samples")
+        #As in the merged fasta, a ccs found in more than one sample is taken from the first sample, in the alignments and in FLNC_inform.uniq.
+        sample_dup_list=get_sample_dup_names(sample_fa_list)
+        error_list=[]
+        merge_bam_list=[]
+        for onesample,sample_bam,dup_set in zip(sample_arr,sample_bam_list,sample_dup_list):
+            if dup_set:
+                print("          "+onesample+": "+str(len(dup_set))+" ccs found in an earlier sample are left out")
+                merge_bam_list.append("./4-all_FLNC_minimap2ref/sample/"+onesample+".nodup.bam")
+                error_list+=write_bam_without_names(sample_bam,merge_bam_list[-1],dup_set,thread)
+            else:
+                merge_bam_list.append(sample_bam)
+        result=subprocess.run(["samtools","merge","-f","-@",thread,"./4-all_FLNC_minimap2ref/minimap.sort.bam"]+merge_bam_list,stderr=subprocess.DEVNULL)
+        error_list+=tool_error("samtools merge",result.returncode,"the sample alignments")
+        for x in merge_bam_list:
+            if x.endswith(".nodup.bam") and os.path.exists(x):
+                os.remove(x)
+        cmd="samtools index  ./4-all_FLNC_minimap2ref/minimap.sort.bam ";result=subprocess.run([cmd],shell=True) 
+        error_list+=tool_error("samtools index",result.returncode,"minimap.sort.bam")
+        #cDNA_cupcake reads the sorted SAM.
+        cmd="samtools view -h ./4-all_FLNC_minimap2ref/minimap.sort.bam > ./4-all_FLNC_minimap2ref/minimap.sort.sam -@ "+thread;result=subprocess.run([cmd],shell=True) 
+        error_list+=tool_error("samtools view",result.returncode,"minimap.sort.bam")
+        if error_list:
+            stop_stage("4-all_FLNC_minimap2ref",error_list)
+        FLNC_inform_list=[]
+        for onesample,dup_set in zip(sample_arr,sample_dup_list):
+            with open ("./4-all_FLNC_minimap2ref/sample/"+onesample+".FLNC_inform","r",encoding="ISO-8859-1") as f:
+                for line in f:
+                    if line.split("\t",1)[0] in dup_set:continue
+                    FLNC_inform_list.append(line)
+        with open_output("./4-all_FLNC_minimap2ref/FLNC_inform.uniq","w") as f2:
+            f2.write("ccs_name"+"\t"+"align_chr"+"\t"+"strand"+"\t"+"align_start"+"\t"+"align_end"+"\t"+"TSS"+"\t"+"PAS"+"\t"+"TSS_PAS_mark"+"\t"+"intron_mark"+"\n")
+            for line in sorted(FLNC_inform_list):
+                f2.write(line)
+        FLNC_inform_num=len(FLNC_inform_list)
+        sample_dup_list=FLNC_inform_list=[]
+        record_stage("4-all_FLNC_minimap2ref",stage_key,["./4-all_FLNC_minimap2ref/minimap.sort.bam","./4-all_FLNC_minimap2ref/minimap.sort.bam.bai","./4-all_FLNC_minimap2ref/minimap.sort.sam","./4-all_FLNC_minimap2ref/FLNC_inform.uniq"])
 
+    record_usage("4-all_FLNC_minimap2ref",usage_start,FLNC_inform_num)
     print ("     5-cDNA_cupcake")
-    subprocess.run(["mkdir ./5-cDNA_cupcake"],shell=True)
-    cmd="collapse_isoforms_by_sam.py -c 0.95 -i 0.85 --max_5_diff  10000 --max_3_diff  10000 --max_fuzzy_junction "+str(max_fuzzy_junction)+" --input ./3-all_FLNC/all_FLNC_nopolyA.fa -s ./4-all_FLNC_minimap2ref/minimap.sort.sam -o ./5-cDNA_cupcake/cDNA_cupcake --cpus "+thread+" 1> ./5-cDNA_cupcake/cDNA_cupcake.log1 2> ./5-cDNA_cupcake/cDNA_cupcake.log2"
-    subprocess.run([cmd],shell=True) 
-    dict_gene_info={};gene_list=[]
-    print("          gff to geneid——transcript——transcript.num")
-    with open ("./5-cDNA_cupcake/cDNA_cupcake.collapsed.gff","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            if eachline_arr[2]=="transcript":
-                chromosome	=eachline_arr[0]
-                strand		=eachline_arr[6]
-                start		=eachline_arr[3]
-                end		=eachline_arr[4]
-                gffcol9_arr=eachline_arr[8].split(";")                                          
-                transcript_id	=gffcol9_arr[0].strip()[15:-1]
-                gene_id		=gffcol9_arr[1].strip()[9:-1]
-                if gene_id not in gene_list:	gene_list.append(gene_id)
-                with open("./5-cDNA_cupcake/gene_transcript","a",encoding="utf-8") as f2:
+    usage_start=get_usage()
+    stage_key=get_stage_key(["collapse_isoforms_by_sam.py -c 0.95 -i 0.85 --max_5_diff 10000 --max_3_diff 10000",max_fuzzy_junction],["./3-all_FLNC/all_FLNC_nopolyA.fa","./4-all_FLNC_minimap2ref/minimap.sort.sam"])
+    if stage_done("5-cDNA_cupcake",stage_key):
+        print("          Inputs and outputs are unchanged, skipped")
+    else:
+        subprocess.run(["rm -rf ./5-cDNA_cupcake"],shell=True)
+        subprocess.run(["mkdir ./5-cDNA_cupcake"],shell=True)
+        cmd="collapse_isoforms_by_sam.py -c 0.95 -i 0.85 --max_5_diff  10000 --max_3_diff  10000 --max_fuzzy_junction "+str(max_fuzzy_junction)+" --input ./3-all_FLNC/all_FLNC_nopolyA.fa -s ./4-all_FLNC_minimap2ref/minimap.sort.sam -o ./5-cDNA_cupcake/cDNA_cupcake --cpus "+thread+" 1> ./5-cDNA_cupcake/cDNA_cupcake.log1 2> ./5-cDNA_cupcake/cDNA_cupcake.log2"
+        result=subprocess.run([cmd],shell=True) 
+        if result.returncode!=0:
+            stop_stage("5-cDNA_cupcake",tool_error("collapse_isoforms_by_sam.py",result.returncode,"minimap.sort.sam")+["See ./output0_preparation/5-cDNA_cupcake/cDNA_cupcake.log2"])
+        dict_gene_info={};gene_list=[]
+        print("          gff to geneid——transcript——transcript.num")
+        with open ("./5-cDNA_cupcake/cDNA_cupcake.collapsed.gff","r",encoding="ISO-8859-1") as f, open_output("./5-cDNA_cupcake/gene_transcript") as f2, open_output("./5-cDNA_cupcake/transcript_info") as f3:
+            for line in f.readlines():
+                eachline=line.strip()
+                eachline_arr=eachline.split("\t")
+                if eachline_arr[2]=="transcript":
+                    chromosome	=eachline_arr[0]
+                    strand		=eachline_arr[6]
+                    start		=eachline_arr[3]
+                    end		=eachline_arr[4]
+                    gffcol9_arr=eachline_arr[8].split(";")                                          
+                    transcript_id	=gffcol9_arr[0].strip()[15:-1]
+                    gene_id		=gffcol9_arr[1].strip()[9:-1]
+                    if gene_id not in gene_list:	gene_list.append(gene_id)
                     f2.write(gene_id+"\t"+transcript_id+"\n")
-                    f2.close()
-                with open("./5-cDNA_cupcake/transcript_info","a",encoding="utf-8") as f3:
                     f3.write(transcript_id+"\t"+chromosome+"\t"+strand+"\t"+start+"\t"+end+"\n")
-                    f3.close()                
-                if gene_id not in dict_gene_info:		dict_gene_info[gene_id]=[chromosome,strand,start,end]
-                else:
-                    if int(start)<int(dict_gene_info[gene_id][2]):	dict_gene_info[gene_id][2]=start
-                    if int(end)>int(dict_gene_info[gene_id][3]):	dict_gene_info[gene_id][3]=end
-    for onegene in gene_list:
-        with open ("./5-cDNA_cupcake/gene_info","a",encoding="utf-8") as f4:
-            onegene_info	=dict_gene_info[onegene]
-            newline		=onegene+"\t"+onegene_info[0]+"\t"+onegene_info[1]+"\t"+onegene_info[2]+"\t"+onegene_info[3]
-            f4.write(newline+"\n")
-            f4.close()   
-    subprocess.run(["python ./script/pivot.py  pivot  comma  nohead  noreplace ./5-cDNA_cupcake/gene_transcript ./5-cDNA_cupcake/gene_transcript.pivot"],shell=True)
-    with open ("./5-cDNA_cupcake/gene_transcript.pivot","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            transcript_arr=eachline_arr[1].split(",")
-            transcript_num=len(transcript_arr)
-            with open("./5-cDNA_cupcake/gene_transcript_transcript.num","a",encoding="utf-8") as f2:
-                f2.write(eachline+"\t"+str(transcript_num)+"\n")
-                f2.close()        
-    print("          cDNA_cupcake.collapsed.group.txt to geneid——ccs——ccs.num")
-    r_script = '''
-                library(dplyr,warn.conflicts = F)
-                file<- read.table("./5-cDNA_cupcake/gene_transcript",header=F,stringsAsFactors = F,check.names = F, sep="")
-                names(file) <- c("gene_name","transcript_name")
-                index<- read.table("./5-cDNA_cupcake/cDNA_cupcake.collapsed.group.txt",header=F,stringsAsFactors = F,check.names = F, sep="")
-                names(index) <- c("transcript_name","ccs_name")
-                result <- merge(file,index,by="transcript_name",all.x=FALSE,all.y=FALSE);
-                result2 <- result[,c("gene_name","ccs_name")]
-                write.table (result2,file ="./5-cDNA_cupcake/gene_ccs0", row.names = FALSE, col.names =TRUE, quote = FALSE,sep="\t");  
-    '''
-    robjects.r(r_script)
-    subprocess.run(["python ./script/pivot.py  pivot   comma    nohead  noreplace    ./5-cDNA_cupcake/gene_ccs0  ./5-cDNA_cupcake/gene_ccs.pivot"],shell=True)
-    subprocess.run(["rm   ./5-cDNA_cupcake/gene_ccs0 "],shell=True)
-    with open ("./5-cDNA_cupcake/gene_ccs.pivot","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            ccs_arr=eachline_arr[1].split(",")
-            ccs_num=len(ccs_arr)
-            with open("./5-cDNA_cupcake/gene_ccs_ccs.num","a",encoding="utf-8") as f2:
-                f2.write(eachline+"\t"+str(ccs_num)+"\n")
-                f2.close()  
-    subprocess.run(["python ./script/pivot.py  unpivot   comma    nohead  noreplace    ./5-cDNA_cupcake/gene_ccs.pivot ./5-cDNA_cupcake/gene_ccs  "],shell=True)
-    subprocess.run(["rm ./5-cDNA_cupcake/gene_ccs.pivot"],shell=True)
-    r_script = '''
-                library(dplyr,warn.conflicts = F)
-                file<- read.table("./5-cDNA_cupcake/gene_transcript_transcript.num",header=F,stringsAsFactors = F,check.names = F, sep="")
-                names(file) <- c("gene_name","transcript_arr","transcript_num")
-                index<- read.table("./5-cDNA_cupcake/gene_ccs_ccs.num",header=F,stringsAsFactors = F,check.names = F, sep="")
-                names(index) <- c("gene_name","ccs_arr","ccs_num")
-                result <- right_join(index,file,by="gene_name");
-                result2 <- result[,c("gene_name","transcript_arr","transcript_num","ccs_arr","ccs_num")]
-                write.table (result2,file ="./5-cDNA_cupcake/gene_transcript_num_ccs_num", row.names = FALSE, col.names =TRUE, quote = FALSE,sep="\t");  
-    '''
-    robjects.r(r_script)
-    subprocess.run(["rm ./5-cDNA_cupcake/gene_ccs_ccs.num"],shell=True)
+                    if gene_id not in dict_gene_info:		dict_gene_info[gene_id]=[chromosome,strand,start,end]
+                    else:
+                        if int(start)<int(dict_gene_info[gene_id][2]):	dict_gene_info[gene_id][2]=start
+                        if int(end)>int(dict_gene_info[gene_id][3]):	dict_gene_info[gene_id][3]=end
+        with open_output("./5-cDNA_cupcake/gene_info") as f4:
+            for onegene in gene_list:
+                onegene_info	=dict_gene_info[onegene]
+                newline		=onegene+"\t"+onegene_info[0]+"\t"+onegene_info[1]+"\t"+onegene_info[2]+"\t"+onegene_info[3]
+                f4.write(newline+"\n")
+        gene_transcript_rows=read_tsv("./5-cDNA_cupcake/gene_transcript")
+        gene_transcript_pivot_rows=pivot_rows(gene_transcript_rows,"pivot")
+        write_table("./5-cDNA_cupcake/gene_transcript.pivot",None,gene_transcript_pivot_rows)
+        transcript_num_rows=[row+[str(len(row[1].split(",")))] for row in gene_transcript_pivot_rows]
+        write_table("./5-cDNA_cupcake/gene_transcript_transcript.num",None,transcript_num_rows)
+        print("          cDNA_cupcake.collapsed.group.txt to geneid——ccs——ccs.num")
+        _,group_rows=read_table("./5-cDNA_cupcake/cDNA_cupcake.collapsed.group.txt")
+        join_list=hash_join(gene_transcript_rows,1,group_rows,0)
+        gene_ccs_pivot_rows=pivot_rows([[row[0],index_row[1]] for row,index_row in join_list],"pivot")
+        write_table("./5-cDNA_cupcake/gene_ccs",None,pivot_rows(gene_ccs_pivot_rows,"unpivot"))
+        dict_gene_ccs={row[0]:[row[1],str(len(row[1].split(",")))] for row in gene_ccs_pivot_rows}
+        #All genes of gene_transcript_transcript.num are kept (right join), NA if the gene has no ccs.
+        write_table("./5-cDNA_cupcake/gene_transcript_num_ccs_num",["gene_name","transcript_arr","transcript_num","ccs_arr","ccs_num"],
+            [row[:3]+dict_gene_ccs.get(row[0],["NA","NA"]) for row in transcript_num_rows])
     
+        record_stage("5-cDNA_cupcake",stage_key,["./5-cDNA_cupcake/"+x for x in ("cDNA_cupcake.collapsed.gff","cDNA_cupcake.collapsed.group.txt","gene_transcript","transcript_info","gene_info","gene_transcript.pivot","gene_transcript_transcript.num","gene_ccs","gene_transcript_num_ccs_num")])
+    record_usage("5-cDNA_cupcake",usage_start)
     print ("     6-suppa") 
-    subprocess.run(["mkdir ./6-suppa"],shell=True)
-    cmd="suppa.py generateEvents -i ./5-cDNA_cupcake/cDNA_cupcake.collapsed.gff -o ./6-suppa/suppa -e RI SS SE MX -f ioe  2>/dev/null";subprocess.run([cmd],shell=True) 
-    
-    cmd="cat ./6-suppa/*.ioe > ./6-suppa/AS_all.ioe";subprocess.run([cmd],shell=True) 
-    with open ("./6-suppa/AS_all.ioe","r",encoding="ISO-8859-1") as f:
-        ioe_line_num=len(f.readlines())
-    i=0
-    with open ("./6-suppa/AS_All.ioe.simple","w",encoding="utf-8") as f2:
-        f2.write("event_id"+"\t"+"transcript1"+"\t"+"transcript2"+"\n")
-        f2.close()
-    with open ("./6-suppa/AS_all.ioe","r",encoding="ISO-8859-1") as f:
-       for line in f.readlines():
-            i+=1;transcript2_arr=[]
-            print("          Process ioe file: "+str(i-1)+"/"+str(ioe_line_num-1),end="\r")
-            eachline=line.strip()
-            if "alternative_transcripts" not in eachline:   
-                eachline_arr=eachline.split("\t")
-                event_id			=eachline_arr[2]
-                transcript1_str	=eachline_arr[3]
-                transcript1_arr=transcript1_str.split(",")
-                total_transcript_str	=eachline_arr[4]
-                total_transcript_arr=total_transcript_str.split(",")
-                for k in total_transcript_arr:
-                    if k not in transcript1_arr:
-                        transcript2_arr.append(k)
-                transcript2_str=",".join(transcript2_arr)
-                newline=event_id+"\t"+transcript1_str+"\t"+transcript2_str
-                with open ("./6-suppa/AS_All.ioe.simple","a",encoding="utf-8") as f2:
+    usage_start=get_usage()
+    ioe_event_num=None
+    stage_key=get_stage_key(["suppa.py generateEvents -e RI SS SE MX -f ioe"],["./5-cDNA_cupcake/cDNA_cupcake.collapsed.gff"])
+    if stage_done("6-suppa",stage_key):
+        print("          Inputs and outputs are unchanged, skipped")
+    else:
+        subprocess.run(["rm -rf ./6-suppa"],shell=True)
+        subprocess.run(["mkdir ./6-suppa"],shell=True)
+        cmd="suppa.py generateEvents -i ./5-cDNA_cupcake/cDNA_cupcake.collapsed.gff -o ./6-suppa/suppa -e RI SS SE MX -f ioe  2>/dev/null";result=subprocess.run([cmd],shell=True) 
+        if result.returncode!=0:
+            stop_stage("6-suppa",tool_error("suppa.py generateEvents",result.returncode,"cDNA_cupcake.collapsed.gff"))
+        cmd="cat ./6-suppa/*.ioe > ./6-suppa/AS_all.ioe";result=subprocess.run([cmd],shell=True) 
+        if result.returncode!=0:
+            stop_stage("6-suppa",tool_error("cat",result.returncode,"./6-suppa/*.ioe"))
+        with open ("./6-suppa/AS_all.ioe","r",encoding="ISO-8859-1") as f:
+            ioe_line_num=len(f.readlines())
+        i=0
+        with open ("./6-suppa/AS_All.ioe.simple","w",encoding="utf-8") as f2:
+            f2.write("event_id"+"\t"+"transcript1"+"\t"+"transcript2"+"\n")
+            f2.close()
+        with open ("./6-suppa/AS_all.ioe","r",encoding="ISO-8859-1") as f, open_output("./6-suppa/AS_All.ioe.simple") as f2:
+           for line in f.readlines():
+                i+=1;transcript2_arr=[]
+                print_progress("          Process ioe file: "+str(i-1)+"/"+str(ioe_line_num-1))
+                eachline=line.strip()
+                if "alternative_transcripts" not in eachline:   
+                    eachline_arr=eachline.split("\t")
+                    event_id			=eachline_arr[2]
+                    transcript1_str	=eachline_arr[3]
+                    transcript1_arr=transcript1_str.split(",")
+                    total_transcript_str	=eachline_arr[4]
+                    total_transcript_arr=total_transcript_str.split(",")
+                    for k in total_transcript_arr:
+                        if k not in transcript1_arr:
+                            transcript2_arr.append(k)
+                    transcript2_str=",".join(transcript2_arr)
+                    newline=event_id+"\t"+transcript1_str+"\t"+transcript2_str
                     f2.write(newline+"\n")
-                    f2.close()
-    print() 
-    subprocess.run(["rm ./6-suppa/AS_all.ioe"],shell=True) 
+        end_progress()
+        ioe_event_num=ioe_line_num-1
+        subprocess.run(["rm ./6-suppa/AS_all.ioe"],shell=True) 
     
+        record_stage("6-suppa",stage_key,["./6-suppa/AS_All.ioe.simple"])
+    record_usage("6-suppa",usage_start,ioe_event_num)
     print ("     7-ccs_inform")  
-    subprocess.run(["mkdir ./7-ccs_inform"],shell=True)
-    print("          AS to transcript")
-    subprocess.run(["cut -f 1,2 ./6-suppa/AS_All.ioe.simple > ./7-ccs_inform/1-ioe_simple.transcript1"],shell=True)
-    subprocess.run(["cut -f 1,3 ./6-suppa/AS_All.ioe.simple > ./7-ccs_inform/1-ioe_simple.transcript2"],shell=True)
-    subprocess.run(["sed '1d' ./6-suppa/AS_All.ioe.simple| cut  -f 1 | cut -d ';' -f 1  | sort -n | uniq > ./7-ccs_inform/ASgene.list"],shell=True)
-    r_script = '''
-                library(dplyr,warn.conflicts = F)
-                file<- read.table("./7-ccs_inform/ASgene.list",header=F,stringsAsFactors = F,check.names = F, sep="\t")
-                names(file) <- c("gene_name")
-                index<- read.table("./5-cDNA_cupcake/gene_transcript_num_ccs_num",header=T,stringsAsFactors = F,check.names = F, sep="\t")
-                names(index) <- c("gene_name","transcript_arr","transcript_num","ccs_arr","ccs_num")
-                index2 <- index[,c("gene_name","ccs_num")]
-                result <- merge(file,index2,by="gene_name",all.x=FALSE,all.y=FALSE);
-                result2 <- result[,c("gene_name","ccs_num")]
-                write.table (result2,file ="./7-ccs_inform/ASgene_ccsnum", row.names = FALSE, col.names =F, quote = FALSE,sep="\t");  
-    '''
-    robjects.r(r_script)
-    subprocess.run(["python ./script/pivot.py  unpivot   comma    head  noreplace    ./7-ccs_inform/1-ioe_simple.transcript1   ./7-ccs_inform/1-ioe_simple.transcript1.unpivot"],shell=True)
-    subprocess.run(["python ./script/pivot.py  unpivot   comma    head  noreplace    ./7-ccs_inform/1-ioe_simple.transcript2   ./7-ccs_inform/1-ioe_simple.transcript2.unpivot"],shell=True)
-    print("          AS to transcript to ccs 1/2")
-    r_script = '''
-                library(dplyr,warn.conflicts = F)
-                file<- read.table("./7-ccs_inform/1-ioe_simple.transcript1.unpivot",header=T,stringsAsFactors = F,check.names = F, sep="")
-                names(file) <- c("AS_name","PB_name")
-                index<- read.table("./5-cDNA_cupcake/cDNA_cupcake.collapsed.group.txt",header=F,stringsAsFactors = F,check.names = F, sep="")
-                names(index) <- c("PB_name","ccs_arr")
-                result <- merge(file,index,by="PB_name",all.x=FALSE,all.y=FALSE);
-                result2 <- result[,c("AS_name","ccs_arr")]
-                write.table (result2,file ="./7-ccs_inform/2-AS_ccs.transcript1", row.names = FALSE, col.names =TRUE, quote = FALSE,sep="\t");  
-    '''
-    robjects.r(r_script)
-    print("          AS to transcript to ccs 2/2")
-    r_script = '''
-                library(dplyr,warn.conflicts = F)
-                file<- read.table("./7-ccs_inform/1-ioe_simple.transcript2.unpivot",header=T,stringsAsFactors = F,check.names = F, sep="")
-                names(file) <- c("AS_name","PB_name")
-                index<- read.table("./5-cDNA_cupcake/cDNA_cupcake.collapsed.group.txt",header=F,stringsAsFactors = F,check.names = F, sep="")
-                names(index) <- c("PB_name","ccs_arr")
-                result <- merge(file,index,by="PB_name",all.x=FALSE,all.y=FALSE);
-                result2 <- result[,c("AS_name","ccs_arr")]
-                write.table (result2,file ="./7-ccs_inform/2-AS_ccs.transcript2", row.names = FALSE, col.names =TRUE, quote = FALSE,sep="\t");  
-    '''
-    robjects.r(r_script)
-    subprocess.run(["rm ./7-ccs_inform/1-ioe_simple.transcript1.unpivot ./7-ccs_inform/1-ioe_simple.transcript2.unpivot"],shell=True)
-    subprocess.run(["python ./script/pivot.py  unpivot   comma    head  noreplace    ./7-ccs_inform/2-AS_ccs.transcript1   ./7-ccs_inform/2-AS_ccs.transcript1.unpivot"],shell=True)
-    subprocess.run(["python ./script/pivot.py  unpivot   comma    head  noreplace    ./7-ccs_inform/2-AS_ccs.transcript2   ./7-ccs_inform/2-AS_ccs.transcript2.unpivot"],shell=True)
-    print("          AS to ccs to ccs_inform 1/2")
-    r_script = '''
-                library(dplyr,warn.conflicts = F)
-                file<- read.table("./7-ccs_inform/2-AS_ccs.transcript1.unpivot",header=T,stringsAsFactors = F,check.names = F, sep="")
-                names(file) <- c("AS_name","ccs_name")
-                index<- read.table("./4-all_FLNC_minimap2ref/FLNC_inform.uniq",header=T,stringsAsFactors = F,check.names = F, sep="")
-                names(index) <- c("ccs_name","align_chr","strand","align_start","align_end","TSS","PAS","TSS_PAS_mark")
-                result <- merge(file,index,by="ccs_name",all.x=FALSE,all.y=FALSE);
-                result2 <- result[,c("AS_name","ccs_name","align_chr","strand","align_start","align_end","TSS","PAS","TSS_PAS_mark")]
-                result3 <- arrange(result2,AS_name)
-                write.table (result3,file ="./7-ccs_inform/3-AS_ccs_info.transcript1", row.names = FALSE, col.names =TRUE, quote = FALSE,sep="\t");
-    '''
-    robjects.r(r_script)
-    print("          AS to ccs to ccs_inform 2/2")
-    r_script = '''
-                library(dplyr,warn.conflicts = F)
-                file<- read.table("./7-ccs_inform/2-AS_ccs.transcript2.unpivot",header=T,stringsAsFactors = F,check.names = F, sep="")
-                names(file) <- c("AS_name","ccs_name")
-                index<- read.table("./4-all_FLNC_minimap2ref/FLNC_inform.uniq",header=T,stringsAsFactors = F,check.names = F, sep="")
-                names(index) <- c("ccs_name","align_chr","strand","align_start","align_end","TSS","PAS","TSS_PAS_mark")
-                result <- merge(file,index,by="ccs_name",all.x=FALSE,all.y=FALSE);
-                result2 <- result[,c("AS_name","ccs_name","align_chr","strand","align_start","align_end","TSS","PAS","TSS_PAS_mark")]
-                result3 <- arrange(result2,AS_name)
-                write.table (result3,file ="./7-ccs_inform/3-AS_ccs_info.transcript2", row.names = FALSE, col.names =TRUE, quote = FALSE,sep="\t");  
-    '''
-    robjects.r(r_script)
-    subprocess.run(["rm ./7-ccs_inform/2-AS_ccs.transcript1.unpivot ./7-ccs_inform/2-AS_ccs.transcript2.unpivot"],shell=True)
-    print("          split AS_ccs_info by gene")
-    subprocess.run(["mkdir ./7-ccs_inform/ASccs_split"],shell=True)
-    with open ("./7-ccs_inform/3-AS_ccs_info.transcript1","r",encoding="ISO-8859-1") as f:
-        transcript1_file_num=len(f.readlines())
-    i=0
-    with open ("./7-ccs_inform/3-AS_ccs_info.transcript1","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i>1:
-                print("          Processing transcript1: "+str(i)+"/"+str(transcript1_file_num),end="\r")
-                eachline	=line.strip() 
-                geneid		=eachline.split(";")[0]
-                with open ("./7-ccs_inform/ASccs_split/"+geneid+"_1","a",encoding="utf-8") as f2:
-                    f2.write(eachline+"\n")
-                    f2.close()
-    print()   
-    with open ("./7-ccs_inform/3-AS_ccs_info.transcript2","r",encoding="ISO-8859-1") as f:
-        transcript2_file_num=len(f.readlines())
-    i=0
-    with open ("./7-ccs_inform/3-AS_ccs_info.transcript2","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i>1:
-                print("          Processing transcript2: "+str(i)+"/"+str(transcript2_file_num),end="\r")
-                eachline	=line.strip() 
-                geneid		=eachline.split(";")[0]
-                with open ("./7-ccs_inform/ASccs_split/"+geneid+"_2","a",encoding="utf-8") as f2:
-                    f2.write(eachline+"\n")
-                    f2.close()
-    print()
+    usage_start=get_usage()
+    stage_key=get_stage_key(["AS_catalog","ccs id"],["./6-suppa/AS_All.ioe.simple","./5-cDNA_cupcake/gene_transcript_num_ccs_num","./5-cDNA_cupcake/cDNA_cupcake.collapsed.group.txt","./4-all_FLNC_minimap2ref/FLNC_inform.uniq"])
+    if stage_done("7-ccs_inform",stage_key):
+        print("          Inputs and outputs are unchanged, skipped")
+    else:
+        subprocess.run(["rm -rf ./7-ccs_inform"],shell=True)
+        subprocess.run(["mkdir ./7-ccs_inform"],shell=True)
+        print("          AS to transcript")
+        ioe_simple_rows=read_tsv("./6-suppa/AS_All.ioe.simple")
+        write_table("./7-ccs_inform/1-ioe_simple.transcript1",None,[row[:2] for row in ioe_simple_rows])
+        write_table("./7-ccs_inform/1-ioe_simple.transcript2",None,[[row[0],row[2]] for row in ioe_simple_rows])
+        subprocess.run(["sed '1d' ./6-suppa/AS_All.ioe.simple| cut  -f 1 | cut -d ';' -f 1  | sort -n | uniq > ./7-ccs_inform/ASgene.list"],shell=True)
+        _,ASgene_rows=read_table("./7-ccs_inform/ASgene.list")
+        _,gene_ccsnum_rows=read_table("./5-cDNA_cupcake/gene_transcript_num_ccs_num",head=True)
+        join_list=hash_join(ASgene_rows,0,gene_ccsnum_rows,0)
+        write_table("./7-ccs_inform/ASgene_ccsnum",None,[[row[0],index_row[4]] for row,index_row in join_list])
+        _,FLNC_inform_rows=read_table("./4-all_FLNC_minimap2ref/FLNC_inform.uniq",head=True)
+        #Step 5 may have been skipped, so read the ccs groups back from its output.
+        _,group_rows=read_table("./5-cDNA_cupcake/cDNA_cupcake.collapsed.group.txt")
+        for part in ("1","2"):
+            print("          AS to transcript to ccs "+part+"/2")
+            AS_transcript_rows=pivot_rows([[row[0],row[int(part)]] for row in ioe_simple_rows[1:]],"unpivot")
+            join_list=hash_join(AS_transcript_rows,1,group_rows,0)
+            AS_ccs_pivot_rows=[[row[0],index_row[1]] for row,index_row in join_list]
+            write_table("./7-ccs_inform/2-AS_ccs.transcript"+part,["AS_name","ccs_arr"],AS_ccs_pivot_rows)
+            print("          AS to ccs to ccs_inform "+part+"/2")
+            AS_ccs_rows=pivot_rows(AS_ccs_pivot_rows,"unpivot")
+            join_list=hash_join(AS_ccs_rows,1,FLNC_inform_rows,0)
+            #Sorted by AS_name, then by ccs_name from the join (R arrange after merge).
+            join_list.sort(key=lambda x:x[0][0])
+            write_table("./7-ccs_inform/3-AS_ccs_info.transcript"+part,["AS_name","ccs_name","align_chr","strand","align_start","align_end","TSS","PAS","TSS_PAS_mark"],
+                [[row[0]]+index_row[:8] for row,index_row in join_list])
+        ccs_list=[row[0] for row in FLNC_inform_rows]
+        group_rows=FLNC_inform_rows=join_list=[]
+        print("          index AS_ccs_info by gene")
+        dict_gene_lines={}
+        for part in ("1","2"):
+            with open ("./7-ccs_inform/3-AS_ccs_info.transcript"+part,"r",encoding="ISO-8859-1") as f:
+                f.readline()
+                for line in f:
+                    eachline	=line.strip() 
+                    geneid		=eachline.split(";")[0]
+                    dict_gene_lines.setdefault(geneid,{}).setdefault(part,[]).append(eachline)
+        print("          ccs id")
+        dict_ccs_id=write_ccs_name(ccs_list,"./7-ccs_inform/ccs_name")
+        write_ASccs_store(dict_gene_lines,"./7-ccs_inform/ASccs_store",dict_ccs_id)
+        print("          AS_catalog")
+        write_AS_catalog([row[0] for row in ioe_simple_rows[1:]],"./7-ccs_inform/AS_catalog")
+        print()
+        record_stage("7-ccs_inform",stage_key,["./7-ccs_inform/"+x for x in ("1-ioe_simple.transcript1","1-ioe_simple.transcript2","ASgene.list","ASgene_ccsnum","2-AS_ccs.transcript1","2-AS_ccs.transcript2","3-AS_ccs_info.transcript1","3-AS_ccs_info.transcript2","ccs_name","ASccs_store","ASccs_store.index","AS_catalog","AS_catalog.index")])
+    record_usage("7-ccs_inform",usage_start)
 #################################################################################################################################################################
 #################################################################################################################################################################
 #Start AS-AS analysis.
+#Log-factorial table shared by all Fisher tests, log_factorial_arr[x]=log(x!).
+#It only grows, so one table serves every gene handled by a worker.
+log_factorial_arr=[]
+def get_log_factorial(max_num):
+    global log_factorial_arr
+    if len(log_factorial_arr)<=max_num:
+        log_factorial_arr=gammaln(np.arange(max(int(max_num)+1,2*len(log_factorial_arr)))+1)
+    return log_factorial_arr
+
+#Fisher exact test (two-sided) and chi-square test (Yates' correction) of many 2x2 tables in one pass.
+#table_arr[table]=[[a,b],[c,d]], return oddsr_arr,fisher_pvalue_arr,chi_square_value_arr,chi_square_pvalue_arr.
+#Tables with an empty row or column get oddsr=nan, fisher_pvalue=1 and chi_square=nan like scipy.
+def batch_fisherchi2(table_arr):
+    table_arr=np.asarray(table_arr,dtype=np.int64).reshape(-1,2,2)
+    a=table_arr[:,0,0];	b=table_arr[:,0,1];	c=table_arr[:,1,0];	d=table_arr[:,1,1]
+    row1=a+b;	row2=c+d;	col1=a+c;	col2=b+d;	n=row1+row2
+    empty_mark=(row1==0)|(row2==0)|(col1==0)|(col2==0)
+    with np.errstate(divide="ignore",invalid="ignore"):
+        oddsr_arr=np.where((b>0)&(c>0),(a*d)/np.maximum(b*c,1),np.inf)
+        oddsr_arr[empty_mark]=np.nan
+        ##Fisher: sum the hypergeometric probabilities of all tables with the same margins that are not more likely than the observed one.
+        log_factorial=get_log_factorial(n.max() if len(n) else 0)
+        x_min=np.maximum(0,row1+col1-n)
+        x_max=np.minimum(row1,col1)
+        x_arr=x_min[:,None]+np.arange((x_max-x_min).max()+1 if len(n) else 1)
+        x_mark=x_arr<=x_max[:,None]
+        x_arr=np.where(x_mark,x_arr,x_min[:,None])
+        log_margin=log_factorial[row1]+log_factorial[row2]+log_factorial[col1]+log_factorial[col2]-log_factorial[n]
+        def log_pmf(x):
+            return log_margin[:,None]-log_factorial[x]-log_factorial[row1[:,None]-x]-log_factorial[col1[:,None]-x]-log_factorial[row2[:,None]-col1[:,None]+x]
+        pmf_arr=np.exp(log_pmf(x_arr))
+        pexact_arr=np.exp(log_pmf(a[:,None]))
+        fisher_pvalue_arr=np.where(x_mark&(pmf_arr<=pexact_arr*(1+1e-7)),pmf_arr,0).sum(axis=1)
+        fisher_pvalue_arr=np.minimum(fisher_pvalue_arr,1.0)
+        fisher_pvalue_arr[empty_mark]=1.0
+        ##Chi-square with Yates' correction: every |observed-expected| is reduced by at most 0.5.
+        expected_arr=np.stack([row1*col1,row1*col2,row2*col1,row2*col2],axis=1)/n[:,None]
+        observed_arr=table_arr.reshape(-1,4)
+        diff_arr=np.abs(observed_arr-expected_arr)
+        diff_arr=diff_arr-np.minimum(0.5,diff_arr)
+        chi_square_value_arr=(diff_arr**2/expected_arr).sum(axis=1)
+        chi_square_value_arr[empty_mark]=np.nan
+        chi_square_pvalue_arr=chdtrc(1,chi_square_value_arr)
+    return oddsr_arr,fisher_pvalue_arr,chi_square_value_arr,chi_square_pvalue_arr
+
+#Split the reads covering each AS group into the four cells of its 2x2 table, group by group.
+#AS_form[AS,ccs]=0/1/2, group_arr[group]=AS indexes of a pair/RI1234/RI123 group (group_type).
+#Yield (cell_num, cell_mask[cell,ccs], fisherchi2), cells in the order form1_form1, form1_form2, form2_form1, form2_form2,
+#fisherchi2=(oddsr,fisher_pvalue,chi_square_value,chi_square_pvalue) of the 2x2 table.
+def iter_ASgroup_cell(AS_form,ccs_mapstart,ccs_mapend,AS_start_arr,AS_end_arr,group_arr,group_type):
+    #At most about 4M cells per member are held at once.
+    chunk_size=max(1,4194304//max(1,AS_form.shape[1]))
+    for chunk_start in range(0,len(group_arr),chunk_size):
+        chunk_arr=group_arr[chunk_start:chunk_start+chunk_size]
+        form=AS_form[chunk_arr.T]
+        all_AS_start=AS_start_arr[chunk_arr].min(axis=1)
+        all_AS_end=AS_end_arr[chunk_arr].max(axis=1)
+        cover=(ccs_mapstart<=all_AS_start[:,None])&(ccs_mapend>=all_AS_end[:,None])
+        if group_type=="pair":
+            cover&=form[1]!=0
+            cond_list=[(form[0]==1)&(form[1]==1),(form[0]==1)&(form[1]==2),(form[0]==2)&(form[1]==1),(form[0]==2)&(form[1]==2)]
+        elif group_type=="RI1234":
+            cover&=(form[2]!=0)|(form[3]!=0)
+            cond_list=[(form[1]==1)&(form[3]==1),(form[0]==1)&(form[3]==2),(form[1]==2)&(form[2]==1),(form[0]==2)&(form[2]==2)]
+        elif group_type=="RI123":
+            cover&=form[2]!=0
+            cond_list=[(form[1]==1)&(form[2]==1),(form[0]==1)&(form[2]==2),(form[1]==2)&(form[2]==1),(form[0]==2)&(form[2]==2)]
+        #A read goes to the first matching cell.
+        cell_list=[]
+        for cond in cond_list:
+            cell=cover&cond
+            cover&=~cell
+            cell_list.append(cell)
+        cell_mask=np.stack(cell_list,axis=1)
+        cell_num=cell_mask.sum(axis=2)
+        fisherchi2_arr=np.stack(batch_fisherchi2(cell_num),axis=1).tolist()
+        for x in range(len(chunk_arr)):
+            yield cell_num[x].tolist(),cell_mask[x],fisherchi2_arr[x]
+
+#Read-by-event matrix of one gene: gene_AS_list (the events of transcript1, sorted), ccs_arr (the ccs ids, sorted),
+#AS_form[AS,ccs]=0/1/2(no read/form1/form2), ccs_mapstart[ccs] and ccs_mapend[ccs].
+def get_AS_form(one_gene):
+    transcript1_line_list=read_ASccs_lines(one_gene,"1")
+    transcript2_line_list=read_ASccs_lines(one_gene,"2")
+    gene_AS_list	=sorted(set([col[0] for col in transcript1_line_list]))
+    gene_AS_num	=len(gene_AS_list)
+    ccs_list	=sorted(set([col[1] for col in transcript1_line_list]+[col[1] for col in transcript2_line_list]))
+    ccs_num		=len(ccs_list)
+    AS_index={oneAS:x for x,oneAS in enumerate(gene_AS_list)}
+    ccs_index={oneccs:x for x,oneccs in enumerate(ccs_list)}
+    ccs_arr=np.array(ccs_list,dtype=np.int32)
+    AS_form=np.zeros((gene_AS_num,ccs_num),dtype=np.int8)
+    ccs_mapstart=np.zeros(ccs_num,dtype=np.int32)
+    ccs_mapend=np.zeros(ccs_num,dtype=np.int32)
+    for part,line_list in (("1",transcript1_line_list),("2",transcript2_line_list)):
+        for eachline_arr in line_list:
+            if eachline_arr[0] not in AS_index: continue
+            x=ccs_index[eachline_arr[1]]
+            AS_form[AS_index[eachline_arr[0]],x]=int(part)
+            ccs_mapstart[x]=int(eachline_arr[4])
+            ccs_mapend[x]=int(eachline_arr[5])
+    return gene_AS_list,ccs_arr,AS_form,ccs_mapstart,ccs_mapend
+
+#AS-AS analysis of one gene, task=(gene, gene ccs number). Return the result lines of AS2AS_fisherchi2.
+def ASAS_onegene(task):
+    one_gene,gene_ccs_num=task
+    newline_list=[]
+    ##Get the read-by-event matrix
+    gene_AS_list,ccs_arr,AS_form,ccs_mapstart,ccs_mapend=get_AS_form(one_gene)
+    gene_AS_num	=len(gene_AS_list)
+    #dict[AS]=[oneAS_type/chr/strand/min/max/start/end/dSegment_pos/dSegment_length] from AS_catalog
+    dict_ASinfo=read_AS_catalog(one_gene)
+    AS_index={oneAS:x for x,oneAS in enumerate(gene_AS_list)}
+    AS_start_arr=np.array([dict_ASinfo[oneAS][5] for oneAS in gene_AS_list],dtype=np.int64)
+    AS_end_arr=np.array([dict_ASinfo[oneAS][6] for oneAS in gene_AS_list],dtype=np.int64)
+    #Get paired_AS
+    if gene_AS_num>1 : #and gene_AS_num<300
+        AS_pairs,RI1234_arr,RI123_arr=read_AS_candidates(one_gene,gene_AS_list)
+        #Get Fisherchi2
+        group_arr=np.array([[AS_index[x] for x in onepair.split("_||_")] for onepair in AS_pairs],dtype=np.int64).reshape(-1,2)
+        ASgroup_cell=iter_ASgroup_cell(AS_form,ccs_mapstart,ccs_mapend,AS_start_arr,AS_end_arr,group_arr,"pair")
+        for onepair,(cell_num,cell_mask,fisherchi2) in zip(AS_pairs,ASgroup_cell):
+            AS1=onepair.split("_||_")[0]
+            AS2=onepair.split("_||_")[1]
+            AS1_info	=dict_ASinfo[AS1]
+            AS2_info	=dict_ASinfo[AS2]
+            AS1_start=AS1_info[5];	AS2_start=AS2_info[5];	all_AS_start=min(AS1_start,AS2_start)
+            AS1_end=AS1_info[6];	AS2_end=AS2_info[6];	all_AS_end=max(AS1_end,AS2_end)
+            AS1form1_AS2form1_ccsnum,AS1form1_AS2form2_ccsnum,AS1form2_AS2form1_ccsnum,AS1form2_AS2form2_ccsnum=cell_num
+            AS1form1_ccsnum	=AS1form1_AS2form1_ccsnum + AS1form1_AS2form2_ccsnum
+            AS1form2_ccsnum	=AS1form2_AS2form1_ccsnum + AS1form2_AS2form2_ccsnum
+            AS2form1_ccsnum	=AS1form1_AS2form1_ccsnum + AS1form2_AS2form1_ccsnum 
+            AS2form2_ccsnum	=AS1form1_AS2form2_ccsnum + AS1form2_AS2form2_ccsnum 
+            if AS1form1_ccsnum>int(min_ccsnum) and AS1form2_ccsnum>int(min_ccsnum) and AS2form1_ccsnum>int(min_ccsnum) and AS2form2_ccsnum>int(min_ccsnum):
+                oddsr,fisher_pvalue,chi_square_value,chi_square_pvalue=fisherchi2
+                if chi_square_pvalue<1:
+                    dSegment1_pos	=AS1_info[7];		dSegment1_length	=AS1_info[8]
+                    dSegment2_pos	=AS2_info[7];		dSegment2_length	=AS2_info[8]
+                    AS1form1_AS2form1_ccsstr=get_ccs_str(ccs_arr[cell_mask[0]])
+                    AS1form1_AS2form2_ccsstr=get_ccs_str(ccs_arr[cell_mask[1]])
+                    AS1form2_AS2form1_ccsstr=get_ccs_str(ccs_arr[cell_mask[2]])
+                    AS1form2_AS2form2_ccsstr=get_ccs_str(ccs_arr[cell_mask[3]])
+                    eventid=one_gene+"_"+AS1_info[0]+AS2_info[0]+"_"+dSegment1_pos+"_"+dSegment2_pos
+                    ccs_usage=(AS1form1_AS2form1_ccsnum+AS1form1_AS2form2_ccsnum+AS1form2_AS2form1_ccsnum+AS1form2_AS2form2_ccsnum)/int(gene_ccs_num)
+                    newline=eventid+"\t"+one_gene+"\t"+gene_ccs_num+"\t"+AS1+"\t"+AS2+"\t"+										\
+                        dSegment1_pos+"\t"+dSegment2_pos+"\t"+str(dSegment1_length)+"\t"+str(dSegment2_length)+"\t"+							\
+                        str(AS1form1_AS2form1_ccsstr)+"\t"+str(AS1form1_AS2form2_ccsstr)+"\t"+str(AS1form2_AS2form1_ccsstr)+"\t"+str(AS1form2_AS2form2_ccsstr)+"\t"+	\
+                        str(AS1form1_AS2form1_ccsnum)+"\t"+str(AS1form1_AS2form2_ccsnum)+"\t"+str(AS1form2_AS2form1_ccsnum)+"\t"+str(AS1form2_AS2form2_ccsnum)+"\t"+	\
+                        str(ccs_usage)+"\t"+str(oddsr)+"\t"+str(fisher_pvalue)+"\t"+str(chi_square_value)+"\t"+str(chi_square_pvalue)
+                    newline_list.append(newline)
+        #Get Fisherchi2.RI1234
+        group_arr=np.array([[AS_index[x] for x in one4AS.split("_||_")] for one4AS in RI1234_arr],dtype=np.int64).reshape(-1,4)
+        ASgroup_cell=iter_ASgroup_cell(AS_form,ccs_mapstart,ccs_mapend,AS_start_arr,AS_end_arr,group_arr,"RI1234")
+        for one4AS,(cell_num,cell_mask,fisherchi2) in zip(RI1234_arr,ASgroup_cell):
+            AS1=one4AS.split("_||_")[0]
+            AS2=one4AS.split("_||_")[1]
+            AS3=one4AS.split("_||_")[2]
+            AS4=one4AS.split("_||_")[3]
+            AS1_info=dict_ASinfo[AS1];	AS2_info=dict_ASinfo[AS2];	AS3_info=dict_ASinfo[AS3];	AS4_info=dict_ASinfo[AS4]	
+            AS1_start=AS1_info[5];	AS2_start=AS2_info[5];		AS3_start=AS3_info[5];		AS4_start=AS4_info[5];		all_AS_start=min(AS1_start,AS2_start,AS3_start,AS4_start)	
+            AS1_end=AS1_info[6];	AS2_end=AS2_info[6];		AS3_end=AS3_info[6];		AS4_end=AS4_info[6];		all_AS_end=max(AS1_end,AS2_end,AS3_end,AS4_end)
+            RIform1_ASform1_ccsnum,RIform1_ASform2_ccsnum,RIform2_ASform1_ccsnum,RIform2_ASform2_ccsnum=cell_num
+            RIform1_ccsnum	=RIform1_ASform1_ccsnum + RIform1_ASform2_ccsnum
+            RIform2_ccsnum	=RIform2_ASform1_ccsnum + RIform2_ASform2_ccsnum
+            ASform1_ccsnum	=RIform1_ASform1_ccsnum + RIform2_ASform1_ccsnum
+            ASform2_ccsnum	=RIform1_ASform2_ccsnum + RIform2_ASform2_ccsnum
+            if RIform1_ccsnum>0 and RIform2_ccsnum>0 and ASform1_ccsnum>0 and ASform2_ccsnum>0:
+                oddsr,fisher_pvalue,chi_square_value,chi_square_pvalue=fisherchi2
+                if chi_square_pvalue<1:
+                    dSegment1_pos	=AS1_info[7];		dSegment1_length	=AS1_info[8]
+                    dSegment2_pos	=AS3_info[7];		dSegment2_length	=AS3_info[8]
+                    RIform1_ASform1_ccsstr=get_ccs_str(ccs_arr[cell_mask[0]])
+                    RIform1_ASform2_ccsstr=get_ccs_str(ccs_arr[cell_mask[1]])
+                    RIform2_ASform1_ccsstr=get_ccs_str(ccs_arr[cell_mask[2]])
+                    RIform2_ASform2_ccsstr=get_ccs_str(ccs_arr[cell_mask[3]])
+                    eventid=one_gene+"_"+AS1_info[0]+AS2_info[0]+"_"+dSegment1_pos+"_"+dSegment2_pos
+                    ccs_usage=(RIform1_ASform1_ccsnum+RIform1_ASform2_ccsnum+RIform2_ASform1_ccsnum+RIform2_ASform2_ccsnum)/int(gene_ccs_num)
+                    newline=eventid+"\t"+one_gene+"\t"+gene_ccs_num+"\t"+AS1+","+AS2+"\t"+AS3+","+AS4+"\t"+									\
+                        dSegment1_pos+"\t"+dSegment2_pos+"\t"+str(dSegment1_length)+"\t"+str(dSegment2_length)+"\t"+						\
+                        str(RIform1_ASform1_ccsstr)+"\t"+str(RIform1_ASform2_ccsstr)+"\t"+str(RIform2_ASform1_ccsstr)+"\t"+str(RIform2_ASform2_ccsstr)+"\t"+	\
+                        str(RIform1_ASform1_ccsnum)+"\t"+str(RIform1_ASform2_ccsnum)+"\t"+str(RIform2_ASform1_ccsnum)+"\t"+str(RIform2_ASform2_ccsnum)+"\t"+	\
+                        str(ccs_usage)+"\t"+str(oddsr)+"\t"+str(fisher_pvalue)+"\t"+str(chi_square_value)+"\t"+str(chi_square_pvalue)
+                    newline_list.append(newline)
+        #Get Fisherchi2.RI123
+        group_arr=np.array([[AS_index[x] for x in one3AS.split("_||_")] for one3AS in RI123_arr],dtype=np.int64).reshape(-1,3)
+        ASgroup_cell=iter_ASgroup_cell(AS_form,ccs_mapstart,ccs_mapend,AS_start_arr,AS_end_arr,group_arr,"RI123")
+        for one3AS,(cell_num,cell_mask,fisherchi2) in zip(RI123_arr,ASgroup_cell):
+            AS1=one3AS.split("_||_")[0]
+            AS2=one3AS.split("_||_")[1]
+            AS3=one3AS.split("_||_")[2]
+            AS1_info=dict_ASinfo[AS1];	AS2_info=dict_ASinfo[AS2];	AS3_info=dict_ASinfo[AS3]		
+            AS1_start=AS1_info[5];	AS2_start=AS2_info[5];		AS3_start=AS3_info[5];		all_AS_start=min(AS1_start,AS2_start,AS3_start)	
+            AS1_end=AS1_info[6];	AS2_end=AS2_info[6];		AS3_end	=AS3_info[6];		all_AS_end=max(AS1_end,AS2_end,AS3_end)
+            dSegment1_pos	=AS1_info[7];		dSegment1_length	=AS1_info[8]
+            dSegment2_pos	=AS3_info[7];		dSegment2_length	=AS3_info[8]
+            RIform1_ASform1_ccsnum,RIform1_ASform2_ccsnum,RIform2_ASform1_ccsnum,RIform2_ASform2_ccsnum=cell_num
+            RIform1_ccsnum	=RIform1_ASform1_ccsnum + RIform1_ASform2_ccsnum
+            RIform2_ccsnum	=RIform2_ASform1_ccsnum + RIform2_ASform2_ccsnum
+            ASform1_ccsnum	=RIform1_ASform1_ccsnum + RIform2_ASform1_ccsnum
+            ASform2_ccsnum	=RIform1_ASform2_ccsnum + RIform2_ASform2_ccsnum
+            if RIform1_ccsnum>0 and RIform2_ccsnum>0 and ASform1_ccsnum>0 and ASform2_ccsnum>0:
+                oddsr,fisher_pvalue,chi_square_value,chi_square_pvalue=fisherchi2
+                if chi_square_pvalue:
+                    RIform1_ASform1_ccsstr=get_ccs_str(ccs_arr[cell_mask[0]])
+                    RIform1_ASform2_ccsstr=get_ccs_str(ccs_arr[cell_mask[1]])
+                    RIform2_ASform1_ccsstr=get_ccs_str(ccs_arr[cell_mask[2]])
+                    RIform2_ASform2_ccsstr=get_ccs_str(ccs_arr[cell_mask[3]])
+                    ccs_usage=(RIform1_ASform1_ccsnum+RIform1_ASform2_ccsnum+RIform2_ASform1_ccsnum+RIform2_ASform2_ccsnum)/int(gene_ccs_num)
+                    eventid=one_gene+"_"+AS1_info[0]+AS3_info[0]+"_"+dSegment1_pos+"_"+dSegment2_pos
+                    newline=eventid+"\t"+one_gene+"\t"+gene_ccs_num+"\t"+AS1+","+AS2+"\t"+AS3+"\t"+										\
+                        dSegment1_pos+"\t"+dSegment2_pos+"\t"+str(dSegment1_length)+"\t"+str(dSegment2_length)+"\t"+						\
+                        str(RIform1_ASform1_ccsstr)+"\t"+str(RIform1_ASform2_ccsstr)+"\t"+str(RIform2_ASform1_ccsstr)+"\t"+str(RIform2_ASform2_ccsstr)+"\t"+	\
+                        str(RIform1_ASform1_ccsnum)+"\t"+str(RIform1_ASform2_ccsnum)+"\t"+str(RIform2_ASform1_ccsnum)+"\t"+str(RIform2_ASform2_ccsnum)+"\t"+	\
+                        str(ccs_usage)+"\t"+str(oddsr)+"\t"+str(fisher_pvalue)+"\t"+str(chi_square_value)+"\t"+str(chi_square_pvalue)
+                    newline_list.append(newline)
+    return newline_list
+
 if sys.argv[1] =="AS_AS":
     print("Start AS-AS analysis")
+    usage_start=get_usage()
     print("Analysis in /output1_ASAS/")
     if "output1_ASAS" in os.listdir("./"):
         print("Note: ./output1_ASAS/ exist")
@@ -1154,346 +2217,31 @@ if sys.argv[1] =="AS_AS":
     with open ("AS2AS_fisherchi2","w",encoding="utf-8") as f:
         f.write(head_str+"\n")
         f.close()
+    open_ccs_name("../output0_preparation/7-ccs_inform/ccs_name")
+    open_ASccs_store("../output0_preparation/7-ccs_inform/ASccs_store")
+    open_AS_catalog("../output0_preparation/7-ccs_inform/AS_catalog")
+    task_list=[]
+    for one_gene,gene_ccs_num in zip(gene_list,ccsnum_list):
+        if (one_gene,"1") in dict_ASccs_index and (one_gene,"2") in dict_ASccs_index:
+            task_list.append((one_gene,gene_ccs_num))
+    task_num=len(task_list)
     i=0
-    while i< gene_num:#< gene_num
-        one_gene	=gene_list[i]
-        gene_ccs_num	=ccsnum_list[i]
-        i+=1
-        print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene,end="\r")
-        if (one_gene+"_1") not in os.listdir("../output0_preparation/7-ccs_inform/ASccs_split/") or (one_gene+"_2") not in os.listdir("../output0_preparation/7-ccs_inform/ASccs_split/"):continue
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            transcript1_ASlist=[col[0] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            transcript1_ccslist=[col[1] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            transcript2_ASlist=[col[0] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            transcript2_ccslist=[col[1] for col in csv.reader(f,delimiter='\t')]
-        transcript1_ASlist_len=len(transcript1_ASlist)
-        transcript2_ASlist_len=len(transcript2_ASlist)
-        transcript_ASlist_len=transcript1_ASlist_len+transcript2_ASlist_len
-        gene_AS_list	=list(set(transcript1_ASlist))
-        gene_AS_num	=len(gene_AS_list)
-        ccs_list	=list(set(transcript1_ccslist+transcript2_ccslist))
-        ccs_num		=len(ccs_list)
-        #Get dict of AS infomation: dict[AS]=[oneAS_type/chr/strand/min/max/start/end/dSegment_pos/dSegment_length]
-        dict_ASinfo={}
-        for oneAS in gene_AS_list:
-            oneAS_arr=oneAS.replace(":-",";minus").replace("-",";").replace(":",";").split(";")
-            oneAS_type				=oneAS_arr[1]
-            oneAS_chr				=oneAS_arr[2]
-            oneAS_strand			=oneAS_arr[-1]
-            oneAS_pos_arr			=list(map(int,oneAS_arr[3:-1]))   
-            oneAS_min				=min(oneAS_pos_arr)
-            oneAS_max				=max(oneAS_pos_arr) 
-            if oneAS_type=="RI":		
-                oneAS_start			=oneAS_pos_arr[1]
-                oneAS_end			=oneAS_pos_arr[2]
-            else:		
-                oneAS_start			=oneAS_min
-                oneAS_end			=oneAS_max
-            if oneAS_type=="RI":		
-                oneAS_dSegment_start		=oneAS_pos_arr[1]+1
-                oneAS_dSegment_end		=oneAS_pos_arr[2]-1 
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)       
-            if oneAS_type=="A3":
-                if oneAS_strand=="+":	
-                    oneAS_dSegment_start	=oneAS_pos_arr[1]
-                    oneAS_dSegment_end		=oneAS_pos_arr[3]-1
-                else:		
-                    oneAS_dSegment_start	=oneAS_pos_arr[2]+1
-                    oneAS_dSegment_end		=oneAS_pos_arr[0]	
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   
-            if oneAS_type=="A5":
-                if oneAS_strand=="+":
-                    oneAS_dSegment_start	=oneAS_pos_arr[2]+1
-                    oneAS_dSegment_end		=oneAS_pos_arr[0]
-                else:		
-                    oneAS_dSegment_start	=oneAS_pos_arr[1]
-                    oneAS_dSegment_end		=oneAS_pos_arr[3]-1
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   	
-            if oneAS_type=="SE":
-                oneAS_dSegment_start		=oneAS_pos_arr[1]
-                oneAS_dSegment_end		=oneAS_pos_arr[2]
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   
-            if oneAS_type=="MX":
-                oneAS_dSegment_start1		=oneAS_pos_arr[1]
-                oneAS_dSegment_end1		=oneAS_pos_arr[2]
-                oneAS_dSegment_start2		=oneAS_pos_arr[5]
-                oneAS_dSegment_end2		=oneAS_pos_arr[6]
-                oneAS_dSegment_start		=oneAS_dSegment_start1
-                oneAS_dSegment_end		=oneAS_dSegment_end2
-                oneAS_dSegment_length		=oneAS_dSegment_end1-oneAS_dSegment_start1+1+oneAS_dSegment_end2-oneAS_dSegment_start2+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start1)+"-"+str(oneAS_dSegment_end1)+";"+str(oneAS_dSegment_start2)+"-"+str(oneAS_dSegment_end2)
-            dict_ASinfo[oneAS]=[oneAS_type,oneAS_chr,oneAS_strand,oneAS_min,oneAS_max,oneAS_start,oneAS_end,oneAS_dSegment_pos,oneAS_dSegment_length]
-        ##Get of dict_ASccs[AS,ccs]=["0/1/2","map_start","map_end"]
-        dict_ASccs={}
-        for oneccs in ccs_list:
-            for oneAS in gene_AS_list:
-                dict_ASccs[oneAS,oneccs]=["0","",""]
-        k=0
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            for line in f.readlines():
-                k+=1
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len),end="\r")
-                eachline_arr=line.strip().split("\t")
-                dict_ASccs[eachline_arr[0],eachline_arr[1]]=["1",eachline_arr[4],eachline_arr[5]]
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            for line in f.readlines():
-                k+=1
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len),end="\r")
-                eachline_arr=line.strip().split("\t")
-                dict_ASccs[eachline_arr[0],eachline_arr[1]]=["2",eachline_arr[4],eachline_arr[5]]        
-        #Get paired_AS
-        if gene_AS_num>1 : #and gene_AS_num<300
-            AS_pairs=[]
-            RI_pairs=[]
-            for paired_AS1 in gene_AS_list:
-                for paired_AS2 in gene_AS_list:
-                    paired_AS1_info=dict_ASinfo[paired_AS1]
-                    paired_AS2_info=dict_ASinfo[paired_AS2]
-                    AS1_type			=paired_AS1_info[0]
-                    AS2_type			=paired_AS2_info[0]
-                    strand			=paired_AS1_info[2]
-                    paired_AS1_min = paired_AS1_info[3];	        paired_AS1_max = paired_AS1_info[4] 
-                    paired_AS2_min = paired_AS2_info[3];		paired_AS2_max = paired_AS2_info[4] 
-                    mark="no"
-                    if paired_AS1_max<=paired_AS2_min:	mark="yes"
-                    if paired_AS1_max==paired_AS2_min:
-                        if AS1_type=="RI":
-                            if AS2_type=="A5" and strand=="+":	mark="no"
-                            if AS2_type=="A3" and strand=="-":	mark="no"
-                        if AS2_type=="RI":
-                            if AS1_type=="A3" and strand=="+":	mark="no"
-                            if AS1_type=="A5" and strand=="-":	mark="no"
-                    if mark=="yes":
-                        AS_pairs.append(paired_AS1+"_||_"+paired_AS2) 
-                    if AS1_type=="RI" and AS2_type=="RI" and paired_AS1_min<paired_AS2_max and paired_AS2_min<paired_AS1_max:
-                        if paired_AS1_info[5]==paired_AS2_info[5] and paired_AS1_info[6]==paired_AS2_info[6]: 
-                            if paired_AS1_min==paired_AS2_min and paired_AS1_max<paired_AS2_max:RI_pairs.append(paired_AS1+"_||_"+paired_AS2)
-                            if paired_AS1_min>paired_AS2_min and paired_AS1_max==paired_AS2_max:RI_pairs.append(paired_AS1+"_||_"+paired_AS2)
-            #Get_adjacent RI-AS
-            RI1234_arr=[]
-            RI123_arr=[]
-            for oneRIpair1 in RI_pairs:
-                for oneRIpair2 in RI_pairs:
-                    RI1=oneRIpair1.split("_||_")[0]
-                    RI2=oneRIpair1.split("_||_")[1]
-                    RI3=oneRIpair2.split("_||_")[0]
-                    RI4=oneRIpair2.split("_||_")[1]
-                    RI1_info=dict_ASinfo[RI1]
-                    RI2_info=dict_ASinfo[RI2]
-                    RI3_info=dict_ASinfo[RI3]
-                    RI4_info=dict_ASinfo[RI4] 
-                    strand			=RI1_info[2]
-                    RI1_min = RI1_info[3];	        	RI1_max = RI1_info[4] 
-                    RI2_min = RI2_info[3];	        	RI2_max = RI2_info[4] 
-                    RI3_min = RI3_info[3];	       	 	RI3_max = RI3_info[4] 
-                    RI4_min = RI4_info[3];	       		RI4_max = RI4_info[4]
-                    RI1_intron_start=RI1_info[5];		RI1_intron_end=RI1_info[6]
-                    RI2_intron_start=RI2_info[5];		RI2_intron_end=RI2_info[6]
-                    RI3_intron_start=RI3_info[5];		RI3_intron_end=RI3_info[6]
-                    RI4_intron_start=RI4_info[5];		RI4_intron_end=RI4_info[6] 
-                    if RI1_min==RI2_min and RI3_max==RI4_max and RI1_intron_end==RI3_min and RI3_intron_start==RI1_max:
-                        RI1234_arr.append(RI1+"_||_"+RI2+"_||_"+RI3+"_||_"+RI4)
-                for oneAS in gene_AS_list:
-                    oneAS_info=dict_ASinfo[oneAS]
-                    oneAS_type	=oneAS_info[0]
-                    oneAS_start	=oneAS_info[5];	        
-                    oneAS_end	=oneAS_info[6];	 
-                    if strand=="+" and oneAS_type=="A3" and oneAS_end==RI1_min:	RI123_arr.append(RI1+"_||_"+RI2+"_||_"+oneAS)
-                    if strand=="+" and oneAS_type=="A5" and oneAS_start==RI1_max:	RI123_arr.append(RI1+"_||_"+RI2+"_||_"+oneAS)
-                    if strand=="-" and oneAS_type=="A3" and oneAS_start==RI1_max:	RI123_arr.append(RI1+"_||_"+RI2+"_||_"+oneAS)
-                    if strand=="-" and oneAS_type=="A5" and oneAS_end==RI1_min:	RI123_arr.append(RI1+"_||_"+RI2+"_||_"+oneAS)
-            #Get Fisherchi2
-            j=0;j_all=len(AS_pairs)
-            for onepair in AS_pairs:
-                j+=1
-                AS1=onepair.split("_||_")[0]
-                AS2=onepair.split("_||_")[1]
-                AS1_info	=dict_ASinfo[AS1]
-                AS2_info	=dict_ASinfo[AS2]
-                AS1_start=AS1_info[5];	AS2_start=AS2_info[5];	all_AS_start=min(AS1_start,AS2_start)
-                AS1_end=AS1_info[6];	AS2_end=AS2_info[6];	all_AS_end=max(AS1_end,AS2_end)
-                AS1form1_ccsnum=AS1form2_ccsnum=AS2form1_ccsnum=AS2form2_ccsnum=0
-                AS1form1_AS2form1_ccsnum=AS1form1_AS2form2_ccsnum=AS1form2_AS2form1_ccsnum=AS1form2_AS2form2_ccsnum=0
-                AS1form1_AS2form1_ccsarr=[]
-                AS1form1_AS2form2_ccsarr=[]
-                AS1form2_AS2form1_ccsarr=[]
-                AS1form2_AS2form2_ccsarr=[]            
-                for oneccs in ccs_list:
-                    oneccs_AS1_info			=dict_ASccs[AS1,oneccs]
-                    oneccs_AS2_info			=dict_ASccs[AS2,oneccs]
-                    if oneccs_AS2_info!=["0","",""]:
-                        oneccs_mapstart		=int(oneccs_AS2_info[1])
-                        oneccs_mapend		=int(oneccs_AS2_info[2])
-                        if all_AS_start>=oneccs_mapstart and all_AS_end<=oneccs_mapend:
-                            if     oneccs_AS1_info[0]=="1" and oneccs_AS2_info[0]=="1":	AS1form1_AS2form1_ccsnum+=1;AS1form1_AS2form1_ccsarr.append(oneccs)
-                            elif   oneccs_AS1_info[0]=="1" and oneccs_AS2_info[0]=="2":	AS1form1_AS2form2_ccsnum+=1;AS1form1_AS2form2_ccsarr.append(oneccs)
-                            elif   oneccs_AS1_info[0]=="2" and oneccs_AS2_info[0]=="1":	AS1form2_AS2form1_ccsnum+=1;AS1form2_AS2form1_ccsarr.append(oneccs)
-                            elif   oneccs_AS1_info[0]=="2" and oneccs_AS2_info[0]=="2":	AS1form2_AS2form2_ccsnum+=1;AS1form2_AS2form2_ccsarr.append(oneccs)
-                AS1form1_ccsnum	=AS1form1_AS2form1_ccsnum + AS1form1_AS2form2_ccsnum
-                AS1form2_ccsnum	=AS1form2_AS2form1_ccsnum + AS1form2_AS2form2_ccsnum
-                AS2form1_ccsnum	=AS1form1_AS2form1_ccsnum + AS1form2_AS2form1_ccsnum 
-                AS2form2_ccsnum	=AS1form1_AS2form2_ccsnum + AS1form2_AS2form2_ccsnum 
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len)+"\tAS_pair:"+str(j)+"/"+str(j_all)+"\t",end="\r")
-                if AS1form1_ccsnum>int(min_ccsnum) and AS1form2_ccsnum>int(min_ccsnum) and AS2form1_ccsnum>int(min_ccsnum) and AS2form2_ccsnum>int(min_ccsnum):
-                    obs = np.array([[AS1form1_AS2form1_ccsnum, AS1form1_AS2form2_ccsnum], [AS1form2_AS2form1_ccsnum, AS1form2_AS2form2_ccsnum]])
-                    chi2_raw=str(chi2_contingency(obs))
-                    chi2_arr=chi2_raw.split(",")
-                    chi_square_value	        =chi2_arr[0][1:]
-                    chi_square_pvalue		=chi2_arr[1]
-                    F_value			=chi2_arr[2]
-                    oddsr, fisher_pvalue = fisher_exact(obs, alternative='two-sided')
-                    if float(chi_square_pvalue)<1:
-                        dSegment1_pos	=AS1_info[7];		dSegment1_length	=AS1_info[8]
-                        dSegment2_pos	=AS2_info[7];		dSegment2_length	=AS2_info[8]
-                        AS1form1_AS2form1_ccsstr=",".join(AS1form1_AS2form1_ccsarr)
-                        AS1form1_AS2form2_ccsstr=",".join(AS1form1_AS2form2_ccsarr)
-                        AS1form2_AS2form1_ccsstr=",".join(AS1form2_AS2form1_ccsarr)
-                        AS1form2_AS2form2_ccsstr=",".join(AS1form2_AS2form2_ccsarr)
-                        eventid=one_gene+"_"+AS1_info[0]+AS2_info[0]+"_"+dSegment1_pos+"_"+dSegment2_pos
-                        ccs_usage=(AS1form1_AS2form1_ccsnum+AS1form1_AS2form2_ccsnum+AS1form2_AS2form1_ccsnum+AS1form2_AS2form2_ccsnum)/int(gene_ccs_num)
-                        newline=eventid+"\t"+one_gene+"\t"+gene_ccs_num+"\t"+AS1+"\t"+AS2+"\t"+										\
-                            dSegment1_pos+"\t"+dSegment2_pos+"\t"+str(dSegment1_length)+"\t"+str(dSegment2_length)+"\t"+							\
-                            str(AS1form1_AS2form1_ccsstr)+"\t"+str(AS1form1_AS2form2_ccsstr)+"\t"+str(AS1form2_AS2form1_ccsstr)+"\t"+str(AS1form2_AS2form2_ccsstr)+"\t"+	\
-                            str(AS1form1_AS2form1_ccsnum)+"\t"+str(AS1form1_AS2form2_ccsnum)+"\t"+str(AS1form2_AS2form1_ccsnum)+"\t"+str(AS1form2_AS2form2_ccsnum)+"\t"+	\
-                            str(ccs_usage)+"\t"+str(oddsr)+"\t"+str(fisher_pvalue)+"\t"+chi_square_value+"\t"+chi_square_pvalue
-                        with open ("AS2AS_fisherchi2","a",encoding="utf-8") as f:
-                            f.write(newline+"\n")
-                            f.close()
-            #Get Fisherchi2.RI1234
-            j=0;j_all=len(RI1234_arr)
-            if RI1234_arr!=[]:print()
-            for one4AS in RI1234_arr:
-                j+=1
-                AS1=one4AS.split("_||_")[0]
-                AS2=one4AS.split("_||_")[1]
-                AS3=one4AS.split("_||_")[2]
-                AS4=one4AS.split("_||_")[3]
-                AS1_info=dict_ASinfo[AS1];	AS2_info=dict_ASinfo[AS2];	AS3_info=dict_ASinfo[AS3];	AS4_info=dict_ASinfo[AS4]	
-                AS1_start=AS1_info[5];	AS2_start=AS2_info[5];		AS3_start=AS3_info[5];		AS4_start=AS4_info[5];		all_AS_start=min(AS1_start,AS2_start,AS3_start,AS4_start)	
-                AS1_end=AS1_info[6];	AS2_end=AS2_info[6];		AS3_end=AS3_info[6];		AS4_end=AS4_info[6];		all_AS_end=max(AS1_end,AS2_end,AS3_end,AS4_end)
-                RIform1_ccsnum=RIform2_ccsnum=ASform1_ccsnum=ASform2_ccsnum=0
-                RIform1_ASform1_ccsnum=RIform1_ASform2_ccsnum=RIform2_ASform1_ccsnum=RIform2_ASform2_ccsnum=0
-                RIform1_ASform1_ccsarr=[]
-                RIform1_ASform2_ccsarr=[]
-                RIform2_ASform1_ccsarr=[]
-                RIform2_ASform2_ccsarr=[] 
-                for oneccs in ccs_list:
-                    oneccs_AS1_info			=dict_ASccs[AS1,oneccs]
-                    oneccs_AS2_info			=dict_ASccs[AS2,oneccs]
-                    oneccs_AS3_info			=dict_ASccs[AS3,oneccs]
-                    oneccs_AS4_info			=dict_ASccs[AS4,oneccs]
-                    if oneccs_AS3_info!=["0","",""] or oneccs_AS4_info!=["0","",""]:
-                        if oneccs_AS3_info!=["0","",""]: 	oneccs_mapstart=int(oneccs_AS3_info[1]);	oneccs_mapend=int(oneccs_AS3_info[2])
-                        else:				oneccs_mapstart=int(oneccs_AS4_info[1]);	oneccs_mapend=int(oneccs_AS4_info[2])
-                        if all_AS_start>=oneccs_mapstart and all_AS_end<=oneccs_mapend:    
-                            if   	 oneccs_AS2_info[0]	=="1" and oneccs_AS4_info[0]	=="1":	RIform1_ASform1_ccsnum+=1;RIform1_ASform1_ccsarr.append(oneccs)
-                            elif     oneccs_AS1_info[0]	=="1" and oneccs_AS4_info[0]	=="2":	RIform1_ASform2_ccsnum+=1;RIform1_ASform2_ccsarr.append(oneccs)
-                            elif     oneccs_AS2_info[0]	=="2" and oneccs_AS3_info[0]	=="1":	RIform2_ASform1_ccsnum+=1;RIform2_ASform1_ccsarr.append(oneccs)
-                            elif     oneccs_AS1_info[0]	=="2" and oneccs_AS3_info[0]	=="2":	RIform2_ASform2_ccsnum+=1;RIform2_ASform2_ccsarr.append(oneccs)
-                RIform1_ccsnum	=RIform1_ASform1_ccsnum + RIform1_ASform2_ccsnum
-                RIform2_ccsnum	=RIform2_ASform1_ccsnum + RIform2_ASform2_ccsnum
-                ASform1_ccsnum	=RIform1_ASform1_ccsnum + RIform2_ASform1_ccsnum
-                ASform2_ccsnum	=RIform1_ASform2_ccsnum + RIform2_ASform2_ccsnum
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len)+"\tAS_pair:"+str(j)+"/"+str(j_all)+"\tRI12-RI34*",end="\r")
-                if RIform1_ccsnum>0 and RIform2_ccsnum>0 and ASform1_ccsnum>0 and ASform2_ccsnum>0:
-                    obs = np.array([[RIform1_ASform1_ccsnum, RIform1_ASform2_ccsnum], [RIform2_ASform1_ccsnum, RIform2_ASform2_ccsnum]])
-                    chi2_raw=str(chi2_contingency(obs))
-                    chi2_arr=chi2_raw.split(",")
-                    chi_square_value	        =chi2_arr[0][1:]
-                    chi_square_pvalue				=chi2_arr[1]
-                    F_value				=chi2_arr[2]
-                    oddsr, fisher_pvalue = fisher_exact(obs, alternative='two-sided')
-                    if float(chi_square_pvalue)<1:
-                        dSegment1_pos	=AS1_info[7];		dSegment1_length	=AS1_info[8]
-                        dSegment2_pos	=AS3_info[7];		dSegment2_length	=AS3_info[8]
-                        RIform1_ASform1_ccsstr=",".join(RIform1_ASform1_ccsarr)
-                        RIform1_ASform2_ccsstr=",".join(RIform1_ASform2_ccsarr)
-                        RIform2_ASform1_ccsstr=",".join(RIform2_ASform1_ccsarr)
-                        RIform2_ASform2_ccsstr=",".join(RIform2_ASform2_ccsarr)
-                        eventid=one_gene+"_"+AS1_info[0]+AS2_info[0]+"_"+dSegment1_pos+"_"+dSegment2_pos
-                        ccs_usage=(RIform1_ASform1_ccsnum+RIform1_ASform2_ccsnum+RIform2_ASform1_ccsnum+RIform2_ASform2_ccsnum)/int(gene_ccs_num)
-                        newline=eventid+"\t"+one_gene+"\t"+gene_ccs_num+"\t"+AS1+","+AS2+"\t"+AS3+","+AS4+"\t"+									\
-                            dSegment1_pos+"\t"+dSegment2_pos+"\t"+str(dSegment1_length)+"\t"+str(dSegment2_length)+"\t"+						\
-                            str(RIform1_ASform1_ccsstr)+"\t"+str(RIform1_ASform2_ccsstr)+"\t"+str(RIform2_ASform1_ccsstr)+"\t"+str(RIform2_ASform2_ccsstr)+"\t"+	\
-                            str(RIform1_ASform1_ccsnum)+"\t"+str(RIform1_ASform2_ccsnum)+"\t"+str(RIform2_ASform1_ccsnum)+"\t"+str(RIform2_ASform2_ccsnum)+"\t"+	\
-                            str(ccs_usage)+"\t"+str(oddsr)+"\t"+str(fisher_pvalue)+"\t"+chi_square_value+"\t"+chi_square_pvalue
-                        with open ("AS2AS_fisherchi2","a",encoding="utf-8") as f:
-                            f.write(newline+"\n")
-                            f.close()
-            #Get Fisherchi2.RI123
-            j=0;j_all=len(RI123_arr)
-            if RI123_arr!=[]:print()
-            for one3AS in RI123_arr:
-                j+=1
-                AS1=one3AS.split("_||_")[0]
-                AS2=one3AS.split("_||_")[1]
-                AS3=one3AS.split("_||_")[2]
-                AS1_info=dict_ASinfo[AS1];	AS2_info=dict_ASinfo[AS2];	AS3_info=dict_ASinfo[AS3]		
-                AS1_start=AS1_info[5];	AS2_start=AS2_info[5];		AS3_start=AS3_info[5];		all_AS_start=min(AS1_start,AS2_start,AS3_start)	
-                AS1_end=AS1_info[6];	AS2_end=AS2_info[6];		AS3_end	=AS3_info[6];		all_AS_end=max(AS1_end,AS2_end,AS3_end)
-                dSegment1_pos	=AS1_info[7];		dSegment1_length	=AS1_info[8]
-                dSegment2_pos	=AS3_info[7];		dSegment2_length	=AS3_info[8]
-                RIform1_ccsnum=RIform2_ccsnum=ASform1_ccsnum=ASform2_ccsnum=0
-                RIform1_ASform1_ccsnum=RIform1_ASform2_ccsnum=RIform2_ASform1_ccsnum=RIform2_ASform2_ccsnum=0
-                RIform1_ASform1_ccsarr=[]
-                RIform1_ASform2_ccsarr=[]
-                RIform2_ASform1_ccsarr=[]
-                RIform2_ASform2_ccsarr=[] 
-                for oneccs in ccs_list:
-                    oneccs_AS1_info			=dict_ASccs[AS1,oneccs]
-                    oneccs_AS2_info			=dict_ASccs[AS2,oneccs]
-                    oneccs_AS3_info			=dict_ASccs[AS3,oneccs]
-                    if oneccs_AS3_info!=["0","",""]:
-                        oneccs_mapstart		=int(oneccs_AS3_info[1])
-                        oneccs_mapend		=int(oneccs_AS3_info[2])
-                        if all_AS_start>=oneccs_mapstart and all_AS_end<=oneccs_mapend: 
-                            if   	 oneccs_AS2_info[0]	=="1" and oneccs_AS3_info[0]	=="1":	RIform1_ASform1_ccsnum+=1;RIform1_ASform1_ccsarr.append(oneccs)
-                            elif     oneccs_AS1_info[0]	=="1" and oneccs_AS3_info[0]	=="2":	RIform1_ASform2_ccsnum+=1;RIform1_ASform2_ccsarr.append(oneccs)
-                            elif     oneccs_AS2_info[0]	=="2" and oneccs_AS3_info[0]	=="1":	RIform2_ASform1_ccsnum+=1;RIform2_ASform1_ccsarr.append(oneccs)
-                            elif     oneccs_AS1_info[0]	=="2" and oneccs_AS3_info[0]	=="2":	RIform2_ASform2_ccsnum+=1;RIform2_ASform2_ccsarr.append(oneccs)
-                RIform1_ccsnum	=RIform1_ASform1_ccsnum + RIform1_ASform2_ccsnum
-                RIform2_ccsnum	=RIform2_ASform1_ccsnum + RIform2_ASform2_ccsnum
-                ASform1_ccsnum	=RIform1_ASform1_ccsnum + RIform2_ASform1_ccsnum
-                ASform2_ccsnum	=RIform1_ASform2_ccsnum + RIform2_ASform2_ccsnum
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len)+"\tAS_pair:"+str(j)+"/"+str(j_all)+"\tRI12-SS3*",end="\r")
-                if RIform1_ccsnum>0 and RIform2_ccsnum>0 and ASform1_ccsnum>0 and ASform2_ccsnum>0:
-                    obs = np.array([[RIform1_ASform1_ccsnum, RIform1_ASform2_ccsnum], [RIform2_ASform1_ccsnum, RIform2_ASform2_ccsnum]])
-                    chi2_raw=str(chi2_contingency(obs))
-                    chi2_arr=chi2_raw.split(",")
-                    chi_square_value	        =chi2_arr[0][1:]
-                    chi_square_pvalue		=chi2_arr[1]
-                    F_value			=chi2_arr[2]
-                    oddsr, fisher_pvalue = fisher_exact(obs, alternative='two-sided')
-                    if float(chi_square_pvalue):
-                        RIform1_ASform1_ccsstr=",".join(RIform1_ASform1_ccsarr)
-                        RIform1_ASform2_ccsstr=",".join(RIform1_ASform2_ccsarr)
-                        RIform2_ASform1_ccsstr=",".join(RIform2_ASform1_ccsarr)
-                        RIform2_ASform2_ccsstr=",".join(RIform2_ASform2_ccsarr)
-                        ccs_usage=(RIform1_ASform1_ccsnum+RIform1_ASform2_ccsnum+RIform2_ASform1_ccsnum+RIform2_ASform2_ccsnum)/int(gene_ccs_num)
-                        eventid=one_gene+"_"+AS1_info[0]+AS3_info[0]+"_"+dSegment1_pos+"_"+dSegment2_pos
-                        newline=eventid+"\t"+one_gene+"\t"+gene_ccs_num+"\t"+AS1+","+AS2+"\t"+AS3+"\t"+										\
-                            dSegment1_pos+"\t"+dSegment2_pos+"\t"+str(dSegment1_length)+"\t"+str(dSegment2_length)+"\t"+						\
-                            str(RIform1_ASform1_ccsstr)+"\t"+str(RIform1_ASform2_ccsstr)+"\t"+str(RIform2_ASform1_ccsstr)+"\t"+str(RIform2_ASform2_ccsstr)+"\t"+	\
-                            str(RIform1_ASform1_ccsnum)+"\t"+str(RIform1_ASform2_ccsnum)+"\t"+str(RIform2_ASform1_ccsnum)+"\t"+str(RIform2_ASform2_ccsnum)+"\t"+	\
-                            str(ccs_usage)+"\t"+str(oddsr)+"\t"+str(fisher_pvalue)+"\t"+chi_square_value+"\t"+chi_square_pvalue
-                        with open ("AS2AS_fisherchi2","a",encoding="utf-8") as f:
-                            f.write(newline+"\n")
-                            f.close()
-        print()      
+    with open_output("AS2AS_fisherchi2") as f:
+        for newline_list in gene_pool_imap(ASAS_onegene,task_list,thread):
+            print_progress("          Processing "+str(i+1)+"/"+str(task_num)+":\t"+task_list[i][0])
+            for newline in newline_list:
+                f.write(newline+"\n")
+            i+=1
+    end_progress()
+    record_usage("AS_AS test",usage_start,task_num)
+    usage_start=get_usage()
     #AS1form1_AS2form1.num\tAS1form1_AS2form2.num\tAS1form2_AS2form1.num\tAS1form2_AS2form2.num
     print("          Filter by pvalue<0.05,min_ccsnum and min_dSegmentlen")
     with open ("AS2AS_fisherchi2.pvalue0.05","w",encoding="utf-8") as f2:
         f2.write(head_str+"\n")
         f2.close()
     i=0
-    with open ("AS2AS_fisherchi2","r",encoding="ISO-8859-1") as f:
+    with open ("AS2AS_fisherchi2","r",encoding="ISO-8859-1") as f, open_output("AS2AS_fisherchi2.pvalue0.05") as f2:
         for line in f.readlines():
             i+=1
             if i==1:  continue
@@ -1515,9 +2263,7 @@ if sys.argv[1] =="AS_AS":
             if AS1form1_ccsnum>=int(min_ccsnum) and AS1form2_ccsnum>=int(min_ccsnum) and AS2form1_ccsnum>=int(min_ccsnum) and AS2form2_ccsnum>=int(min_ccsnum):
                 if dSegmentlen1>=int(min_dSegmentlen) and dSegmentlen2>=int(min_dSegmentlen)  and ccs_usage>=float(min_ccs_usage):
                     if fisher_pvalue<0.05 or chi_square_pvalue<0.05:
-                        with open ("AS2AS_fisherchi2.pvalue0.05","a",encoding="utf-8") as f2:
-                            f2.write(eachline+"\n")
-                            f2.close()                      
+                        f2.write(eachline+"\n")
     subprocess.run(["sort -g -k 22  AS2AS_fisherchi2.pvalue0.05|cut -f 1-9,14-22   > AS2AS_fisherchi2.pvalue0.05.simple"],shell=True)
     with open("AS2AS_fisherchi2.pvalue0.05.simple","r",encoding="ISO-8859-1") as f:
         result_num=len(f.readlines())-1
@@ -1525,85 +2271,206 @@ if sys.argv[1] =="AS_AS":
     print("     Complete!")
     print("     Possible results number is "+str(result_num))
     print()
-    print("     part_ccs2ref. This section gives the BAM files which can be used as reference for credibility.")
-    print("          All ccs were split into two parts: AS1form1 + AS1form2")
-    print("          Get ccs(pvalue0.05) list from AS2AS_fisherchi2.pvalue0.05(simple)")
-    print("          Get fasta from transcript1 and 2 in each AS and then minimap2ref")
-    if "part_ccs2ref" in os.listdir("./"):
-        print("          Note: ./part_ccs2ref/ exist and will be deleted.") 
-        subprocess.run(["rm -r ./part_ccs2ref"],shell=True) 
-    subprocess.run(["mkdir ./part_ccs2ref"],shell=True)
-    i=0
-    with open("AS2AS_fisherchi2.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i>1:
+    record_usage("AS_AS filter",usage_start,result_num)
+    usage_start=get_usage()
+    if evidence_bam=="none":
+        print("     part_ccs2ref is skipped (-evidence_bam none).")
+    else:
+        print("     part_ccs2ref. This section gives the BAM files which can be used as reference for credibility.")
+        print("          All ccs were split into two parts: AS1form1 + AS1form2")
+        print("          Get ccs(pvalue0.05) list from AS2AS_fisherchi2.pvalue0.05(simple)")
+        print("          Get fasta from transcript1 and 2 in each AS and then minimap2ref")
+        if "part_ccs2ref" in os.listdir("./"):
+            print("          Note: ./part_ccs2ref/ exist and will be deleted.") 
+            subprocess.run(["rm -r ./part_ccs2ref"],shell=True) 
+        subprocess.run(["mkdir ./part_ccs2ref"],shell=True)
+        i=0
+        with open("AS2AS_fisherchi2.pvalue0.05","r",encoding="ISO-8859-1") as f, open_output("./part_ccs2ref/ccs.list0") as f2:
+            for line in f.readlines():
+                i+=1
+                if i>1:
+                    eachline=line.strip()
+                    eachline_arr=eachline.split("\t")
+                    ccs1_str=eachline_arr[9]
+                    ccs2_str=eachline_arr[10]
+                    ccs3_str=eachline_arr[11]
+                    ccs4_str=eachline_arr[12]
+                    ccs_list=ccs1_str.split(",")+ccs2_str.split(",")+ccs3_str.split(",")+ccs4_str.split(",")
+                    for x in ccs_list:
+                        f2.write(x+"\n")
+        subprocess.run(["sort -n ./part_ccs2ref/ccs.list0 | uniq > ./part_ccs2ref/1-ccs.pvalue0.05.list"],shell=True)
+        subprocess.run(["rm ./part_ccs2ref/ccs.list0"],shell=True)
+        print("          Extract fasta sequence")
+        open_fasta_index("../output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa")
+        minimap2_ref="../output0_preparation/4-all_FLNC_minimap2ref/ref.mmi"
+        if not os.path.exists(minimap2_ref):minimap2_ref="../output0_preparation/4-all_FLNC_minimap2ref/ref.fa"
+        ccs_pvalue_list=[row[0] for row in read_table("./part_ccs2ref/1-ccs.pvalue0.05.list")[1]]
+        write_fasta_by_list(ccs_pvalue_list,"./part_ccs2ref/2-ccs.pvalue0.05.fa")
+        if evidence_bam=="slice":
+            print("          Extract alignments from minimap.sort.bam")
+            open_bam_by_ccs("../output0_preparation/4-all_FLNC_minimap2ref/minimap.sort.bam",set(ccs_pvalue_list))
+        i=0
+
+        if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"):
+            subprocess.run(["rm -r ./part_ccs2ref/ccs_pvalue0.05_eachAS/"],shell=True)  
+        subprocess.run(["mkdir ./part_ccs2ref/ccs_pvalue0.05_eachAS"],shell=True)
+        i=0
+        with open("AS2AS_fisherchi2.pvalue0.05","r",encoding="ISO-8859-1") as f:
+            file_line_num=len(f.readlines())
+        with open("AS2AS_fisherchi2.pvalue0.05","r",encoding="ISO-8859-1") as f:
+            for line in f.readlines():
+                i+=1
+                if i==1 : continue
+                time1=timeit.default_timer()
                 eachline=line.strip()
                 eachline_arr=eachline.split("\t")
-                ccs1_str=eachline_arr[9]
-                ccs2_str=eachline_arr[10]
-                ccs3_str=eachline_arr[11]
-                ccs4_str=eachline_arr[12]
-                ccs_list=ccs1_str.split(",")+ccs2_str.split(",")+ccs3_str.split(",")+ccs4_str.split(",")
-                for x in ccs_list:
-                    with open("./part_ccs2ref/ccs.list0","a",encoding="utf-8") as f2:
-                        f2.write(x+"\n")   
-                        f2.close()
-    subprocess.run(["sort -n ./part_ccs2ref/ccs.list0 | uniq > ./part_ccs2ref/1-ccs.pvalue0.05.list"],shell=True)
-    subprocess.run(["rm ./part_ccs2ref/ccs.list0"],shell=True)
-    subprocess.run(["pwd"],shell=True)
-    print("          Extract fasta sequence")
-    subprocess.run(["perl ../output0_preparation/script/getfastabylist.pl  ./part_ccs2ref/1-ccs.pvalue0.05.list ../output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa > ./part_ccs2ref/2-ccs.pvalue0.05.fa"],shell=True)
-    i=0
-
-    if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"):
-        subprocess.run(["rm -r ./part_ccs2ref/ccs_pvalue0.05_eachAS/"],shell=True)  
-    subprocess.run(["mkdir ./part_ccs2ref/ccs_pvalue0.05_eachAS"],shell=True)
-    i=0
-    with open("AS2AS_fisherchi2.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        file_line_num=len(f.readlines())
-    with open("AS2AS_fisherchi2.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i==1 : continue
-            time1=timeit.default_timer()
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            eventid	=eachline_arr[0]
-            ccs1_str	=eachline_arr[9]+","+eachline_arr[10]
-            ccs2_str	=eachline_arr[11]+","+eachline_arr[12]
-            ccs1_list=ccs1_str.split(",")
-            ccs2_list=ccs2_str.split(",")
-            if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list1"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list1"],shell=True)  
-            if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list2"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list2"],shell=True)  
-            for x in ccs1_list:
-                with open("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list1","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()            
-            for x in ccs2_list:
-                with open("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list2","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()  
-            part_arr=["1","2"]
-            for part in part_arr:
-                subprocess.run(["perl ../output0_preparation/script/getfastabylist.pl  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list"+part+" ./part_ccs2ref/2-ccs.pvalue0.05.fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".fa"],shell=True)
-                subprocess.run(["minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no ../output0_preparation/4-all_FLNC_minimap2ref/ref.fa ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".sam 2>/dev/null"],shell=True) 
-                subprocess.run(["samtools view -bS ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".sam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".bam -@ "+thread],shell=True) 
-                subprocess.run(["samtools sort ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".bam -@ "+thread+" -o ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".bam 1>/dev/null 2>&1"],shell=True) 
-                subprocess.run(["samtools view -h ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".bam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".sam -@ "+thread],shell=True) 
-                subprocess.run(["samtools index  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".bam"],shell=True) 
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".sam ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".bam "],shell=True) 
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".sam "],shell=True)
-            subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_1.fa  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_2.fa"],shell=True)
-            time2=timeit.default_timer()
-            print("          -----Processing "+str(i-1)+"/"+str(file_line_num-1)+': %.0f Seconds'%(time2-time1),end="\r")
-    print ()
+                eventid	=eachline_arr[0]
+                ccs1_str	=eachline_arr[9]+","+eachline_arr[10]
+                ccs2_str	=eachline_arr[11]+","+eachline_arr[12]
+                ccs1_list=ccs1_str.split(",")
+                ccs2_list=ccs2_str.split(",")
+                if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list1"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list1"],shell=True)  
+                if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list2"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list2"],shell=True)  
+                with open_output("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list1") as f2:
+                    for x in ccs1_list:
+                        f2.write(x+"\n")
+                with open_output("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+".list2") as f2:
+                    for x in ccs2_list:
+                        f2.write(x+"\n")
+                part_arr=["1","2"]
+                for part in part_arr:
+                    if evidence_bam=="slice":
+                        write_bam_by_ccs(ccs1_list if part=="1" else ccs2_list,"./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".bam",thread)
+                    else:
+                        write_fasta_by_list(ccs1_list if part=="1" else ccs2_list,"./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".fa")
+                        subprocess.run(["minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no "+minimap2_ref+" ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".sam 2>/dev/null"],shell=True) 
+                        subprocess.run(["samtools view -bS ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".sam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".bam -@ "+thread],shell=True) 
+                        subprocess.run(["samtools sort ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".bam -@ "+thread+" -o ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".bam 1>/dev/null 2>&1"],shell=True) 
+                        subprocess.run(["samtools view -h ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".bam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".sam -@ "+thread],shell=True) 
+                        subprocess.run(["samtools index  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".bam"],shell=True) 
+                        subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".sam ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".bam "],shell=True) 
+                        subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"sort_"+part+".sam "],shell=True)
+                        os.remove("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid+"_"+part+".fa")
+                time2=timeit.default_timer()
+                print_progress("          -----Processing "+str(i-1)+"/"+str(file_line_num-1)+': %.0f Seconds'%(time2-time1))
+        end_progress()
+        record_usage("AS_AS part_ccs2ref",usage_start,file_line_num-1)
 
 #################################################################################################################################################################
 #################################################################################################################################################################
 #Start AS-APA analysis.
+#AS-APA analysis of one gene, task=(gene, gene ccs number). Return the result lines of AS2APA_KS.
+def ASAPA_onegene(task):
+    one_gene,gene_ccs_num=task
+    newline_list=[]
+    transcript1_line_list=read_ASccs_lines(one_gene,"1")
+    transcript2_line_list=read_ASccs_lines(one_gene,"2")
+    transcript1_ASlist=[col[0] for col in transcript1_line_list]
+    transcript2_ASlist=[col[0] for col in transcript2_line_list]
+    transcript1_ASlist_len=len(transcript1_ASlist)
+    transcript2_ASlist_len=len(transcript2_ASlist)
+    transcript_ASlist_len=transcript1_ASlist_len+transcript2_ASlist_len
+    gene_AS_list	=sorted(set(transcript1_ASlist))
+    gene_AS_num	=len(gene_AS_list)
+    #dict[AS]=[oneAS_type/chr/strand/min/max/start/end/dSegment_pos/dSegment_length] from AS_catalog
+    dict_ASinfo=read_AS_catalog(one_gene)
+    ##Get of dict_ASccs[AS][ccs]=["1/2","map_start","map_end"], only the ccs read on an AS are stored so the memory follows the reads of the gene
+    dict_ASccs={}
+    for eachline_arr in transcript1_line_list:
+        if eachline_arr[8] in ("noTSS_PAS","TSS_PAS"):
+            dict_ASccs.setdefault(eachline_arr[0],{})[eachline_arr[1]]=["1",eachline_arr[4],eachline_arr[5],eachline_arr[7]]
+    for eachline_arr in transcript2_line_list:
+        if eachline_arr[8] in ("noTSS_PAS","TSS_PAS"):
+            dict_ASccs.setdefault(eachline_arr[0],{})[eachline_arr[1]]=["2",eachline_arr[4],eachline_arr[5],eachline_arr[7]]
+    for oneAS in gene_AS_list:
+        oneAS_info		=dict_ASinfo[oneAS];
+        oneAS_type		=oneAS_info[0]	
+        oneAS_chr		=oneAS_info[1]	
+        oneAS_strand	=oneAS_info[2]
+        oneAS_start		=oneAS_info[5]
+        oneAS_end		=oneAS_info[6]
+        oneAS_pos		=oneAS_chr+":"+str(oneAS_start)+"-"+str(oneAS_end)
+        oneAS_dSegment	=oneAS_info[7] 
+        oneAS_dSegment_len	=oneAS_info[8] 
+        ccs1_arr=[];ccs2_arr=[]
+        PAS1_arr=[];PAS2_arr=[]
+        #Process each ccs read on the AS, in the order of ccs id
+        dict_oneAS_ccs=dict_ASccs.get(oneAS,{})
+        for oneccs in sorted(dict_oneAS_ccs):
+            oneccs_AS_info		=dict_oneAS_ccs[oneccs]
+            oneccs_mapstart	=oneccs_AS_info[1]
+            oneccs_mapend	=oneccs_AS_info[2]
+            oneccs_PAS		=oneccs_AS_info[3]
+            if int(oneccs_mapstart)<=int(oneAS_start) and int(oneAS_end)<=int(oneccs_mapend):
+                if   oneccs_AS_info[0]=="1": ccs1_arr.append(oneccs);	PAS1_arr.append(oneccs_PAS)
+                elif oneccs_AS_info[0]=="2": ccs2_arr.append(oneccs);	PAS2_arr.append(oneccs_PAS)
+        ccs1_num		=len(ccs1_arr)
+        ccs2_num		=len(ccs2_arr)
+        if ccs1_num>2 and ccs2_num>2:
+            ccs1_arr_str	=get_ccs_str(ccs1_arr)
+            ccs2_arr_str	=get_ccs_str(ccs2_arr)
+            PAS1_arr_str	=",".join(PAS1_arr)
+            PAS2_arr_str	=",".join(PAS2_arr)
+            PAS_arr		=list(set(PAS1_arr+PAS2_arr));		
+            PAS_int_arr	=list(map(int,PAS_arr));	PAS_int_arr.sort()
+            PAS1_int_arr	=list(map(int,PAS1_arr));	PAS1_int_arr.sort();	
+            PAS2_int_arr	=list(map(int,PAS2_arr));       PAS2_int_arr.sort();
+            PAS1_median	=calcMedian(PAS1_int_arr)
+            PAS2_median	=calcMedian(PAS2_int_arr)
+            PAS_all_median	=calcMedian(PAS1_int_arr+PAS2_int_arr)
+            AS_PAS_distance	=min(abs(PAS_all_median-oneAS_end),abs(PAS_all_median-oneAS_start))
+            #Get PAS_zero
+            if oneAS_strand=="+": 	PAS_zero=max(PAS_int_arr)
+            else:			PAS_zero=min(PAS_int_arr)
+            #Standardization by PAS_zero
+            dPAS1_int_arr=[] 
+            dPAS2_int_arr=[]
+            dPAS1_str_arr=[]
+            dPAS2_str_arr=[]
+            for x in PAS1_int_arr:	
+                 dPAS1_int_arr.append(abs(x-PAS_zero))
+                 dPAS1_str_arr.append(str(abs(x-PAS_zero)))
+            for y in PAS2_int_arr:	
+                 dPAS2_int_arr.append(abs(y-PAS_zero))
+                 dPAS2_str_arr.append(str(abs(y-PAS_zero)))                 
+            standard_PAS1_str	=",".join(dPAS1_str_arr)
+            standard_PAS2_str	=",".join(dPAS2_str_arr)
+            dPAS1_int_arr_noreplace=list(set(dPAS1_int_arr));	dPAS1_int_arr_noreplace.sort()
+            dPAS2_int_arr_noreplace=list(set(dPAS2_int_arr));	dPAS2_int_arr_noreplace.sort()
+            standard_PAS1_arr_good=[]
+            standard_PAS2_arr_good=[]                    
+            name_num_dict = {}
+            for key in dPAS1_int_arr:
+                name_num_dict[key] 		= name_num_dict.get(key, 0) + 1
+            for x in dPAS1_int_arr_noreplace:
+                each_dPAS_num			=name_num_dict[x]
+                each_dPAS			=str(x)+"("+str(each_dPAS_num)+")"
+                standard_PAS1_arr_good.append(each_dPAS)
+            name_num_dict = {}
+            for key in dPAS2_int_arr:
+                name_num_dict[key] = name_num_dict.get(key, 0) + 1
+            for x in dPAS2_int_arr_noreplace:
+                each_dPAS_num			=name_num_dict[x]
+                each_dPAS			=str(x)+"("+str(each_dPAS_num)+")"
+                standard_PAS2_arr_good.append(each_dPAS)
+            standard_PAS1_str_good		=",".join(standard_PAS1_arr_good)
+            standard_PAS2_str_good		=",".join(standard_PAS2_arr_good)
+            ccs_usage				=int(ccs1_num+ccs2_num)/int(gene_ccs_num)
+            KS_result=ks_2samp(dPAS1_int_arr,dPAS2_int_arr)
+            KS_statistic	=float(KS_result.statistic)
+            pvalue		=float(KS_result.pvalue)
+            newline=one_gene+"\t"+gene_ccs_num+"\t"+oneAS+"\t"+oneAS_pos+"\t"+oneAS_dSegment+"\t"+str(oneAS_dSegment_len)+"\t"+str(PAS_zero)+"\t"+		\
+                    str(PAS_all_median)+"\t"+str(AS_PAS_distance)+"\t"+str(PAS1_median)+"\t"+str(PAS2_median)+"\t"+			\
+                    ccs1_arr_str+"\t"+ccs2_arr_str+"\t"+PAS1_arr_str+"\t"+PAS2_arr_str+"\t"+					\
+                    standard_PAS1_str+"\t"+standard_PAS2_str+"\t"+standard_PAS1_str_good+"\t"+standard_PAS2_str_good+"\t"+		\
+                    str(ccs1_num)+"\t"+str(ccs2_num)+"\t"+										\
+                    str(ccs_usage)+"\t"+str(KS_statistic)+"\t"+str(pvalue)
+            newline_list.append(newline)
+    return newline_list
+
 if sys.argv[1] =="AS_APA":
     print("Start AS-APA analysis")
+    usage_start=get_usage()
     print("Analysis in /output3_ASAPA/")
     if "output3_ASAPA" in os.listdir("./"):
         print("Note: ./output3_ASAPA/ exist")
@@ -1628,196 +2495,30 @@ if sys.argv[1] =="AS_APA":
     with open ("AS2APA_KS","w",encoding="utf-8") as f:
         f.write(head_str+"\n")
         f.close()
+    open_ccs_name("../output0_preparation/7-ccs_inform/ccs_name")
+    open_ASccs_store("../output0_preparation/7-ccs_inform/ASccs_store")
+    open_AS_catalog("../output0_preparation/7-ccs_inform/AS_catalog")
+    task_list=[]
+    for one_gene,gene_ccs_num in zip(gene_list,ccsnum_list):
+        if (one_gene,"1") in dict_ASccs_index and (one_gene,"2") in dict_ASccs_index:
+            task_list.append((one_gene,gene_ccs_num))
+    task_num=len(task_list)
     i=0
-    while i< gene_num:#< gene_num
-        one_gene	=gene_list[i]
-        gene_ccs_num	=ccsnum_list[i]
-        i+=1
-        if (one_gene+"_1") not in os.listdir("../output0_preparation/7-ccs_inform/ASccs_split/") or (one_gene+"_2") not in os.listdir("../output0_preparation/7-ccs_inform/ASccs_split/"):continue
-        print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene,end="\r")
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            transcript1_ASlist=[col[0] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            transcript1_ccslist=[col[1] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            transcript2_ASlist=[col[0] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            transcript2_ccslist=[col[1] for col in csv.reader(f,delimiter='\t')]
-        transcript1_ASlist_len=len(transcript1_ASlist)
-        transcript2_ASlist_len=len(transcript2_ASlist)
-        transcript_ASlist_len=transcript1_ASlist_len+transcript2_ASlist_len
-        gene_AS_list	=list(set(transcript1_ASlist))
-        gene_AS_num	=len(gene_AS_list)
-        ccs_list	=list(set(transcript1_ccslist+transcript2_ccslist))
-        ccs_num		=len(ccs_list)
-        #Get dict of AS infomation: dict[AS]=[oneAS_type/chr/strand/min/max/start/end/dSegment_pos/dSegment_length]
-        dict_ASinfo={}
-        for oneAS in gene_AS_list:
-            oneAS_arr=oneAS.replace(":-",";minus").replace("-",";").replace(":",";").split(";")
-            oneAS_type				=oneAS_arr[1]
-            oneAS_chr				=oneAS_arr[2]
-            oneAS_strand			=oneAS_arr[-1]
-            oneAS_pos_arr			=list(map(int,oneAS_arr[3:-1]))   
-            oneAS_min				=min(oneAS_pos_arr)
-            oneAS_max				=max(oneAS_pos_arr) 
-            if oneAS_type=="RI":		
-                oneAS_start			=oneAS_pos_arr[1]
-                oneAS_end			=oneAS_pos_arr[2]
-            else:		
-                oneAS_start			=oneAS_min
-                oneAS_end			=oneAS_max
-            if oneAS_type=="RI":		
-                oneAS_dSegment_start		=oneAS_pos_arr[1]+1
-                oneAS_dSegment_end		=oneAS_pos_arr[2]-1 
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)       
-            if oneAS_type=="A3":
-                if oneAS_strand=="+":	
-                    oneAS_dSegment_start	=oneAS_pos_arr[1]
-                    oneAS_dSegment_end		=oneAS_pos_arr[3]-1
-                else:		
-                    oneAS_dSegment_start	=oneAS_pos_arr[2]+1
-                    oneAS_dSegment_end		=oneAS_pos_arr[0]	
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   
-            if oneAS_type=="A5":
-                if oneAS_strand=="+":
-                    oneAS_dSegment_start	=oneAS_pos_arr[2]+1
-                    oneAS_dSegment_end		=oneAS_pos_arr[0]
-                else:		
-                    oneAS_dSegment_start	=oneAS_pos_arr[1]
-                    oneAS_dSegment_end		=oneAS_pos_arr[3]-1
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   	
-            if oneAS_type=="SE":
-                oneAS_dSegment_start		=oneAS_pos_arr[1]
-                oneAS_dSegment_end		=oneAS_pos_arr[2]
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   
-            if oneAS_type=="MX":
-                oneAS_dSegment_start1		=oneAS_pos_arr[1]
-                oneAS_dSegment_end1		=oneAS_pos_arr[2]
-                oneAS_dSegment_start2		=oneAS_pos_arr[5]
-                oneAS_dSegment_end2		=oneAS_pos_arr[6]
-                oneAS_dSegment_start		=oneAS_dSegment_start1
-                oneAS_dSegment_end		=oneAS_dSegment_end2
-                oneAS_dSegment_length		=oneAS_dSegment_end1-oneAS_dSegment_start1+1+oneAS_dSegment_end2-oneAS_dSegment_start2+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start1)+"-"+str(oneAS_dSegment_end1)+";"+str(oneAS_dSegment_start2)+"-"+str(oneAS_dSegment_end2)
-            dict_ASinfo[oneAS]=[oneAS_type,oneAS_chr,oneAS_strand,oneAS_min,oneAS_max,oneAS_start,oneAS_end,oneAS_dSegment_pos,oneAS_dSegment_length]
-        ##Get of dict_ASccs[AS,ccs]=["0/1/2","map_start","map_end"]
-        dict_ASccs={}
-        for oneccs in ccs_list:
-            for oneAS in gene_AS_list:
-                dict_ASccs[oneAS,oneccs]=["0","","",""]
-        k=0
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            for line in f.readlines():
-                k+=1
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len),end="\r")
-                eachline_arr=line.strip().split("\t")
-                if eachline_arr[8] in ("noTSS_PAS","TSS_PAS"):
-                    dict_ASccs[eachline_arr[0],eachline_arr[1]]=["1",eachline_arr[4],eachline_arr[5],eachline_arr[7]]
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            for line in f.readlines():
-                k+=1
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len),end="\r")
-                eachline_arr=line.strip().split("\t")
-                if eachline_arr[8] in ("noTSS_PAS","TSS_PAS"):
-                    dict_ASccs[eachline_arr[0],eachline_arr[1]]=["2",eachline_arr[4],eachline_arr[5],eachline_arr[7]]  
-        print()
-        for oneAS in gene_AS_list:
-            oneAS_info		=dict_ASinfo[oneAS];
-            oneAS_type		=oneAS_info[0]	
-            oneAS_chr		=oneAS_info[1]	
-            oneAS_strand	=oneAS_info[2]
-            oneAS_start		=oneAS_info[5]
-            oneAS_end		=oneAS_info[6]
-            oneAS_pos		=oneAS_chr+":"+str(oneAS_start)+"-"+str(oneAS_end)
-            oneAS_dSegment	=oneAS_info[7] 
-            oneAS_dSegment_len	=oneAS_info[8] 
-            ccs1_arr=[];ccs2_arr=[]
-            PAS1_arr=[];PAS2_arr=[]
-            #Process each ccs
-            for oneccs in ccs_list:
-                oneccs_AS_info		=dict_ASccs[oneAS,oneccs]
-                if oneccs_AS_info!=["0","","",""]:
-                    oneccs_mapstart	=oneccs_AS_info[1]
-                    oneccs_mapend	=oneccs_AS_info[2]
-                    oneccs_PAS		=oneccs_AS_info[3]
-                    if int(oneccs_mapstart)<=int(oneAS_start) and int(oneAS_end)<=int(oneccs_mapend):
-                        if   oneccs_AS_info[0]=="1": ccs1_arr.append(oneccs);	PAS1_arr.append(oneccs_PAS)
-                        elif oneccs_AS_info[0]=="2": ccs2_arr.append(oneccs);	PAS2_arr.append(oneccs_PAS)
-            ccs1_num		=len(ccs1_arr)
-            ccs2_num		=len(ccs2_arr)
-            if ccs1_num>2 and ccs2_num>2:
-                ccs1_arr_str	=",".join(ccs1_arr)
-                ccs2_arr_str	=",".join(ccs2_arr)
-                PAS1_arr_str	=",".join(PAS1_arr)
-                PAS2_arr_str	=",".join(PAS2_arr)
-                PAS_arr		=list(set(PAS1_arr+PAS2_arr));		
-                PAS_int_arr	=list(map(int,PAS_arr));	PAS_int_arr.sort()
-                PAS1_int_arr	=list(map(int,PAS1_arr));	PAS1_int_arr.sort();	
-                PAS2_int_arr	=list(map(int,PAS2_arr));       PAS2_int_arr.sort();
-                PAS1_median	=calcMedian(PAS1_int_arr)
-                PAS2_median	=calcMedian(PAS2_int_arr)
-                PAS_all_median	=calcMedian(PAS1_int_arr+PAS2_int_arr)
-                AS_PAS_distance	=min(abs(PAS_all_median-oneAS_end),abs(PAS_all_median-oneAS_start))
-                #Get PAS_zero
-                if oneAS_strand=="+": 	PAS_zero=max(PAS_int_arr)
-                else:			PAS_zero=min(PAS_int_arr)
-                #Standardization by PAS_zero
-                dPAS1_int_arr=[] 
-                dPAS2_int_arr=[]
-                dPAS1_str_arr=[]
-                dPAS2_str_arr=[]
-                for x in PAS1_int_arr:	
-                     dPAS1_int_arr.append(abs(x-PAS_zero))
-                     dPAS1_str_arr.append(str(abs(x-PAS_zero)))
-                for y in PAS2_int_arr:	
-                     dPAS2_int_arr.append(abs(y-PAS_zero))
-                     dPAS2_str_arr.append(str(abs(y-PAS_zero)))                 
-                standard_PAS1_str	=",".join(dPAS1_str_arr)
-                standard_PAS2_str	=",".join(dPAS2_str_arr)
-                dPAS1_int_arr_noreplace=list(set(dPAS1_int_arr));	dPAS1_int_arr_noreplace.sort()
-                dPAS2_int_arr_noreplace=list(set(dPAS2_int_arr));	dPAS2_int_arr_noreplace.sort()
-                standard_PAS1_arr_good=[]
-                standard_PAS2_arr_good=[]                    
-                name_num_dict = {}
-                for key in dPAS1_int_arr:
-                    name_num_dict[key] 		= name_num_dict.get(key, 0) + 1
-                for x in dPAS1_int_arr_noreplace:
-                    each_dPAS_num			=name_num_dict[x]
-                    each_dPAS			=str(x)+"("+str(each_dPAS_num)+")"
-                    standard_PAS1_arr_good.append(each_dPAS)
-                name_num_dict = {}
-                for key in dPAS2_int_arr:
-                    name_num_dict[key] = name_num_dict.get(key, 0) + 1
-                for x in dPAS2_int_arr_noreplace:
-                    each_dPAS_num			=name_num_dict[x]
-                    each_dPAS			=str(x)+"("+str(each_dPAS_num)+")"
-                    standard_PAS2_arr_good.append(each_dPAS)
-                standard_PAS1_str_good		=",".join(standard_PAS1_arr_good)
-                standard_PAS2_str_good		=",".join(standard_PAS2_arr_good)
-                ccs_usage				=int(ccs1_num+ccs2_num)/int(gene_ccs_num)
-                KS_str=str(ks_2samp(dPAS1_int_arr,dPAS2_int_arr))[13:][:-1]
-                KS_str_arr=KS_str.split(", ")
-                KS_statistic	=KS_str_arr[0][10:]
-                pvalue		=KS_str_arr[1][7:]
-                newline=one_gene+"\t"+gene_ccs_num+"\t"+oneAS+"\t"+oneAS_pos+"\t"+oneAS_dSegment+"\t"+str(oneAS_dSegment_len)+"\t"+str(PAS_zero)+"\t"+		\
-                        str(PAS_all_median)+"\t"+str(AS_PAS_distance)+"\t"+str(PAS1_median)+"\t"+str(PAS2_median)+"\t"+			\
-                        ccs1_arr_str+"\t"+ccs2_arr_str+"\t"+PAS1_arr_str+"\t"+PAS2_arr_str+"\t"+					\
-                        standard_PAS1_str+"\t"+standard_PAS2_str+"\t"+standard_PAS1_str_good+"\t"+standard_PAS2_str_good+"\t"+		\
-                        str(ccs1_num)+"\t"+str(ccs2_num)+"\t"+										\
-                        str(ccs_usage)+"\t"+KS_statistic+"\t"+pvalue
-                with open ("AS2APA_KS","a",encoding="utf-8") as f2:
-                     f2.write(newline+"\n")
-                     f2.close()
+    with open_output("AS2APA_KS") as f:
+        for newline_list in gene_pool_imap(ASAPA_onegene,task_list,thread):
+            print_progress("          Processing "+str(i+1)+"/"+str(task_num)+":\t"+task_list[i][0])
+            for newline in newline_list:
+                f.write(newline+"\n")
+            i+=1
+    end_progress()
+    record_usage("AS_APA test",usage_start,task_num)
+    usage_start=get_usage()
     print("          Filter by pvalue<0.05, min_ccsnum and min_dSegmentlen")
     with open ("AS2APA_KS.pvalue0.05","w",encoding="utf-8") as f2:
         f2.write(head_str+"\n")
         f2.close()
     i=0
-    with open ("AS2APA_KS","r",encoding="ISO-8859-1") as f:
+    with open ("AS2APA_KS","r",encoding="ISO-8859-1") as f, open_output("AS2APA_KS.pvalue0.05") as f2:
         for line in f.readlines():
             i+=1
             if i==1 : continue
@@ -1831,9 +2532,7 @@ if sys.argv[1] =="AS_APA":
             pvalue		=float(eachline_arr[23])
             if ccs1_num>int(min_ccsnum) and ccs2_num>int(min_ccsnum):
                 if dSegment_length>int(min_dSegmentlen) and KS_statistic>=float(min_KS_statistic) and pvalue<0.05 and ccs_usage>=float(min_ccs_usage):
-                    with open ("AS2APA_KS.pvalue0.05","a",encoding="utf-8") as f2:
-                        f2.write(eachline+"\n")
-                        f2.close()                       
+                    f2.write(eachline+"\n")
     subprocess.run(["sort -g -k 24 AS2APA_KS.pvalue0.05 | cut -f 1-11,18-24   > AS2APA_KS.pvalue0.05.simple"],shell=True)
     with open("AS2APA_KS.pvalue0.05.simple","r",encoding="ISO-8859-1") as f:
         result_num=len(f.readlines())-1
@@ -1841,84 +2540,206 @@ if sys.argv[1] =="AS_APA":
     print("     Complete!")
     print("     Possible results number is "+str(result_num))
     print()
-    print("     part_ccs2ref. This section gives the BAM files which can be used as reference for credibility.")
-    print("          All ccs were split into two parts: ASform1 + ASform2")
-    print("          Get ccs(pvalue0.05) list from AS2APA_KS.pvalue0.05(simple)")
-    print("          Get fasta from transcript1 and 2 in each AS and then minimap2ref")
-    if "part_ccs2ref" in os.listdir("./"):
-        print("          Note: ./part_ccs2ref/ exist and will be deleted.") 
-        subprocess.run(["rm -r ./part_ccs2ref"],shell=True) 
-    subprocess.run(["mkdir ./part_ccs2ref"],shell=True)
-    i=0
-    with open("AS2APA_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i==1 : continue
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            ccs1_str=eachline_arr[11]
-            ccs2_str=eachline_arr[12]
-            ccs_list=ccs1_str.split(",")+ccs2_str.split(",")
-            for x in ccs_list:
-                with open("./part_ccs2ref/ccs.list0","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()
-    subprocess.run(["sort -n ./part_ccs2ref/ccs.list0 | uniq > ./part_ccs2ref/1-ccs.pvalue0.05.list"],shell=True)
-    subprocess.run(["rm ./part_ccs2ref/ccs.list0"],shell=True)
-
-    print("          Extract fasta sequence")
-    subprocess.run(["perl ../output0_preparation/script/getfastabylist.pl  ./part_ccs2ref/1-ccs.pvalue0.05.list ../output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa > ./part_ccs2ref/2-ccs.pvalue0.05.fa"],shell=True)
-    i=0
-    if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"):
-        subprocess.run(["rm -r ./part_ccs2ref/ccs_pvalue0.05_eachAS/"],shell=True)  
-    subprocess.run(["mkdir ./part_ccs2ref/ccs_pvalue0.05_eachAS"],shell=True)
-    i=0
-    with open("AS2APA_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        file_line_num=len(f.readlines())
-    with open("AS2APA_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i==1 : continue
-            time1=timeit.default_timer()
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            eventid1	=eachline_arr[2]
-            eventid2	=eachline_arr[2].replace(";","\;")
-            ccs1_str	=eachline_arr[11]
-            ccs2_str	=eachline_arr[12]
-            ccs1_list=ccs1_str.split(",")
-            ccs2_list=ccs2_str.split(",")
-            if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list1"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list1"],shell=True)  
-            if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list2"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list2"],shell=True)  
-            for x in ccs1_list:
-                with open("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+".list1","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()            
-            for x in ccs2_list:
-                with open("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+".list2","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()  
-            part_arr=["1","2"]
-            for part in part_arr:
-                subprocess.run(["perl ../output0_preparation/script/getfastabylist.pl  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list"+part+" ./part_ccs2ref/2-ccs.pvalue0.05.fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa"],shell=True)
-                subprocess.run(["minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no ../output0_preparation/4-all_FLNC_minimap2ref/ref.fa ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam 2>/dev/null"],shell=True) 
-                subprocess.run(["samtools view -bS ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam -@ "+thread],shell=True) 
-                subprocess.run(["samtools sort ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam -@ "+thread+" -o ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam 1>/dev/null 2>&1"],shell=True) 
-                subprocess.run(["samtools view -h ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".sam -@ "+thread],shell=True) 
-                subprocess.run(["samtools index  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam"],shell=True) 
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam "],shell=True) 
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".sam "],shell=True)
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa"],shell=True)
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list"+part],shell=True)
-            time2=timeit.default_timer()
-            print("          -----Processing "+str(i-1)+"/"+str(file_line_num-1)+': %.0f Seconds'%(time2-time1),end="\r")
-    print ()
+    record_usage("AS_APA filter",usage_start,result_num)
+    usage_start=get_usage()
+    if evidence_bam=="none":
+        print("     part_ccs2ref is skipped (-evidence_bam none).")
+    else:
+        print("     part_ccs2ref. This section gives the BAM files which can be used as reference for credibility.")
+        print("          All ccs were split into two parts: ASform1 + ASform2")
+        print("          Get ccs(pvalue0.05) list from AS2APA_KS.pvalue0.05(simple)")
+        print("          Get fasta from transcript1 and 2 in each AS and then minimap2ref")
+        if "part_ccs2ref" in os.listdir("./"):
+            print("          Note: ./part_ccs2ref/ exist and will be deleted.") 
+            subprocess.run(["rm -r ./part_ccs2ref"],shell=True) 
+        subprocess.run(["mkdir ./part_ccs2ref"],shell=True)
+        i=0
+        with open("AS2APA_KS.pvalue0.05","r",encoding="ISO-8859-1") as f, open_output("./part_ccs2ref/ccs.list0") as f2:
+            for line in f.readlines():
+                i+=1
+                if i==1 : continue
+                eachline=line.strip()
+                eachline_arr=eachline.split("\t")
+                ccs1_str=eachline_arr[11]
+                ccs2_str=eachline_arr[12]
+                ccs_list=ccs1_str.split(",")+ccs2_str.split(",")
+                for x in ccs_list:
+                    f2.write(x+"\n")
+        subprocess.run(["sort -n ./part_ccs2ref/ccs.list0 | uniq > ./part_ccs2ref/1-ccs.pvalue0.05.list"],shell=True)
+        subprocess.run(["rm ./part_ccs2ref/ccs.list0"],shell=True)
+
+        print("          Extract fasta sequence")
+        open_fasta_index("../output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa")
+        minimap2_ref="../output0_preparation/4-all_FLNC_minimap2ref/ref.mmi"
+        if not os.path.exists(minimap2_ref):minimap2_ref="../output0_preparation/4-all_FLNC_minimap2ref/ref.fa"
+        ccs_pvalue_list=[row[0] for row in read_table("./part_ccs2ref/1-ccs.pvalue0.05.list")[1]]
+        write_fasta_by_list(ccs_pvalue_list,"./part_ccs2ref/2-ccs.pvalue0.05.fa")
+        if evidence_bam=="slice":
+            print("          Extract alignments from minimap.sort.bam")
+            open_bam_by_ccs("../output0_preparation/4-all_FLNC_minimap2ref/minimap.sort.bam",set(ccs_pvalue_list))
+        i=0
+        if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"):
+            subprocess.run(["rm -r ./part_ccs2ref/ccs_pvalue0.05_eachAS/"],shell=True)  
+        subprocess.run(["mkdir ./part_ccs2ref/ccs_pvalue0.05_eachAS"],shell=True)
+        i=0
+        with open("AS2APA_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
+            file_line_num=len(f.readlines())
+        with open("AS2APA_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
+            for line in f.readlines():
+                i+=1
+                if i==1 : continue
+                time1=timeit.default_timer()
+                eachline=line.strip()
+                eachline_arr=eachline.split("\t")
+                eventid1	=eachline_arr[2]
+                eventid2	=eachline_arr[2].replace(";","\;")
+                ccs1_str	=eachline_arr[11]
+                ccs2_str	=eachline_arr[12]
+                ccs1_list=ccs1_str.split(",")
+                ccs2_list=ccs2_str.split(",")
+                if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list1"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list1"],shell=True)  
+                if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list2"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list2"],shell=True)  
+                with open_output("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+".list1") as f2:
+                    for x in ccs1_list:
+                        f2.write(x+"\n")
+                with open_output("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+".list2") as f2:
+                    for x in ccs2_list:
+                        f2.write(x+"\n")
+                part_arr=["1","2"]
+                for part in part_arr:
+                    if evidence_bam=="slice":
+                        write_bam_by_ccs(ccs1_list if part=="1" else ccs2_list,"./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+"sort_"+part+".bam",thread)
+                    else:
+                        write_fasta_by_list(ccs1_list if part=="1" else ccs2_list,"./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+"_"+part+".fa")
+                        subprocess.run(["minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no "+minimap2_ref+" ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam 2>/dev/null"],shell=True) 
+                        subprocess.run(["samtools view -bS ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam -@ "+thread],shell=True) 
+                        subprocess.run(["samtools sort ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam -@ "+thread+" -o ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam 1>/dev/null 2>&1"],shell=True) 
+                        subprocess.run(["samtools view -h ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".sam -@ "+thread],shell=True) 
+                        subprocess.run(["samtools index  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam"],shell=True) 
+                        subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam "],shell=True) 
+                        subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".sam "],shell=True)
+                        subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa"],shell=True)
+                    subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list"+part],shell=True)
+                time2=timeit.default_timer()
+                print_progress("          -----Processing "+str(i-1)+"/"+str(file_line_num-1)+': %.0f Seconds'%(time2-time1))
+        end_progress()
+        record_usage("AS_APA part_ccs2ref",usage_start,file_line_num-1)
 
 #################################################################################################################################################################
 #################################################################################################################################################################
 #Start AS-ATI analysis.                        
+#AS-ATI analysis of one gene, task=(gene, gene ccs number). Return the result lines of AS2ATI_KS.
+def ASATI_onegene(task):
+    one_gene,gene_ccs_num=task
+    newline_list=[]
+    transcript1_line_list=read_ASccs_lines(one_gene,"1")
+    transcript2_line_list=read_ASccs_lines(one_gene,"2")
+    transcript1_ASlist=[col[0] for col in transcript1_line_list]
+    transcript2_ASlist=[col[0] for col in transcript2_line_list]
+    transcript1_ASlist_len=len(transcript1_ASlist)
+    transcript2_ASlist_len=len(transcript2_ASlist)
+    transcript_ASlist_len=transcript1_ASlist_len+transcript2_ASlist_len
+    gene_AS_list	=sorted(set(transcript1_ASlist))
+    gene_AS_num	=len(gene_AS_list)
+    #dict[AS]=[oneAS_type/chr/strand/min/max/start/end/dSegment_pos/dSegment_length] from AS_catalog
+    dict_ASinfo=read_AS_catalog(one_gene)
+    ##Get of dict_ASccs[AS][ccs]=["1/2","map_start","map_end"], only the ccs read on an AS are stored so the memory follows the reads of the gene
+    dict_ASccs={}
+    for eachline_arr in transcript1_line_list:
+        if eachline_arr[8] in ("TSS_PAS","TSS_noPAS"):
+            dict_ASccs.setdefault(eachline_arr[0],{})[eachline_arr[1]]=["1",eachline_arr[4],eachline_arr[5],eachline_arr[6]]
+    for eachline_arr in transcript2_line_list:
+        if eachline_arr[8] in ("TSS_PAS","TSS_noPAS"):
+            dict_ASccs.setdefault(eachline_arr[0],{})[eachline_arr[1]]=["2",eachline_arr[4],eachline_arr[5],eachline_arr[6]]
+    for oneAS in gene_AS_list:
+        oneAS_info		=dict_ASinfo[oneAS];
+        oneAS_type		=oneAS_info[0]	
+        oneAS_chr		=oneAS_info[1]	
+        oneAS_strand	=oneAS_info[2]
+        oneAS_start		=oneAS_info[5]
+        oneAS_end		=oneAS_info[6] 
+        oneAS_pos		=oneAS_chr+":"+str(oneAS_start)+"-"+str(oneAS_end)
+        oneAS_dSegment	=oneAS_info[7] 
+        oneAS_dSegment_len	=oneAS_info[8] 
+        ccs1_arr=[];ccs2_arr=[]
+        TSS1_arr=[];TSS2_arr=[]
+        #Process each ccs read on the AS, in the order of ccs id
+        dict_oneAS_ccs=dict_ASccs.get(oneAS,{})
+        for oneccs in sorted(dict_oneAS_ccs):
+            oneccs_AS_info		=dict_oneAS_ccs[oneccs]
+            oneccs_mapstart	=oneccs_AS_info[1]
+            oneccs_mapend	=oneccs_AS_info[2]
+            oneccs_TSS		=oneccs_AS_info[3]
+            if int(oneccs_mapstart)<=int(oneAS_start) and int(oneAS_end)<=int(oneccs_mapend):
+                if   oneccs_AS_info[0]=="1": ccs1_arr.append(oneccs);	TSS1_arr.append(oneccs_TSS)
+                elif oneccs_AS_info[0]=="2": ccs2_arr.append(oneccs);	TSS2_arr.append(oneccs_TSS)
+        ccs1_num		=len(ccs1_arr)
+        ccs2_num		=len(ccs2_arr)
+        if ccs1_num>2 and ccs2_num>2:
+            ccs1_arr_str	=get_ccs_str(ccs1_arr)
+            ccs2_arr_str	=get_ccs_str(ccs2_arr)
+            TSS1_arr_str	=",".join(TSS1_arr)
+            TSS2_arr_str	=",".join(TSS2_arr)
+            TSS_arr		=list(set(TSS1_arr+TSS2_arr));		
+            TSS_int_arr	=list(map(int,TSS_arr));	TSS_int_arr.sort()
+            TSS1_int_arr	=list(map(int,TSS1_arr));	TSS1_int_arr.sort();	
+            TSS2_int_arr	=list(map(int,TSS2_arr));       TSS2_int_arr.sort();
+            TSS1_median	=calcMedian(TSS1_int_arr)
+            TSS2_median	=calcMedian(TSS2_int_arr)
+            TSS_all_median	=calcMedian(TSS1_int_arr+TSS2_int_arr)
+            AS_TSS_distance	=min(abs(TSS_all_median-oneAS_end),abs(TSS_all_median-oneAS_start))	
+            #Get TSS_zero
+            if oneAS_strand=="+": 	TSS_zero=min(TSS_int_arr)
+            else:			TSS_zero=max(TSS_int_arr)
+            #Standardization by TSS_zero
+            dTSS1_int_arr=[] 
+            dTSS2_int_arr=[]
+            dTSS1_str_arr=[]
+            dTSS2_str_arr=[]
+            for x in TSS1_int_arr:	
+                 dTSS1_int_arr.append(abs(x-TSS_zero))
+                 dTSS1_str_arr.append(str(abs(x-TSS_zero)))
+            for y in TSS2_int_arr:	
+                 dTSS2_int_arr.append(abs(y-TSS_zero))
+                 dTSS2_str_arr.append(str(abs(y-TSS_zero)))                 
+            standard_TSS1_str	=",".join(dTSS1_str_arr)
+            standard_TSS2_str	=",".join(dTSS2_str_arr)
+            dTSS1_int_arr_noreplace=list(set(dTSS1_int_arr));	dTSS1_int_arr_noreplace.sort()
+            dTSS2_int_arr_noreplace=list(set(dTSS2_int_arr));	dTSS2_int_arr_noreplace.sort()
+            standard_TSS1_arr_good=[]
+            standard_TSS2_arr_good=[]                    
+            name_num_dict = {}
+            for key in dTSS1_int_arr:
+                name_num_dict[key] 		= name_num_dict.get(key, 0) + 1
+            for x in dTSS1_int_arr_noreplace:
+                each_dTSS_num			=name_num_dict[x]
+                each_dTSS			=str(x)+"("+str(each_dTSS_num)+")"
+                standard_TSS1_arr_good.append(each_dTSS)
+            name_num_dict = {}
+            for key in dTSS2_int_arr:
+                name_num_dict[key] = name_num_dict.get(key, 0) + 1
+            for x in dTSS2_int_arr_noreplace:
+                each_dTSS_num			=name_num_dict[x]
+                each_dTSS			=str(x)+"("+str(each_dTSS_num)+")"
+                standard_TSS2_arr_good.append(each_dTSS)
+            standard_TSS1_str_good		=",".join(standard_TSS1_arr_good)
+            standard_TSS2_str_good		=",".join(standard_TSS2_arr_good)
+            ccs_usage				=int(ccs1_num+ccs2_num)/int(gene_ccs_num)
+            KS_result=ks_2samp(dTSS1_int_arr,dTSS2_int_arr)
+            KS_statistic	=float(KS_result.statistic)
+            pvalue		=float(KS_result.pvalue)
+            newline=one_gene+"\t"+gene_ccs_num+"\t"+oneAS+"\t"+oneAS_pos+"\t"+oneAS_dSegment+"\t"+str(oneAS_dSegment_len)+"\t"+str(TSS_zero)+"\t"+		\
+                    str(TSS_all_median)+"\t"+str(AS_TSS_distance)+"\t"+str(TSS1_median)+"\t"+str(TSS2_median)+"\t"+			\
+                    ccs1_arr_str+"\t"+ccs2_arr_str+"\t"+TSS1_arr_str+"\t"+TSS2_arr_str+"\t"+					\
+                    standard_TSS1_str+"\t"+standard_TSS2_str+"\t"+standard_TSS1_str_good+"\t"+standard_TSS2_str_good+"\t"+		\
+                    str(ccs1_num)+"\t"+str(ccs2_num)+"\t"+										\
+                    str(ccs_usage)+"\t"+str(KS_statistic)+"\t"+str(pvalue)
+            newline_list.append(newline)
+    return newline_list
+
 if sys.argv[1] =="AS_ATI":
     print("Start AS-ATI analysis")
+    usage_start=get_usage()
     print("Analysis in /output2_ASATI/")
     if "output2_ASATI" in os.listdir("./"):
         print("Note: ./output2_ASATI/ exist")
@@ -1942,196 +2763,30 @@ if sys.argv[1] =="AS_ATI":
     with open ("AS2ATI_KS","w",encoding="utf-8") as f:
         f.write(head_str+"\n")
         f.close()
+    open_ccs_name("../output0_preparation/7-ccs_inform/ccs_name")
+    open_ASccs_store("../output0_preparation/7-ccs_inform/ASccs_store")
+    open_AS_catalog("../output0_preparation/7-ccs_inform/AS_catalog")
+    task_list=[]
+    for one_gene,gene_ccs_num in zip(gene_list,ccsnum_list):
+        if (one_gene,"1") in dict_ASccs_index and (one_gene,"2") in dict_ASccs_index:
+            task_list.append((one_gene,gene_ccs_num))
+    task_num=len(task_list)
     i=0
-    while i< gene_num:#< gene_num
-        one_gene	=gene_list[i]
-        gene_ccs_num	=ccsnum_list[i]
-        i+=1
-        print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene,end="\r")
-        if (one_gene+"_1") not in os.listdir("../output0_preparation/7-ccs_inform/ASccs_split/") or (one_gene+"_2") not in os.listdir("../output0_preparation/7-ccs_inform/ASccs_split/"):continue
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            transcript1_ASlist=[col[0] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            transcript1_ccslist=[col[1] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            transcript2_ASlist=[col[0] for col in csv.reader(f,delimiter='\t')] 
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            transcript2_ccslist=[col[1] for col in csv.reader(f,delimiter='\t')]
-        transcript1_ASlist_len=len(transcript1_ASlist)
-        transcript2_ASlist_len=len(transcript2_ASlist)
-        transcript_ASlist_len=transcript1_ASlist_len+transcript2_ASlist_len
-        gene_AS_list	=list(set(transcript1_ASlist))
-        gene_AS_num	=len(gene_AS_list)
-        ccs_list	=list(set(transcript1_ccslist+transcript2_ccslist))
-        ccs_num		=len(ccs_list)
-        #Get dict of AS infomation: dict[AS]=[oneAS_type/chr/strand/min/max/start/end/dSegment_pos/dSegment_length]
-        dict_ASinfo={}
-        for oneAS in gene_AS_list:
-            oneAS_arr=oneAS.replace(":-",";minus").replace("-",";").replace(":",";").split(";")
-            oneAS_type				=oneAS_arr[1]
-            oneAS_chr				=oneAS_arr[2]
-            oneAS_strand			=oneAS_arr[-1]
-            oneAS_pos_arr			=list(map(int,oneAS_arr[3:-1]))   
-            oneAS_min				=min(oneAS_pos_arr)
-            oneAS_max				=max(oneAS_pos_arr) 
-            if oneAS_type=="RI":		
-                oneAS_start			=oneAS_pos_arr[1]
-                oneAS_end			=oneAS_pos_arr[2]
-            else:		
-                oneAS_start			=oneAS_min
-                oneAS_end			=oneAS_max
-            if oneAS_type=="RI":		
-                oneAS_dSegment_start		=oneAS_pos_arr[1]+1
-                oneAS_dSegment_end		=oneAS_pos_arr[2]-1 
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)       
-            if oneAS_type=="A3":
-                if oneAS_strand=="+":	
-                    oneAS_dSegment_start	=oneAS_pos_arr[1]
-                    oneAS_dSegment_end		=oneAS_pos_arr[3]-1
-                else:		
-                    oneAS_dSegment_start	=oneAS_pos_arr[2]+1
-                    oneAS_dSegment_end		=oneAS_pos_arr[0]	
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   
-            if oneAS_type=="A5":
-                if oneAS_strand=="+":
-                    oneAS_dSegment_start	=oneAS_pos_arr[2]+1
-                    oneAS_dSegment_end		=oneAS_pos_arr[0]
-                else:		
-                    oneAS_dSegment_start	=oneAS_pos_arr[1]
-                    oneAS_dSegment_end		=oneAS_pos_arr[3]-1
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   	
-            if oneAS_type=="SE":
-                oneAS_dSegment_start		=oneAS_pos_arr[1]
-                oneAS_dSegment_end		=oneAS_pos_arr[2]
-                oneAS_dSegment_length		=oneAS_dSegment_end-oneAS_dSegment_start+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start)+"-"+str(oneAS_dSegment_end)   
-            if oneAS_type=="MX":
-                oneAS_dSegment_start1		=oneAS_pos_arr[1]
-                oneAS_dSegment_end1		=oneAS_pos_arr[2]
-                oneAS_dSegment_start2		=oneAS_pos_arr[5]
-                oneAS_dSegment_end2		=oneAS_pos_arr[6]
-                oneAS_dSegment_start		=oneAS_dSegment_start1
-                oneAS_dSegment_end		=oneAS_dSegment_end2
-                oneAS_dSegment_length		=oneAS_dSegment_end1-oneAS_dSegment_start1+1+oneAS_dSegment_end2-oneAS_dSegment_start2+1
-                oneAS_dSegment_pos		=oneAS_chr+":"+str(oneAS_dSegment_start1)+"-"+str(oneAS_dSegment_end1)+";"+str(oneAS_dSegment_start2)+"-"+str(oneAS_dSegment_end2)
-            dict_ASinfo[oneAS]=[oneAS_type,oneAS_chr,oneAS_strand,oneAS_min,oneAS_max,oneAS_start,oneAS_end,oneAS_dSegment_pos,oneAS_dSegment_length]
-        ##Get of dict_ASccs[AS,ccs]=["0/1/2","map_start","map_end"]
-        dict_ASccs={}
-        for oneccs in ccs_list:
-            for oneAS in gene_AS_list:
-                dict_ASccs[oneAS,oneccs]=["0","","",""]
-        k=0
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_1","r",encoding="ISO-8859-1") as f:
-            for line in f.readlines():
-                k+=1
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len),end="\r")
-                eachline_arr=line.strip().split("\t")
-                if eachline_arr[8] in ("TSS_PAS","TSS_noPAS"):
-                    dict_ASccs[eachline_arr[0],eachline_arr[1]]=["1",eachline_arr[4],eachline_arr[5],eachline_arr[6]]
-        with open ("../output0_preparation/7-ccs_inform/ASccs_split/"+one_gene+"_2","r",encoding="ISO-8859-1") as f:
-            for line in f.readlines():
-                k+=1
-                print("          Processing "+str(i)+"/"+str(gene_num)+":\t"+one_gene+"\tGet_ASccs:"+str(k)+"/"+str(transcript_ASlist_len),end="\r")
-                eachline_arr=line.strip().split("\t")
-                if eachline_arr[8] in ("TSS_PAS","TSS_noPAS"):
-                    dict_ASccs[eachline_arr[0],eachline_arr[1]]=["2",eachline_arr[4],eachline_arr[5],eachline_arr[6]]  
-        print()
-        for oneAS in gene_AS_list:
-            oneAS_info		=dict_ASinfo[oneAS];
-            oneAS_type		=oneAS_info[0]	
-            oneAS_chr		=oneAS_info[1]	
-            oneAS_strand	=oneAS_info[2]
-            oneAS_start		=oneAS_info[5]
-            oneAS_end		=oneAS_info[6] 
-            oneAS_pos		=oneAS_chr+":"+str(oneAS_start)+"-"+str(oneAS_end)
-            oneAS_dSegment	=oneAS_info[7] 
-            oneAS_dSegment_len	=oneAS_info[8] 
-            ccs1_arr=[];ccs2_arr=[]
-            TSS1_arr=[];TSS2_arr=[]
-            #Process each ccs
-            for oneccs in ccs_list:
-                oneccs_AS_info		=dict_ASccs[oneAS,oneccs]
-                if oneccs_AS_info!=["0","","",""]:
-                    oneccs_mapstart	=oneccs_AS_info[1]
-                    oneccs_mapend	=oneccs_AS_info[2]
-                    oneccs_TSS		=oneccs_AS_info[3]
-                    if int(oneccs_mapstart)<=int(oneAS_start) and int(oneAS_end)<=int(oneccs_mapend):
-                        if   oneccs_AS_info[0]=="1": ccs1_arr.append(oneccs);	TSS1_arr.append(oneccs_TSS)
-                        elif oneccs_AS_info[0]=="2": ccs2_arr.append(oneccs);	TSS2_arr.append(oneccs_TSS)
-            ccs1_num		=len(ccs1_arr)
-            ccs2_num		=len(ccs2_arr)
-            if ccs1_num>2 and ccs2_num>2:
-                ccs1_arr_str	=",".join(ccs1_arr)
-                ccs2_arr_str	=",".join(ccs2_arr)
-                TSS1_arr_str	=",".join(TSS1_arr)
-                TSS2_arr_str	=",".join(TSS2_arr)
-                TSS_arr		=list(set(TSS1_arr+TSS2_arr));		
-                TSS_int_arr	=list(map(int,TSS_arr));	TSS_int_arr.sort()
-                TSS1_int_arr	=list(map(int,TSS1_arr));	TSS1_int_arr.sort();	
-                TSS2_int_arr	=list(map(int,TSS2_arr));       TSS2_int_arr.sort();
-                TSS1_median	=calcMedian(TSS1_int_arr)
-                TSS2_median	=calcMedian(TSS2_int_arr)
-                TSS_all_median	=calcMedian(TSS1_int_arr+TSS2_int_arr)
-                AS_TSS_distance	=min(abs(TSS_all_median-oneAS_end),abs(TSS_all_median-oneAS_start))	
-                #Get TSS_zero
-                if oneAS_strand=="+": 	TSS_zero=min(TSS_int_arr)
-                else:			TSS_zero=max(TSS_int_arr)
-                #Standardization by TSS_zero
-                dTSS1_int_arr=[] 
-                dTSS2_int_arr=[]
-                dTSS1_str_arr=[]
-                dTSS2_str_arr=[]
-                for x in TSS1_int_arr:	
-                     dTSS1_int_arr.append(abs(x-TSS_zero))
-                     dTSS1_str_arr.append(str(abs(x-TSS_zero)))
-                for y in TSS2_int_arr:	
-                     dTSS2_int_arr.append(abs(y-TSS_zero))
-                     dTSS2_str_arr.append(str(abs(y-TSS_zero)))                 
-                standard_TSS1_str	=",".join(dTSS1_str_arr)
-                standard_TSS2_str	=",".join(dTSS2_str_arr)
-                dTSS1_int_arr_noreplace=list(set(dTSS1_int_arr));	dTSS1_int_arr_noreplace.sort()
-                dTSS2_int_arr_noreplace=list(set(dTSS2_int_arr));	dTSS2_int_arr_noreplace.sort()
-                standard_TSS1_arr_good=[]
-                standard_TSS2_arr_good=[]                    
-                name_num_dict = {}
-                for key in dTSS1_int_arr:
-                    name_num_dict[key] 		= name_num_dict.get(key, 0) + 1
-                for x in dTSS1_int_arr_noreplace:
-                    each_dTSS_num			=name_num_dict[x]
-                    each_dTSS			=str(x)+"("+str(each_dTSS_num)+")"
-                    standard_TSS1_arr_good.append(each_dTSS)
-                name_num_dict = {}
-                for key in dTSS2_int_arr:
-                    name_num_dict[key] = name_num_dict.get(key, 0) + 1
-                for x in dTSS2_int_arr_noreplace:
-                    each_dTSS_num			=name_num_dict[x]
-                    each_dTSS			=str(x)+"("+str(each_dTSS_num)+")"
-                    standard_TSS2_arr_good.append(each_dTSS)
-                standard_TSS1_str_good		=",".join(standard_TSS1_arr_good)
-                standard_TSS2_str_good		=",".join(standard_TSS2_arr_good)
-                ccs_usage				=int(ccs1_num+ccs2_num)/int(gene_ccs_num)
-                KS_str=str(ks_2samp(dTSS1_int_arr,dTSS2_int_arr))[13:][:-1]
-                KS_str_arr=KS_str.split(", ")
-                KS_statistic	=KS_str_arr[0][10:]
-                pvalue		=KS_str_arr[1][7:]
-                newline=one_gene+"\t"+gene_ccs_num+"\t"+oneAS+"\t"+oneAS_pos+"\t"+oneAS_dSegment+"\t"+str(oneAS_dSegment_len)+"\t"+str(TSS_zero)+"\t"+		\
-                        str(TSS_all_median)+"\t"+str(AS_TSS_distance)+"\t"+str(TSS1_median)+"\t"+str(TSS2_median)+"\t"+			\
-                        ccs1_arr_str+"\t"+ccs2_arr_str+"\t"+TSS1_arr_str+"\t"+TSS2_arr_str+"\t"+					\
-                        standard_TSS1_str+"\t"+standard_TSS2_str+"\t"+standard_TSS1_str_good+"\t"+standard_TSS2_str_good+"\t"+		\
-                        str(ccs1_num)+"\t"+str(ccs2_num)+"\t"+										\
-                        str(ccs_usage)+"\t"+KS_statistic+"\t"+pvalue
-                with open ("AS2ATI_KS","a",encoding="utf-8") as f2:
-                     f2.write(newline+"\n")
-                     f2.close()
+    with open_output("AS2ATI_KS") as f:
+        for newline_list in gene_pool_imap(ASATI_onegene,task_list,thread):
+            print_progress("          Processing "+str(i+1)+"/"+str(task_num)+":\t"+task_list[i][0])
+            for newline in newline_list:
+                f.write(newline+"\n")
+            i+=1
+    end_progress()
+    record_usage("AS_ATI test",usage_start,task_num)
+    usage_start=get_usage()
     print("          Filter by pvalue<0.05, min_ccsnum and min_dSegmentlen")
     with open ("AS2ATI_KS.pvalue0.05","w",encoding="utf-8") as f2:
         f2.write(head_str+"\n")
         f2.close()
     i=0
-    with open ("AS2ATI_KS","r",encoding="ISO-8859-1") as f:
+    with open ("AS2ATI_KS","r",encoding="ISO-8859-1") as f, open_output("AS2ATI_KS.pvalue0.05") as f2:
         for line in f.readlines():
             i+=1
             if i==1 : continue
@@ -2145,9 +2800,7 @@ if sys.argv[1] =="AS_ATI":
             pvalue		=float(eachline_arr[23])
             if ccs1_num>int(min_ccsnum) and ccs2_num>int(min_ccsnum):
                 if dSegment_length>int(min_dSegmentlen) and KS_statistic>=float(min_KS_statistic) and pvalue<0.05 and ccs_usage>=float(min_ccs_usage):
-                    with open ("AS2ATI_KS.pvalue0.05","a",encoding="utf-8") as f2:
-                        f2.write(eachline+"\n")
-                        f2.close()                       
+                    f2.write(eachline+"\n")
     subprocess.run(["sort -g -k 24 AS2ATI_KS.pvalue0.05 | cut -f 1-11,18-24   > AS2ATI_KS.pvalue0.05.simple"],shell=True)
     with open("AS2ATI_KS.pvalue0.05.simple","r",encoding="ISO-8859-1") as f:
         result_num=len(f.readlines())-1
@@ -2155,81 +2808,219 @@ if sys.argv[1] =="AS_ATI":
     print("     Complete!")
     print("     Possible results number is "+str(result_num))
     print()
-    print("     part_ccs2ref. This section gives the BAM files which can be used as reference for credibility.")
-    print("          All ccs were split into two parts: ASform1 + ASform2")
-    print("          Get ccs(pvalue0.05) list from AS2ATI_KS.pvalue0.05(simple)")
-    print("          Get fasta from transcript1 and 2 in each AS and then minimap2ref")   
-    if "part_ccs2ref" in os.listdir("./"):
-        print("          Note: ./part_ccs2ref/ exist and will be deleted.") 
-        subprocess.run(["rm -r ./part_ccs2ref"],shell=True) 
-    subprocess.run(["mkdir ./part_ccs2ref"],shell=True)
-    i=0
-    with open("AS2ATI_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i==1 : continue
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            ccs1_str=eachline_arr[11]
-            ccs2_str=eachline_arr[12]
-            ccs_list=ccs1_str.split(",")+ccs2_str.split(",")
-            for x in ccs_list:
-                with open("./part_ccs2ref/ccs.list0","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()
-    subprocess.run(["sort -n ./part_ccs2ref/ccs.list0 | uniq > ./part_ccs2ref/1-ccs.pvalue0.05.list"],shell=True)
-    subprocess.run(["rm ./part_ccs2ref/ccs.list0"],shell=True)
-    print("          Extract fasta sequence")
-    subprocess.run(["perl ../output0_preparation/script/getfastabylist.pl  ./part_ccs2ref/1-ccs.pvalue0.05.list ../output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa > ./part_ccs2ref/2-ccs.pvalue0.05.fa"],shell=True)   
-    i=0
-    if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"):
-        subprocess.run(["rm -r ./part_ccs2ref/ccs_pvalue0.05_eachAS/"],shell=True)  
-    subprocess.run(["mkdir ./part_ccs2ref/ccs_pvalue0.05_eachAS"],shell=True)
+    record_usage("AS_ATI filter",usage_start,result_num)
+    usage_start=get_usage()
+    if evidence_bam=="none":
+        print("     part_ccs2ref is skipped (-evidence_bam none).")
+    else:
+        print("     part_ccs2ref. This section gives the BAM files which can be used as reference for credibility.")
+        print("          All ccs were split into two parts: ASform1 + ASform2")
+        print("          Get ccs(pvalue0.05) list from AS2ATI_KS.pvalue0.05(simple)")
+        print("          Get fasta from transcript1 and 2 in each AS and then minimap2ref")   
+        if "part_ccs2ref" in os.listdir("./"):
+            print("          Note: ./part_ccs2ref/ exist and will be deleted.") 
+            subprocess.run(["rm -r ./part_ccs2ref"],shell=True) 
+        subprocess.run(["mkdir ./part_ccs2ref"],shell=True)
+        i=0
+        with open("AS2ATI_KS.pvalue0.05","r",encoding="ISO-8859-1") as f, open_output("./part_ccs2ref/ccs.list0") as f2:
+            for line in f.readlines():
+                i+=1
+                if i==1 : continue
+                eachline=line.strip()
+                eachline_arr=eachline.split("\t")
+                ccs1_str=eachline_arr[11]
+                ccs2_str=eachline_arr[12]
+                ccs_list=ccs1_str.split(",")+ccs2_str.split(",")
+                for x in ccs_list:
+                    f2.write(x+"\n")
+        subprocess.run(["sort -n ./part_ccs2ref/ccs.list0 | uniq > ./part_ccs2ref/1-ccs.pvalue0.05.list"],shell=True)
+        subprocess.run(["rm ./part_ccs2ref/ccs.list0"],shell=True)
+        print("          Extract fasta sequence")
+        open_fasta_index("../output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa")
+        minimap2_ref="../output0_preparation/4-all_FLNC_minimap2ref/ref.mmi"
+        if not os.path.exists(minimap2_ref):minimap2_ref="../output0_preparation/4-all_FLNC_minimap2ref/ref.fa"
+        ccs_pvalue_list=[row[0] for row in read_table("./part_ccs2ref/1-ccs.pvalue0.05.list")[1]]
+        write_fasta_by_list(ccs_pvalue_list,"./part_ccs2ref/2-ccs.pvalue0.05.fa")
+        if evidence_bam=="slice":
+            print("          Extract alignments from minimap.sort.bam")
+            open_bam_by_ccs("../output0_preparation/4-all_FLNC_minimap2ref/minimap.sort.bam",set(ccs_pvalue_list))
+        i=0
+        if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"):
+            subprocess.run(["rm -r ./part_ccs2ref/ccs_pvalue0.05_eachAS/"],shell=True)  
+        subprocess.run(["mkdir ./part_ccs2ref/ccs_pvalue0.05_eachAS"],shell=True)
+        i=0
+        with open("AS2ATI_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
+            file_line_num=len(f.readlines())
+        with open("AS2ATI_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
+            for line in f.readlines():
+                i+=1
+                if i==1 : continue
+                time1=timeit.default_timer()
+                eachline=line.strip()
+                eachline_arr=eachline.split("\t")
+                eventid1	=eachline_arr[2]
+                eventid2	=eachline_arr[2].replace(";","\;")
+                ccs1_str	=eachline_arr[11]
+                ccs2_str	=eachline_arr[12]
+                ccs1_list=ccs1_str.split(",")
+                ccs2_list=ccs2_str.split(",")
+                if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list1"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list1"],shell=True)  
+                if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list2"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list2"],shell=True)  
+                with open_output("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+".list1") as f2:
+                    for x in ccs1_list:
+                        f2.write(x+"\n")
+                with open_output("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+".list2") as f2:
+                    for x in ccs2_list:
+                        f2.write(x+"\n")
+                part_arr=["1","2"]
+                for part in part_arr:
+                    if evidence_bam=="slice":
+                        write_bam_by_ccs(ccs1_list if part=="1" else ccs2_list,"./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+"sort_"+part+".bam",thread)
+                    else:
+                        write_fasta_by_list(ccs1_list if part=="1" else ccs2_list,"./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+"_"+part+".fa")
+                        subprocess.run(["minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no "+minimap2_ref+" ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam 2>/dev/null"],shell=True) 
+                        subprocess.run(["samtools view -bS ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam -@ "+thread],shell=True) 
+                        subprocess.run(["samtools sort ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam -@ "+thread+" -o ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam 1>/dev/null 2>&1"],shell=True) 
+                        subprocess.run(["samtools view -h ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".sam -@ "+thread],shell=True) 
+                        subprocess.run(["samtools index  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam"],shell=True) 
+                        subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam "],shell=True) 
+                        subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".sam "],shell=True)
+                        subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa"],shell=True)
+                    subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list"+part],shell=True)
+                time2=timeit.default_timer()
+                print_progress("          -----Processing "+str(i-1)+"/"+str(file_line_num-1)+': %.0f Seconds'%(time2-time1))
+        end_progress()
+        record_usage("AS_ATI part_ccs2ref",usage_start,file_line_num-1)
+#################################################################################################################################################################
+#################################################################################################################################################################
+#dict[ccs]=[align_chr,strand,align_start,align_end,TSS,PAS,length] of the ccs of FLNC_inform.uniq with TSS_PAS and normal introns.
+def read_TSSPAS_ccs_info(inform_path):
+    dict_ccs_info={}
     i=0
-    with open("AS2ATI_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        file_line_num=len(f.readlines())
-    with open("AS2ATI_KS.pvalue0.05","r",encoding="ISO-8859-1") as f:
+    with open (inform_path,"r",encoding="ISO-8859-1") as f:
         for line in f.readlines():
             i+=1
-            if i==1 : continue
-            time1=timeit.default_timer()
+            if i==1:continue
             eachline=line.strip()
             eachline_arr=eachline.split("\t")
-            eventid1	=eachline_arr[2]
-            eventid2	=eachline_arr[2].replace(";","\;")
-            ccs1_str	=eachline_arr[11]
-            ccs2_str	=eachline_arr[12]
-            ccs1_list=ccs1_str.split(",")
-            ccs2_list=ccs2_str.split(",")
-            if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list1"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list1"],shell=True)  
-            if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list2"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list2"],shell=True)  
-            for x in ccs1_list:
-                with open("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+".list1","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()            
-            for x in ccs2_list:
-                with open("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid1+".list2","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()  
-            part_arr=["1","2"]
-            for part in part_arr:
-                subprocess.run(["perl ../output0_preparation/script/getfastabylist.pl  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list"+part+" ./part_ccs2ref/2-ccs.pvalue0.05.fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa"],shell=True)
-                subprocess.run(["minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no ../output0_preparation/4-all_FLNC_minimap2ref/ref.fa ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam 2>/dev/null"],shell=True) 
-                subprocess.run(["samtools view -bS ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam -@ "+thread],shell=True) 
-                subprocess.run(["samtools sort ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam -@ "+thread+" -o ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam 1>/dev/null 2>&1"],shell=True) 
-                subprocess.run(["samtools view -h ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".sam -@ "+thread],shell=True) 
-                subprocess.run(["samtools index  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".bam"],shell=True) 
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".sam ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".bam "],shell=True) 
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"sort_"+part+".sam "],shell=True)
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+"_"+part+".fa"],shell=True)
-                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+eventid2+".list"+part],shell=True)
-            time2=timeit.default_timer()
-            print("          -----Processing "+str(i-1)+"/"+str(file_line_num-1)+': %.0f Seconds'%(time2-time1),end="\r")
-    print ()
-#################################################################################################################################################################
-#################################################################################################################################################################
+            ccs_name		=eachline_arr[0]     
+            align_chr       	=eachline_arr[1] 
+            strand  		=eachline_arr[2] 
+            align_start     	=eachline_arr[3] 
+            align_end       	=eachline_arr[4] 
+            TSS     		=eachline_arr[5] 
+            PAS     		=eachline_arr[6] 
+            length		=abs(int(PAS)-int(TSS))
+            TSS_PAS_mark	=eachline_arr[7] 
+            intron_mark 	=eachline_arr[8]
+            if TSS_PAS_mark=="TSS_PAS" and intron_mark=="normal":
+                dict_ccs_info[ccs_name]=[align_chr,strand,align_start,align_end,TSS,PAS,length]
+    return dict_ccs_info
+
+#[ccs]+dict_ccs_info[ccs] of the ccs of one gene found in dict_ccs_info, the longest TSS-PAS first.
+def get_TSSPAS_ccs_list(ccs_arr,dict_ccs_info):
+    list_ccs_ccsinfo=[]
+    for oneccs in ccs_arr:
+        if oneccs in dict_ccs_info:
+            oneccs_info		=[oneccs]+dict_ccs_info[oneccs]
+            list_ccs_ccsinfo.append(oneccs_info)
+    list_ccs_ccsinfo.sort(key=lambda x: x[7],reverse=True)
+    return list_ccs_ccsinfo
+
+#Bin the ccs of one gene into subclasses whose starts and ends are within max_bin_extent.
+#Return index_arr (subclass ids in order), dict_subclass[id]=ccs info list and dict_subclass_info[id]=[start1,start2,end1,end2].
+def get_ccs_subclass(list_ccs_ccsinfo,max_bin_extent):
+    k=0;index_arr=[];dict_subclass={};dict_subclass_info={}
+    for oneccs_info_arr in list_ccs_ccsinfo:
+        oneccs_name		=oneccs_info_arr[0]
+        oneccs_start		=int(oneccs_info_arr[3])
+        oneccs_end		=int(oneccs_info_arr[4])
+        oneccs_TSS		=oneccs_info_arr[5]
+        oneccs_PAS		=oneccs_info_arr[6]
+        if dict_subclass=={}:
+            k+=1;index_arr.append(k)
+            dict_subclass[k]		=[oneccs_info_arr]
+            dict_subclass_info[k]		=[int(oneccs_start),int(oneccs_start),int(oneccs_end),int(oneccs_end)]
+        else:
+            split_mark="NO"
+            for oneindex in index_arr:     
+                subclass_info		=dict_subclass_info[oneindex]
+                subclass_info_S1		=subclass_info[0]
+                subclass_info_S2		=subclass_info[1]
+                subclass_info_E1		=subclass_info[2]
+                subclass_info_E2		=subclass_info[3]
+                if (abs(oneccs_start-subclass_info_S1)<int(max_bin_extent) or abs(oneccs_start-subclass_info_S2)<int(max_bin_extent)):
+                    if (abs(oneccs_end-subclass_info_E1)<int(max_bin_extent) or abs(oneccs_end-subclass_info_E2)<int(max_bin_extent)):
+                        if  oneccs_start<subclass_info_E1 and oneccs_end>subclass_info_S2:
+                            if oneccs_start<subclass_info_S1:		dict_subclass_info[oneindex][0]=oneccs_start
+                            if oneccs_start>subclass_info_S2:		dict_subclass_info[oneindex][1]=oneccs_start
+                            if oneccs_end<subclass_info_E1:   		dict_subclass_info[oneindex][2]=oneccs_end
+                            if oneccs_end>subclass_info_E2:		dict_subclass_info[oneindex][3]=oneccs_end
+                            dict_subclass[oneindex].append(oneccs_info_arr)
+                            split_mark="YES";break
+            if split_mark=="NO":
+                k+=1;index_arr.append(k)
+                dict_subclass[k]			=[oneccs_info_arr]
+                dict_subclass_info[k]		=[int(oneccs_start),int(oneccs_start),int(oneccs_end),int(oneccs_end)]
+    return index_arr,dict_subclass,dict_subclass_info
+
+#ATI-APA analysis of one gene, line=one gene line of gene_transcript_num_ccs_num. Return the result lines of ATI2APA_spearman.
+def ATIAPA_onegene(line):
+    newline_list=[]
+    eachline=line.strip()
+    eachline_arr		=eachline.split("\t")   
+    gene_name			=eachline_arr[0]
+    gene_info			=dict_gene_info[gene_name]			
+    gene_pos			=gene_info[0]+":"+gene_info[2]+"-"+gene_info[3]+"("+gene_info[1]+")"
+    gene_ccs_num		=eachline_arr[4]
+    ccs_arr			=eachline_arr[3].split(",")
+    list_ccs_ccsinfo=get_TSSPAS_ccs_list(ccs_arr,dict_ccs_info)
+    TSSPAS_ccs_num 		=len(list_ccs_ccsinfo)
+    index_arr,dict_subclass,dict_subclass_info=get_ccs_subclass(list_ccs_ccsinfo,max_bin_extent)
+    #The strand of the gene is the one of its ccs.
+    if list_ccs_ccsinfo:onegene_strand=list_ccs_ccsinfo[-1][2]
+    for oneindex in index_arr:
+        subclass_info		=dict_subclass_info[oneindex]
+        subclass_info_str	=str(subclass_info[0])+"-"+str(subclass_info[1])+"-"+str(subclass_info[2])+"-"+str(subclass_info[3])
+        subclass_pos	=gene_info[0]+":"+str(subclass_info[0])+"-"+str(subclass_info[3])
+        subclass_content	=dict_subclass[oneindex]
+        ccs_arr=[];TSS_arr=[];PAS_arr=[];TSS_int_arr=[];PAS_int_arr=[]
+        for oneccs_arr in subclass_content:
+            #print(subclass_content)
+            ccs_arr.append(oneccs_arr[0])
+            TSS_arr.append(oneccs_arr[5]);	TSS_int_arr.append(int(oneccs_arr[5]))	
+            PAS_arr.append(oneccs_arr[6]);	PAS_int_arr.append(int(oneccs_arr[6]))	
+        ccs_arr_str=",".join(ccs_arr)
+        TSS_arr_str=",".join(TSS_arr)
+        PAS_arr_str=",".join(PAS_arr)
+        goodccs_num=len(ccs_arr)
+        if goodccs_num > 2:
+            geneccs_usage	=str(goodccs_num/int(gene_ccs_num))
+            TSSPASccs_usage	=str(goodccs_num/int(TSSPAS_ccs_num))
+            if onegene_strand=="+": 	TSS_zero=min(TSS_int_arr);	PAS_zero=max(PAS_int_arr)
+            else:			TSS_zero=max(TSS_int_arr);	PAS_zero=min(PAS_int_arr)
+            dTSS_str_arr=[] 
+            dPAS_str_arr=[]
+            for x in TSS_int_arr:	
+                dTSS_str_arr.append(str(abs(x-TSS_zero)))
+            for x in PAS_int_arr:
+                dPAS_str_arr.append(str(abs(x-PAS_zero)))
+            dTSS_arr_str=",".join(dTSS_str_arr)
+            dPAS_arr_str=",".join(dPAS_str_arr) 
+            if np.var(TSS_int_arr)>0 and np.var(PAS_int_arr)>0 :        
+                spearman_correlation,pvalue=spearmanr(TSS_int_arr,PAS_int_arr)
+                #Start analysis   
+                newline=gene_name+"\t"+gene_pos+"\t"+str(gene_ccs_num)+"\t"+str(TSSPAS_ccs_num)+"\t"+			\
+                    subclass_info_str+"\t"+subclass_pos+"\t"+ccs_arr_str+"\t"+str(goodccs_num)+"\t"+				\
+                    TSS_arr_str+"\t"+PAS_arr_str+"\t"+									\
+                    str(TSS_zero)+"\t"+str(PAS_zero)+"\t"+dTSS_arr_str+"\t"+dPAS_arr_str+"\t"+				\
+                    geneccs_usage+"\t"+TSSPASccs_usage+"\t"+str(spearman_correlation)+"\t"+str(pvalue) 
+                newline_list.append(newline)
+    return newline_list
+
 if sys.argv[1] =="ATI_APA":
     print("Start ATI_APA analysis")
+    usage_start=get_usage()
     print("Analysis in /output4_ATIAPA/")
     if "output4_ATIAPA" in os.listdir("./"):
         print("Note: ./output4_ATIAPA/ exist")
@@ -2252,26 +3043,7 @@ if sys.argv[1] =="ATI_APA":
             dict_gene_info[gene]=[chromosome,strand,start,end]
     #Get dict_ccs_info
     print("     Get dict_ccs_info")
-    dict_ccs_info={}
-    i=0
-    with open ("../output0_preparation/4-all_FLNC_minimap2ref/FLNC_inform.uniq","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i==1:continue
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            ccs_name		=eachline_arr[0]     
-            align_chr       	=eachline_arr[1] 
-            strand  		=eachline_arr[2] 
-            align_start     	=eachline_arr[3] 
-            align_end       	=eachline_arr[4] 
-            TSS     		=eachline_arr[5] 
-            PAS     		=eachline_arr[6] 
-            length		=abs(int(PAS)-int(TSS))
-            TSS_PAS_mark	=eachline_arr[7] 
-            intron_mark 	=eachline_arr[8]
-            if TSS_PAS_mark=="TSS_PAS" and intron_mark=="normal":
-                dict_ccs_info[ccs_name]=[align_chr,strand,align_start,align_end,TSS,PAS,length]
+    dict_ccs_info=read_TSSPAS_ccs_info("../output0_preparation/4-all_FLNC_minimap2ref/FLNC_inform.uniq")
     #Start analysis
     print("     Start spearman analysis")
     head_str="gene\tgene_pos\tgene_reads.num\tTSSPAS_reads.num\t"+			\
@@ -2282,109 +3054,25 @@ if sys.argv[1] =="ATI_APA":
     with open ("ATI2APA_spearman","w",encoding="utf-8") as f:
         f.write(head_str+"\n")
         f.close()
-    with open ("../output0_preparation/5-cDNA_cupcake/gene_transcript_num_ccs_num","r",encoding="ISO-8859-1") as f:
-        gene_num=len(f.readlines())-1
-    dict_gene_ccs={}
-    i=0
     with open("../output0_preparation/5-cDNA_cupcake/gene_transcript_num_ccs_num","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
+        gene_line_list=f.readlines()[1:]
+    gene_num=len(gene_line_list)
+    i=0
+    with open_output("ATI2APA_spearman") as f:
+        for newline_list in gene_pool_imap(ATIAPA_onegene,gene_line_list,thread):
             i+=1
-            if i==1: continue     
-            print("          Processing:\t"+str(i-1)+"/"+str(gene_num),end="\r") 
-            eachline=line.strip()
-            eachline_arr		=eachline.split("\t")   
-            gene_name			=eachline_arr[0]
-            gene_info			=dict_gene_info[gene_name]			
-            gene_pos			=gene_info[0]+":"+gene_info[2]+"-"+gene_info[3]+"("+gene_info[1]+")"
-            gene_ccs_num		=eachline_arr[4]
-            ccs_arr			=eachline_arr[3].split(",")
-            list_ccs_ccsinfo=[]
-            for oneccs in ccs_arr:
-                if oneccs in dict_ccs_info:
-                    oneccs_info		=dict_ccs_info[oneccs]
-                    oneccs_info.insert(0,oneccs)
-                    list_ccs_ccsinfo.append(oneccs_info)
-            list_ccs_ccsinfo.sort(key=lambda x: x[7],reverse=True)
-            TSSPAS_ccs_num 		=len(list_ccs_ccsinfo)
-            k=0;index_arr=[];dict_subclass={};dict_subclass_info={}
-            for oneccs_info_arr in list_ccs_ccsinfo:
-                oneccs_name		=oneccs_info_arr[0]
-                onegene_strand		=oneccs_info_arr[2]
-                oneccs_start		=int(oneccs_info_arr[3])
-                oneccs_end		=int(oneccs_info_arr[4])
-                oneccs_TSS		=oneccs_info_arr[5]
-                oneccs_PAS		=oneccs_info_arr[6]
-                if dict_subclass=={}:
-                    k+=1;index_arr.append(k)
-                    dict_subclass[k]		=[oneccs_info_arr]
-                    dict_subclass_info[k]		=[int(oneccs_start),int(oneccs_start),int(oneccs_end),int(oneccs_end)]
-                else:
-                    split_mark="NO"
-                    for oneindex in index_arr:     
-                        subclass_info		=dict_subclass_info[oneindex]
-                        subclass_info_S1		=subclass_info[0]
-                        subclass_info_S2		=subclass_info[1]
-                        subclass_info_E1		=subclass_info[2]
-                        subclass_info_E2		=subclass_info[3]
-                        if (abs(oneccs_start-subclass_info_S1)<int(max_bin_extent) or abs(oneccs_start-subclass_info_S2)<int(max_bin_extent)):
-                            if (abs(oneccs_end-subclass_info_E1)<int(max_bin_extent) or abs(oneccs_end-subclass_info_E2)<int(max_bin_extent)):
-                                if  oneccs_start<subclass_info_E1 and oneccs_end>subclass_info_S2:
-                                    if oneccs_start<subclass_info_S1:		dict_subclass_info[oneindex][0]=oneccs_start
-                                    if oneccs_start>subclass_info_S2:		dict_subclass_info[oneindex][1]=oneccs_start
-                                    if oneccs_end<subclass_info_E1:   		dict_subclass_info[oneindex][2]=oneccs_end
-                                    if oneccs_end>subclass_info_E2:		dict_subclass_info[oneindex][3]=oneccs_end
-                                    dict_subclass[oneindex].append(oneccs_info_arr)
-                                    split_mark="YES";break
-                    if split_mark=="NO":
-                        k+=1;index_arr.append(k)
-                        dict_subclass[k]			=[oneccs_info_arr]
-                        dict_subclass_info[k]		=[int(oneccs_start),int(oneccs_start),int(oneccs_end),int(oneccs_end)]
-            for oneindex in index_arr:
-                subclass_info		=dict_subclass_info[oneindex]
-                subclass_info_str	=str(subclass_info[0])+"-"+str(subclass_info[1])+"-"+str(subclass_info[2])+"-"+str(subclass_info[3])
-                subclass_pos	=gene_info[0]+":"+str(subclass_info[0])+"-"+str(subclass_info[3])
-                subclass_content	=dict_subclass[oneindex]
-                ccs_arr=[];TSS_arr=[];PAS_arr=[];TSS_int_arr=[];PAS_int_arr=[]
-                for oneccs_arr in subclass_content:
-                    #print(subclass_content)
-                    ccs_arr.append(oneccs_arr[0])
-                    TSS_arr.append(oneccs_arr[5]);	TSS_int_arr.append(int(oneccs_arr[5]))	
-                    PAS_arr.append(oneccs_arr[6]);	PAS_int_arr.append(int(oneccs_arr[6]))	
-                ccs_arr_str=",".join(ccs_arr)
-                TSS_arr_str=",".join(TSS_arr)
-                PAS_arr_str=",".join(PAS_arr)
-                goodccs_num=len(ccs_arr)
-                if goodccs_num > 2:
-                    geneccs_usage	=str(goodccs_num/int(gene_ccs_num))
-                    TSSPASccs_usage	=str(goodccs_num/int(TSSPAS_ccs_num))
-                    if onegene_strand=="+": 	TSS_zero=min(TSS_int_arr);	PAS_zero=max(PAS_int_arr)
-                    else:			TSS_zero=max(TSS_int_arr);	PAS_zero=min(PAS_int_arr)
-                    dTSS_str_arr=[] 
-                    dPAS_str_arr=[]
-                    for x in TSS_int_arr:	
-                        dTSS_str_arr.append(str(abs(x-TSS_zero)))
-                    for x in PAS_int_arr:
-                        dPAS_str_arr.append(str(abs(x-PAS_zero)))
-                    dTSS_arr_str=",".join(dTSS_str_arr)
-                    dPAS_arr_str=",".join(dPAS_str_arr) 
-                    if np.var(TSS_int_arr)>0 and np.var(PAS_int_arr)>0 :        
-                        spearman_correlation,pvalue=spearmanr(TSS_int_arr,PAS_int_arr)
-                        #Start analysis   
-                        with open("ATI2APA_spearman","a",encoding="utf-8") as f2:
-                            newline=gene_name+"\t"+gene_pos+"\t"+str(gene_ccs_num)+"\t"+str(TSSPAS_ccs_num)+"\t"+			\
-                                subclass_info_str+"\t"+subclass_pos+"\t"+ccs_arr_str+"\t"+str(goodccs_num)+"\t"+				\
-                                TSS_arr_str+"\t"+PAS_arr_str+"\t"+									\
-                                str(TSS_zero)+"\t"+str(PAS_zero)+"\t"+dTSS_arr_str+"\t"+dPAS_arr_str+"\t"+				\
-                                geneccs_usage+"\t"+TSSPASccs_usage+"\t"+str(spearman_correlation)+"\t"+str(pvalue) 
-                            f2.write(newline+"\n")
-                            f2.close()                                           
-    print()
+            print_progress("          Processing:\t"+str(i)+"/"+str(gene_num))
+            for newline in newline_list:
+                f.write(newline+"\n")
+    end_progress()
+    record_usage("ATI_APA test",usage_start,gene_num)
+    usage_start=get_usage()
     print("          Filter by pvalue<0.05, min_ccsnum and min_correlation")
     with open ("ATI2APA_spearman.pvalue0.05","w",encoding="utf-8") as f2:
         f2.write(head_str+"\n")
         f2.close()
     i=0
-    with open ("ATI2APA_spearman","r",encoding="ISO-8859-1") as f:
+    with open ("ATI2APA_spearman","r",encoding="ISO-8859-1") as f, open_output("ATI2APA_spearman.pvalue0.05") as f2:
         for line in f.readlines():
             i+=1
             if i==1 : continue
@@ -2396,9 +3084,7 @@ if sys.argv[1] =="ATI_APA":
             spearman_correlation=float(eachline_arr[16])
             pvalue		=float(eachline_arr[17])
             if ccs_num>int(min_ccsnum) and abs(spearman_correlation)>float(min_correlation) and pvalue<0.05 and geneccs_usage>=float(min_geneccs_usage) and TSSPASccs_usage>=float(min_TSSPASccs_usage):
-                with open ("ATI2APA_spearman.pvalue0.05","a",encoding="utf-8") as f2:
-                    f2.write(eachline+"\n")
-                    f2.close()         
+                f2.write(eachline+"\n")
                  
     subprocess.run(["sort -g -k 18 ATI2APA_spearman.pvalue0.05 | cut -f 1-6,8,11-12,15-18   > ATI2APA_spearman.pvalue0.05.simple"],shell=True)
     with open("ATI2APA_spearman.pvalue0.05.simple","r",encoding="ISO-8859-1") as f:
@@ -2407,72 +3093,394 @@ if sys.argv[1] =="ATI_APA":
     print("     Complete!")
     print("     Possible results number is "+str(result_num))
     print()
-    print("     part_ccs2ref. This section gives the BAM files which can be used as reference for credibility.")
-    print("          Get ccs(pvalue0.05) list from ATI2APA_spearman.pvalue0.05(simple)")
-    print("          Get ccs.fasta in each gene and then minimap2ref")  
-
-    if "part_ccs2ref" in os.listdir("./"):
-        print("          Note: ./part_ccs2ref/ exist and will be deleted.") 
-        subprocess.run(["rm -r ./part_ccs2ref"],shell=True) 
-    subprocess.run(["mkdir ./part_ccs2ref"],shell=True)
-    i=0
-    with open("ATI2APA_spearman.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i==1 : continue
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            ccs_str=eachline_arr[6]
-            ccs_list=ccs_str.split(",")
-            for x in ccs_list:
-                with open("./part_ccs2ref/ccs.list0","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()
-    subprocess.run(["sort -n ./part_ccs2ref/ccs.list0 | uniq > ./part_ccs2ref/1-ccs.pvalue0.05.list"],shell=True)
-    subprocess.run(["rm ./part_ccs2ref/ccs.list0"],shell=True)
-    print("          Extract fasta sequence")
-    subprocess.run(["perl ../output0_preparation/script/getfastabylist.pl  ./part_ccs2ref/1-ccs.pvalue0.05.list ../output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa > ./part_ccs2ref/2-ccs.pvalue0.05.fa"],shell=True)   
-    i=0
-    if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"):
-        subprocess.run(["rm -r ./part_ccs2ref/ccs_pvalue0.05_eachAS/"],shell=True)  
-    subprocess.run(["mkdir ./part_ccs2ref/ccs_pvalue0.05_eachAS"],shell=True)
-    i=0
-    with open("ATI2APA_spearman.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        file_line_num=len(f.readlines())
-    with open("ATI2APA_spearman.pvalue0.05","r",encoding="ISO-8859-1") as f:
-        for line in f.readlines():
-            i+=1
-            if i==1 : continue
-            time1=timeit.default_timer()
-            eachline=line.strip()
-            eachline_arr=eachline.split("\t")
-            geneid	=eachline_arr[0]+"_"+eachline_arr[4]
-            ccs_str	=eachline_arr[6]
-            ccs_list=ccs_str.split(",")
-            if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list"],shell=True)             
-            for x in ccs_list:
-                with open("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list","a",encoding="utf-8") as f2:
-                    f2.write(x+"\n")   
-                    f2.close()            
-            subprocess.run(["perl ../output0_preparation/script/getfastabylist.pl  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list ./part_ccs2ref/2-ccs.pvalue0.05.fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".fa"],shell=True)
-            subprocess.run(["minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no ../output0_preparation/4-all_FLNC_minimap2ref/ref.fa ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".sam 2>/dev/null"],shell=True) 
-            subprocess.run(["samtools view -bS ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".sam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".bam -@ "+thread],shell=True) 
-            subprocess.run(["samtools sort ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".bam -@ "+thread+" -o ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.bam 1>/dev/null 2>&1"],shell=True) 
-            subprocess.run(["samtools view -h ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.bam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.sam -@ "+thread],shell=True) 
-            subprocess.run(["samtools index  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.bam"],shell=True) 
-            subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".sam ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".bam "],shell=True) 
-            subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.sam "],shell=True)
-            subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".fa"],shell=True)
-            subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list"],shell=True)
-            time2=timeit.default_timer()
-            print("          -----Processing "+str(i-1)+"/"+str(file_line_num-1)+': %.0f Seconds'%(time2-time1),end="\r")
-    print ()
+    record_usage("ATI_APA filter",usage_start,result_num)
+    usage_start=get_usage()
+    if evidence_bam=="none":
+        print("     part_ccs2ref is skipped (-evidence_bam none).")
+    else:
+        print("     part_ccs2ref. This section gives the BAM files which can be used as reference for credibility.")
+        print("          Get ccs(pvalue0.05) list from ATI2APA_spearman.pvalue0.05(simple)")
+        print("          Get ccs.fasta in each gene and then minimap2ref")  
+
+        if "part_ccs2ref" in os.listdir("./"):
+            print("          Note: ./part_ccs2ref/ exist and will be deleted.") 
+            subprocess.run(["rm -r ./part_ccs2ref"],shell=True) 
+        subprocess.run(["mkdir ./part_ccs2ref"],shell=True)
+        i=0
+        with open("ATI2APA_spearman.pvalue0.05","r",encoding="ISO-8859-1") as f, open_output("./part_ccs2ref/ccs.list0") as f2:
+            for line in f.readlines():
+                i+=1
+                if i==1 : continue
+                eachline=line.strip()
+                eachline_arr=eachline.split("\t")
+                ccs_str=eachline_arr[6]
+                ccs_list=ccs_str.split(",")
+                for x in ccs_list:
+                    f2.write(x+"\n")
+        subprocess.run(["sort -n ./part_ccs2ref/ccs.list0 | uniq > ./part_ccs2ref/1-ccs.pvalue0.05.list"],shell=True)
+        subprocess.run(["rm ./part_ccs2ref/ccs.list0"],shell=True)
+        print("          Extract fasta sequence")
+        open_fasta_index("../output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa")
+        minimap2_ref="../output0_preparation/4-all_FLNC_minimap2ref/ref.mmi"
+        if not os.path.exists(minimap2_ref):minimap2_ref="../output0_preparation/4-all_FLNC_minimap2ref/ref.fa"
+        ccs_pvalue_list=[row[0] for row in read_table("./part_ccs2ref/1-ccs.pvalue0.05.list")[1]]
+        write_fasta_by_list(ccs_pvalue_list,"./part_ccs2ref/2-ccs.pvalue0.05.fa")
+        if evidence_bam=="slice":
+            print("          Extract alignments from minimap.sort.bam")
+            open_bam_by_ccs("../output0_preparation/4-all_FLNC_minimap2ref/minimap.sort.bam",set(ccs_pvalue_list))
+        i=0
+        if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"):
+            subprocess.run(["rm -r ./part_ccs2ref/ccs_pvalue0.05_eachAS/"],shell=True)  
+        subprocess.run(["mkdir ./part_ccs2ref/ccs_pvalue0.05_eachAS"],shell=True)
+        i=0
+        with open("ATI2APA_spearman.pvalue0.05","r",encoding="ISO-8859-1") as f:
+            file_line_num=len(f.readlines())
+        with open("ATI2APA_spearman.pvalue0.05","r",encoding="ISO-8859-1") as f:
+            for line in f.readlines():
+                i+=1
+                if i==1 : continue
+                time1=timeit.default_timer()
+                eachline=line.strip()
+                eachline_arr=eachline.split("\t")
+                geneid	=eachline_arr[0]+"_"+eachline_arr[4]
+                ccs_str	=eachline_arr[6]
+                ccs_list=ccs_str.split(",")
+                if os.path.exists("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list"):subprocess.run(["rm  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list"],shell=True)             
+                with open_output("./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list") as f2:
+                    for x in ccs_list:
+                        f2.write(x+"\n")
+                if evidence_bam=="slice":
+                    write_bam_by_ccs(ccs_list,"./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.bam",thread)
+                else:
+                    write_fasta_by_list(ccs_list,"./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".fa")
+                    subprocess.run(["minimap2 -ax splice -uf -k 14 -t "+thread+" --secondary=no "+minimap2_ref+" ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".fa > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".sam 2>/dev/null"],shell=True) 
+                    subprocess.run(["samtools view -bS ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".sam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".bam -@ "+thread],shell=True) 
+                    subprocess.run(["samtools sort ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".bam -@ "+thread+" -o ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.bam 1>/dev/null 2>&1"],shell=True) 
+                    subprocess.run(["samtools view -h ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.bam > ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.sam -@ "+thread],shell=True) 
+                    subprocess.run(["samtools index  ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.bam"],shell=True) 
+                    subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".sam ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".bam "],shell=True) 
+                    subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+"sort.sam "],shell=True)
+                    subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".fa"],shell=True)
+                subprocess.run(["rm ./part_ccs2ref/ccs_pvalue0.05_eachAS/"+geneid+".list"],shell=True)
+                time2=timeit.default_timer()
+                print_progress("          -----Processing "+str(i-1)+"/"+str(file_line_num-1)+': %.0f Seconds'%(time2-time1))
+        end_progress()
+        record_usage("ATI_APA part_ccs2ref",usage_start,file_line_num-1)
+
+#################################################################################################################################################################
+#################################################################################################################################################################
+#Start simulation.
+#Write a synthetic output0_preparation with the files read by the four functions: ASgene_ccsnum, ccs_name, ASccs_store and AS_catalog of 7-ccs_inform,
+#gene_info and gene_transcript_num_ccs_num of 5-cDNA_cupcake, FLNC_inform.uniq and all_FLNC_nopolyA.fa.
+#Each gene has event_num AS events (SE,A3,A5,RI,MX in turn) and read_num ccs, every third gene also has overlapping RI and A3/A5 events
+#for the RI pairs of AS_AS. A ccs follows one form of the gene in 80% of the events and skips 10% of the events.
+def write_simulated_preparation(prep_dir,gene_num,event_num,read_num,seed):
+    rng=random.Random(seed)
+    for onedir in ("3-all_FLNC","4-all_FLNC_minimap2ref","5-cDNA_cupcake","7-ccs_inform"):
+        os.makedirs(os.path.join(prep_dir,onedir),exist_ok=True)
+    dict_gene_lines={}
+    ccs_index=0
+    with open_output(os.path.join(prep_dir,"4-all_FLNC_minimap2ref/FLNC_inform.uniq"),"w") as f_inform, \
+        open_output(os.path.join(prep_dir,"5-cDNA_cupcake/gene_info"),"w") as f_gene_info, \
+        open_output(os.path.join(prep_dir,"5-cDNA_cupcake/gene_transcript_num_ccs_num"),"w") as f_gene_ccs, \
+        open_output(os.path.join(prep_dir,"3-all_FLNC/all_FLNC_nopolyA.fa"),"w") as f_fa:
+        f_inform.write("ccs_name\talign_chr\tstrand\talign_start\talign_end\tTSS\tPAS\tTSS_PAS_mark\tintron_mark\n")
+        f_gene_ccs.write("gene_name\ttranscript_arr\ttranscript_num\tccs_arr\tccs_num\n")
+        for gene_index in range(gene_num):
+            gene		="PB."+str(gene_index+1)
+            chromosome		="chr"+str(gene_index%3+1)
+            strand		="+" if gene_index%2==0 else "-"
+            gene_start		=10000*(gene_index+1)
+            pos=gene_start+500
+            event_list=[]
+            for event_index in range(event_num):
+                event_type=["SE","A3","A5","RI","MX"][event_index%5]
+                a,b,c,d=pos,pos+100,pos+200,pos+300
+                if event_type=="SE":	event_pos="%d-%d:%d-%d"%(a,b,c,d)
+                elif event_type=="A3":	event_pos="%d-%d:%d-%d"%(a,b,a,c)
+                elif event_type=="A5":	event_pos="%d-%d:%d-%d"%(c,d,b,d)
+                elif event_type=="RI":	event_pos="%d:%d-%d:%d"%(a,b,c,d)
+                else:
+                    event_pos="%d-%d:%d-%d:%d-%d:%d-%d"%(a,b,c,d+200,a,d,d+100,d+200)
+                    pos+=200
+                event_list.append(gene+";"+event_type+":"+chromosome+":"+event_pos+":"+strand)
+                pos+=400
+            if gene_index%3==0:
+                a,b,c,d,e,f=pos,pos+100,pos+200,pos+300,pos+400,pos+500
+                event_list.append(gene+";RI:%s:%d:%d-%d:%d:%s"%(chromosome,a,b,c,d,strand))
+                event_list.append(gene+";RI:%s:%d:%d-%d:%d:%s"%(chromosome,a,b,c,d+50,strand))
+                event_list.append(gene+";RI:%s:%d:%d-%d:%d:%s"%(chromosome,c,d,e,f,strand))
+                event_list.append(gene+";RI:%s:%d:%d-%d:%d:%s"%(chromosome,c-50,d,e,f,strand))
+                if strand=="+":
+                    event_list.append(gene+";A3:%s:%d-%d:%d-%d:%s"%(chromosome,a-300,a-100,a-300,a,strand))
+                    event_list.append(gene+";A5:%s:%d-%d:%d-%d:%s"%(chromosome,d+50,d+100,d,d+100,strand))
+                else:
+                    event_list.append(gene+";A3:%s:%d-%d:%d-%d:%s"%(chromosome,d,d+100,d+50,d+100,strand))
+                    event_list.append(gene+";A5:%s:%d-%d:%d-%d:%s"%(chromosome,a-300,a-100,a-300,a,strand))
+                pos+=800
+            gene_end=pos+500
+            f_gene_info.write(gene+"\t"+chromosome+"\t"+strand+"\t"+str(gene_start)+"\t"+str(gene_end)+"\n")
+            dict_part_lines={"1":[],"2":[]}
+            ccs_list=[]
+            for ccs_num in range(read_num):
+                ccs_index+=1
+                ccs_name="m64012_200101_000000/"+str(ccs_index)+"/ccs"
+                ccs_list.append(ccs_name)
+                align_start=gene_start+rng.randint(0,400)
+                align_end=gene_end-rng.randint(0,400)
+                if rng.random()<0.3:
+                    align_start+=rng.randint(0,3000)
+                TSS,PAS=(align_start,align_end) if strand=="+" else (align_end,align_start)
+                TSS_PAS_mark=rng.choice(["TSS_PAS","TSS_PAS","TSS_PAS","noTSS_PAS","TSS_noPAS"])
+                inform_list=[chromosome,strand,str(align_start),str(align_end),str(TSS),str(PAS),TSS_PAS_mark]
+                f_inform.write(ccs_name+"\t"+"\t".join(inform_list)+"\tnormal\n")
+                f_fa.write(">"+ccs_name+"\n"+"".join(rng.choice("ACGT") for x in range(60))+"\n")
+                gene_form1=rng.random()<0.5
+                for oneevent in event_list:
+                    if rng.random()<0.1:continue
+                    form1=gene_form1 if rng.random()<0.8 else not gene_form1
+                    dict_part_lines["1" if form1 else "2"].append(oneevent+"\t"+ccs_name+"\t"+"\t".join(inform_list))
+            #Sorted by AS_name then ccs_name like 3-AS_ccs_info.transcript1(2).
+            dict_gene_lines[gene]={part:sorted(line_list) for part,line_list in dict_part_lines.items() if line_list}
+            f_gene_ccs.write(gene+"\t"+gene+".1,"+gene+".2\t2\t"+",".join(ccs_list)+"\t"+str(read_num)+"\n")
+    with open_output(os.path.join(prep_dir,"7-ccs_inform/ASgene_ccsnum"),"w") as f:
+        for gene in sorted(dict_gene_lines):
+            f.write(gene+"\t"+str(read_num)+"\n")
+    dict_ccs_id=write_ccs_name(["m64012_200101_000000/"+str(x+1)+"/ccs" for x in range(ccs_index)],os.path.join(prep_dir,"7-ccs_inform/ccs_name"))
+    write_ASccs_store(dict_gene_lines,os.path.join(prep_dir,"7-ccs_inform/ASccs_store"),dict_ccs_id)
+    write_AS_catalog([line.split("\t")[0] for gene in dict_gene_lines for part in ("1","2") for line in dict_gene_lines[gene].get(part,[])],os.path.join(prep_dir,"7-ccs_inform/AS_catalog"))
+    write_fasta_index(os.path.join(prep_dir,"3-all_FLNC/all_FLNC_nopolyA.fa"))
+    return ccs_index
+
+if sys.argv[1] =="simulate":
+    print("Start simulation")
+    usage_start=get_usage()
+    ccs_num=write_simulated_preparation("./output0_preparation",int(gene_num),int(event_num),int(read_num),int(seed))
+    record_usage("simulate",usage_start,ccs_num)
+    print("     "+gene_num+" genes, "+str(ccs_num)+" ccs written to ./output0_preparation")
+
+#bench: simulate in ./output_bench, run the four functions there with -evidence_bam none and collect the steps of their run_report.json
+#into ./output_bench/bench_report.json. The start-up of asapa.py -h and of each function until its imports finish is timed first.
+#The hot loops of the functions (AS pairs, 2x2 tables and their tests of AS_AS, KS of AS_ATI and AS_APA,
+#subclass binning of ATI_APA) are then timed one by one in the bench process on the same data, as the "kernel" steps.
+#Steps more than 20% slower than the last bench_report.json of the same scale are marked.
+#No bench_report.json is shipped with asapa.py since the timings depend on the machine, the first bench in a path is the reference of the next ones.
+#The subclass binning kernel uses the default -max_bin_extent of ATI_APA.
+bench_max_bin_extent="1000"
+def print_bench_step(onestep,dict_last_wall):
+    mark=""
+    if onestep["step"] in dict_last_wall and onestep["wall_seconds"]>1.2*dict_last_wall[onestep["step"]]+0.05:
+        mark="\tslower than last bench: %.3f Seconds"%dict_last_wall[onestep["step"]]
+    record_str="" if onestep["record_num"] is None else ", %s records"%onestep["record_num"]
+    print("          "+onestep["step"]+": %.3f Seconds"%onestep["wall_seconds"]+record_str+mark)
+
+if sys.argv[1] =="bench":
+    print("Start benchmark")
+    subprocess.run(["mkdir -p ./output_bench"],shell=True)
+    os.chdir("./output_bench")
+    bench_scale={"gene_num":int(gene_num),"event_num":int(event_num),"read_num":int(read_num),"seed":int(seed),"thread":int(thread)}
+    dict_last_wall={}
+    if os.path.exists("bench_report.json"):
+        with open ("bench_report.json","r",encoding="utf-8") as f:
+            last_report=json.load(f)
+        if last_report["scale"]==bench_scale:
+            dict_last_wall={onestep["step"]:onestep["wall_seconds"] for onestep in last_report["steps"]}
+    if dict_last_wall=={}:
+        print("     No bench_report.json of the same scale in ./output_bench, this run will be the reference of the next bench")
+    bench_step_list=[]
+    #Start-up, each command is run once before it is timed so the files are in the page cache.
+    print("     startup")
+    for command_list,startup_env in ((["-h"],os.environ),)+tuple(([x],dict(os.environ,ASAPA_IMPORT_ONLY="yes")) for x in ("AS_AS","AS_ATI","AS_APA","ATI_APA")):
+        for x in range(2):
+            usage_start=get_usage()
+            subprocess.run([sys.executable,os.path.abspath(__file__)]+command_list,env=startup_env,stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        record_usage("startup "+command_list[0],usage_start)
+    for onestep in list_run_usage:
+        bench_step_list.append(onestep)
+        print_bench_step(onestep,dict_last_wall)
+    print("     simulate")
+    subprocess.run([sys.executable,os.path.abspath(__file__),"simulate","-gene_num",gene_num,"-event_num",event_num,"-read_num",read_num,"-seed",seed],stdout=subprocess.DEVNULL)
+    for one_function,function_outdir in (("AS_AS","output1_ASAS"),("AS_ATI","output2_ASATI"),("AS_APA","output3_ASAPA"),("ATI_APA","output4_ATIAPA")):
+        print("     "+one_function)
+        subprocess.run(["rm -rf ./"+function_outdir],shell=True)
+        result=subprocess.run([sys.executable,os.path.abspath(__file__),one_function,"-n",thread,"-evidence_bam","none"],stdout=subprocess.DEVNULL,stderr=subprocess.DEVNULL)
+        if result.returncode!=0 or not os.path.exists("./"+function_outdir+"/run_report.json"):
+            print("ERROR, "+one_function+" failed in ./output_bench");exit()
+        with open ("./"+function_outdir+"/run_report.json","r",encoding="utf-8") as f:
+            function_report=json.load(f)
+        for onestep in function_report["steps"]:
+            bench_step_list.append(onestep)
+            print_bench_step(onestep,dict_last_wall)
+    #Kernels, in one process. The inputs of a kernel are prepared before its timing starts.
+    print("     kernels")
+    step_start=len(list_run_usage)
+    open_ccs_name("./output0_preparation/7-ccs_inform/ccs_name")
+    open_ASccs_store("./output0_preparation/7-ccs_inform/ASccs_store")
+    open_AS_catalog("./output0_preparation/7-ccs_inform/AS_catalog")
+    with open ("./output0_preparation/7-ccs_inform/ASgene_ccsnum","r",encoding="ISO-8859-1") as f:
+        task_list=[(col[0],col[1]) for col in csv.reader(f,delimiter='\t') if (col[0],"1") in dict_ASccs_index and (col[0],"2") in dict_ASccs_index]
+    list_gene_ASinfo=[]
+    for one_gene,_ in task_list:
+        dict_ASinfo=read_AS_catalog(one_gene)
+        list_gene_ASinfo.append((sorted(set(x[0] for x in read_ASccs_lines(one_gene,"1"))),dict_ASinfo))
+    usage_start=get_usage()
+    group_num=0
+    for gene_AS_list,dict_ASinfo in list_gene_ASinfo:
+        group_num+=sum(len(x) for x in get_AS_candidates(gene_AS_list,dict_ASinfo))
+    record_usage("kernel AS_AS pairs (get_AS_candidates)",usage_start,group_num)
+    list_gene_group=[]
+    for one_gene,_ in task_list:
+        gene_AS_list,ccs_arr,AS_form,ccs_mapstart,ccs_mapend=get_AS_form(one_gene)
+        if len(gene_AS_list)<=1:continue
+        dict_ASinfo=read_AS_catalog(one_gene)
+        AS_index={oneAS:x for x,oneAS in enumerate(gene_AS_list)}
+        AS_start_arr=np.array([dict_ASinfo[oneAS][5] for oneAS in gene_AS_list],dtype=np.int64)
+        AS_end_arr=np.array([dict_ASinfo[oneAS][6] for oneAS in gene_AS_list],dtype=np.int64)
+        for group_list,group_type,group_size in zip(read_AS_candidates(one_gene,gene_AS_list),("pair","RI1234","RI123"),(2,4,3)):
+            group_arr=np.array([[AS_index[x] for x in onegroup.split("_||_")] for onegroup in group_list],dtype=np.int64).reshape(-1,group_size)
+            list_gene_group.append((AS_form,ccs_mapstart,ccs_mapend,AS_start_arr,AS_end_arr,group_arr,group_type))
+    #iter_ASgroup_cell also tests the tables of each chunk with batch_fisherchi2, which is timed alone in the next step.
+    usage_start=get_usage()
+    list_table=[]
+    for onegroup in list_gene_group:
+        cell_num_list=[cell_num for cell_num,cell_mask,fisherchi2 in iter_ASgroup_cell(*onegroup)]
+        if cell_num_list:list_table.append(np.array(cell_num_list,dtype=np.int64))
+    record_usage("kernel AS_AS 2x2 tables (iter_ASgroup_cell)",usage_start,sum(len(x) for x in list_table))
+    usage_start=get_usage()
+    for table_arr in list_table:
+        batch_fisherchi2(table_arr)
+    record_usage("kernel AS_AS Fisher and chi-square (batch_fisherchi2)",usage_start,sum(len(x) for x in list_table))
+    list_gene_group=list_table=list_gene_ASinfo=[]
+    for step,onegene_func in (("kernel AS_APA KS (ASAPA_onegene)",ASAPA_onegene),("kernel AS_ATI KS (ASATI_onegene)",ASATI_onegene)):
+        usage_start=get_usage()
+        result_num=0
+        for onetask in task_list:
+            result_num+=len(onegene_func(onetask))
+        record_usage(step,usage_start,result_num)
+    dict_ccs_info=read_TSSPAS_ccs_info("./output0_preparation/4-all_FLNC_minimap2ref/FLNC_inform.uniq")
+    with open("./output0_preparation/5-cDNA_cupcake/gene_transcript_num_ccs_num","r",encoding="ISO-8859-1") as f:
+        list_gene_ccsinfo=[get_TSSPAS_ccs_list(line.rstrip("\n").split("\t")[3].split(","),dict_ccs_info) for line in f.readlines()[1:]]
+    usage_start=get_usage()
+    subclass_num=0
+    for list_ccs_ccsinfo in list_gene_ccsinfo:
+        subclass_num+=len(get_ccs_subclass(list_ccs_ccsinfo,bench_max_bin_extent)[0])
+    record_usage("kernel ATI_APA subclass binning (get_ccs_subclass)",usage_start,subclass_num)
+    for onestep in list_run_usage[step_start:]:
+        bench_step_list.append(onestep)
+        print_bench_step(onestep,dict_last_wall)
+    with open ("bench_report.json","w",encoding="utf-8") as f:
+        json.dump({"scale":bench_scale,"steps":bench_step_list},f,indent=1)
+    os.chdir(base_path)
+    print("     ./output_bench/bench_report.json")
+
+#################################################################################################################################################################
+#################################################################################################################################################################
+#Start end-to-end run.
+#e2e runs build and the four functions on a small synthetic genome in ./output_e2e/run, with stand-ins of the external tools placed first on PATH.
+#The stand-ins are deterministic and quick, so the timings are those of the Python steps of asapa.py.
+#The stand-ins are written by write_e2e_fake_tools of asapa_e2e_tools.py, next to asapa.py.
+
+#Genes are 10 kb apart on chr1 with exons E1,E2,E3,E4,E5 at 0-200,500-600,900-1000,1300-1400,1700-2000, E2 and E4 are skipped in some reads.
+#E4 follows E2 in 80% of the reads of the even genes, so AS_AS finds coupled events. TSS and PAS move by up to 60 bp,
+#30% of the reads start 100 bp downstream (ATI) and 10% have a 20 bp soft clip at the TSS side.
+def write_e2e_inputs(run_dir,gene_num,read_num,sample_num,seed):
+    rng=random.Random(seed)
+    genome_seq="".join(rng.choice("ACGT") for x in range(10000*(gene_num+1)))
+    with open_output(os.path.join(run_dir,"ref.fa"),"w") as f:
+        f.write(">chr1\n"+"".join([genome_seq[x:x+60]+"\n" for x in range(0,len(genome_seq),60)]))
+    os.makedirs(os.path.join(run_dir,"sub"),exist_ok=True)
+    for sample_index in range(sample_num):
+        zmw=0
+        with open_output(os.path.join(run_dir,"sub","sample"+str(sample_index+1)+".bam"),"w") as f:
+            for gene_index in range(gene_num):
+                gene_start=10000*(gene_index+1)
+                strand="+" if gene_index%2==0 else "-"
+                for read_index in range(read_num):
+                    zmw+=1
+                    E2_in=rng.random()<0.6
+                    E4_in=E2_in if gene_index%2==0 and rng.random()<0.8 else rng.random()<0.5
+                    exon_list=[[0,200]]+([[500,600]] if E2_in else [])+[[900,1000]]+([[1300,1400]] if E4_in else [])+[[1700,2000]]
+                    exon_list=[[gene_start+start,gene_start+end] for start,end in exon_list]
+                    TSS_shift=rng.randint(0,60)+(100 if rng.random()<0.3 else 0)
+                    PAS_shift=rng.randint(0,60)
+                    if strand=="+":	exon_list[0][0]+=TSS_shift;exon_list[-1][1]-=PAS_shift
+                    else:		exon_list[0][0]+=PAS_shift;exon_list[-1][1]-=TSS_shift
+                    cigar_list=[]
+                    for x in range(len(exon_list)):
+                        if x>0:cigar_list.append(str(exon_list[x][0]-exon_list[x-1][1])+"N")
+                        cigar_list.append(str(exon_list[x][1]-exon_list[x][0])+"M")
+                    seq="".join(genome_seq[start:end] for start,end in exon_list)
+                    if rng.random()<0.1:
+                        if strand=="+":	cigar_list.insert(0,"20S")
+                        else:		cigar_list.append("20S")
+                        seq=seq+"".join(rng.choice("ACGT") for x in range(20))
+                    ccs_name="m64000_"+str(sample_index+1)+"/"+str(zmw)+"/ccs"
+                    f.write(">"+ccs_name+" chr1:"+str(exon_list[0][0]+1)+":"+"".join(cigar_list)+":"+strand+"\n"+seq+"\n")
+
+#Files whose sha1 is compared with the baseline.
+e2e_checksum_list=["output0_preparation/3-all_FLNC/all_FLNC_nopolyA.fa","output0_preparation/4-all_FLNC_minimap2ref/FLNC_inform.uniq",
+    "output0_preparation/5-cDNA_cupcake/gene_transcript_num_ccs_num","output0_preparation/6-suppa/AS_All.ioe.simple",
+    "output0_preparation/7-ccs_inform/ASgene_ccsnum","output0_preparation/7-ccs_inform/ASccs_store",
+    "output1_ASAS/AS2AS_fisherchi2","output1_ASAS/AS2AS_fisherchi2.pvalue0.05","output2_ASATI/AS2ATI_KS","output2_ASATI/AS2ATI_KS.pvalue0.05",
+    "output3_ASAPA/AS2APA_KS","output3_ASAPA/AS2APA_KS.pvalue0.05","output4_ATIAPA/ATI2APA_spearman","output4_ATIAPA/ATI2APA_spearman.pvalue0.05"]
+
+#e2e: the steps of every run_report.json and the sha1 of e2e_checksum_list are written to ./output_e2e/e2e_report.json and
+#compared with ./output_e2e/e2e_baseline.json of the same scale. The first run, or -update yes, stores the baseline.
+if sys.argv[1] =="e2e":
+    print("Start end-to-end run")
+    e2e_scale={"gene_num":int(gene_num),"read_num":int(read_num),"sample_num":int(sample_num),"seed":int(seed),"thread":int(thread)}
+    run_dir=os.path.join(base_path,"output_e2e","run")
+    subprocess.run(["rm -rf "+run_dir],shell=True)
+    os.makedirs(run_dir)
+    write_e2e_fake_tools(os.path.join(run_dir,"fakebin"))
+    write_e2e_inputs(run_dir,int(gene_num),int(read_num),int(sample_num),int(seed))
+    e2e_env=dict(os.environ,PATH=os.path.join(run_dir,"fakebin")+os.pathsep+os.environ.get("PATH",""),ASAPA_CACHE=os.path.join(run_dir,"cache"))
+    e2e_step_list=[]
+    for command_list,command_outdir in ((["build","ref.fa","sub"],"output0_preparation"),(["AS_AS"],"output1_ASAS"),(["AS_ATI"],"output2_ASATI"),
+            (["AS_APA"],"output3_ASAPA"),(["ATI_APA"],"output4_ATIAPA")):
+        print("     "+command_list[0])
+        with open (os.path.join(run_dir,command_list[0]+".log"),"w") as log_f:
+            result=subprocess.run([sys.executable,os.path.abspath(__file__)]+command_list+["-n",thread],cwd=run_dir,env=e2e_env,stdout=log_f,stderr=subprocess.STDOUT)
+        if result.returncode!=0 or not os.path.exists(os.path.join(run_dir,command_outdir,"run_report.json")):
+            print("ERROR, "+command_list[0]+" failed, see ./output_e2e/run/"+command_list[0]+".log");exit()
+        with open (os.path.join(run_dir,command_outdir,"run_report.json"),"r",encoding="utf-8") as f:
+            e2e_step_list+=json.load(f)["steps"]
+    dict_checksum={x:get_file_sha1(os.path.join(run_dir,x)) for x in e2e_checksum_list}
+    e2e_report={"scale":e2e_scale,"steps":e2e_step_list,"checksum":dict_checksum}
+    with open (os.path.join(base_path,"output_e2e","e2e_report.json"),"w",encoding="utf-8") as f:
+        json.dump(e2e_report,f,indent=1)
+    baseline_path=os.path.join(base_path,"output_e2e","e2e_baseline.json")
+    baseline_report=None
+    if os.path.exists(baseline_path) and update!="yes":
+        with open (baseline_path,"r",encoding="utf-8") as f:
+            baseline_report=json.load(f)
+        if baseline_report["scale"]!=e2e_scale:
+            print("     The baseline was made with another scale, it is not compared.")
+            baseline_report=None
+    dict_base_wall={} if baseline_report is None else {onestep["step"]:onestep["wall_seconds"] for onestep in baseline_report["steps"]}
+    for onestep in e2e_step_list:
+        mark=""
+        if onestep["step"] in dict_base_wall and onestep["wall_seconds"]>1.2*dict_base_wall[onestep["step"]]+0.05:
+            mark="\tslower than baseline: %.3f Seconds"%dict_base_wall[onestep["step"]]
+        print("          "+onestep["step"]+": %.3f Seconds, %s records"%(onestep["wall_seconds"],onestep["record_num"])+mark)
+    if baseline_report is None:
+        with open (baseline_path,"w",encoding="utf-8") as f:
+            json.dump(e2e_report,f,indent=1)
+        print("     Baseline written to ./output_e2e/e2e_baseline.json")
+    else:
+        diff_list=[x for x in e2e_checksum_list if baseline_report["checksum"].get(x)!=dict_checksum[x]]
+        for x in diff_list:
+            print("     Output changed: "+x)
+        print("     Outputs compared with the baseline: "+str(len(e2e_checksum_list)-len(diff_list))+" same, "+str(len(diff_list))+" changed")
+    print("     ./output_e2e/e2e_report.json")
+
 print()
 #################################################################################################################################################################
 #################################################################################################################################################################
 print(time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(time.time())))      
 time_end=timeit.default_timer()
 print('All the running time: %.0f Seconds'%(time_end-time_start))
+write_run_report(os.path.join(base_path,outputfile,"run_report.json"),run_usage_start)
 
 
 
@@ -0,0 +1,178 @@
+# -*- coding: UTF-8 -*-
+# Stand-ins of the external tools used by "python asapa.py e2e", kept out of asapa.py so they are not part of the pipeline itself.
+# write_e2e_fake_tools(bin_dir) writes one executable Python script per tool into bin_dir, e2e puts bin_dir first on PATH.
+
+import os
+import sys
+
+#A subreads.bam of this run is a fasta, each read header carries its true alignment: ">name chr:pos:CIGAR:strand".
+#ccs, lima, pbmerge, samtools fasta and trim_isoseq_polyA pass the reads on, minimap2 writes the alignment of the header,
+#collapse_isoforms_by_sam.py groups the reads by intron chain and suppa.py lists the skipped exons (SE) of each gene.
+e2e_fake_tool_dict={}
+e2e_fake_tool_dict["ccs"]=r'''
+arg_list=sys.argv[1:]
+chunk_index,chunk_num=1,1
+if "--chunk" in arg_list:
+    chunk_index,chunk_num=[int(x) for x in arg_list[arg_list.index("--chunk")+1].split("/")]
+record_list=open(arg_list[0]).read().split(">")[1:]
+with open(arg_list[-1],"w") as f:
+    for i,record in enumerate(record_list):
+        if i%chunk_num==chunk_index-1:
+            f.write(">"+record)
+'''
+e2e_fake_tool_dict["pbmerge"]=r'''
+arg_list=sys.argv[1:]
+with open(arg_list[arg_list.index("-o")+1],"w") as f:
+    for path in arg_list[arg_list.index("-o")+2:]:
+        f.write(open(path).read())
+'''
+e2e_fake_tool_dict["pbindex"]=r'''
+open(sys.argv[1]+".pbi","w").close()
+'''
+e2e_fake_tool_dict["lima"]=r'''
+roi_path,primer_path,flnc_path=sys.argv[1:4]
+out_dir=os.path.dirname(flnc_path)
+if "AAGCAGTGGTATCAACGCAGAGTACATGGGG" in open(primer_path).read():
+    text=open(roi_path).read()
+    open(os.path.join(out_dir,"FLNC.primer_5p--primer_3p.bam"),"w").write(text)
+    zmw_list=[line[1:].split()[0].rsplit("/",1)[0] for line in text.splitlines() if line.startswith(">")]
+    with open(os.path.join(out_dir,"FLNC.lima.report"),"w") as f:
+        f.write("ZMW\tIndexFor\tIndexRev\n")
+        for zmw in zmw_list:
+            f.write(zmw+"\t0\t1\n")
+    with open(os.path.join(out_dir,"FLNC.lima.summary"),"w") as f:
+        f.write("ZMWs input                (A) : "+str(len(zmw_list))+"\n")
+        f.write("ZMWs above all thresholds (A) : "+str(len(zmw_list))+" (100%)\n")
+'''
+e2e_fake_tool_dict["trim_isoseq_polyA"]=r'''
+for line in sys.stdin:
+    sys.stdout.write(line if line.startswith(">") else line.rstrip("\n").rstrip("A")+"\n")
+sys.stderr.write("polyA trimmed\n")
+'''
+e2e_fake_tool_dict["samtools"]=r'''
+def read_text(path):
+    return sys.stdin.read() if path=="-" else open(path).read()
+def sort_sam(text_list):
+    header_list=[];record_list=[]
+    for n,text in enumerate(text_list):
+        for line in text.splitlines(True):
+            if line.startswith("@"):
+                if n==0:header_list.append(line)
+            else:
+                record_list.append(line)
+    chr_order={}
+    for line in header_list:
+        if line.startswith("@SQ"):
+            chr_order[line.split("\tSN:")[1].split("\t")[0]]=len(chr_order)
+    record_list.sort(key=lambda x:(chr_order.get(x.split("\t")[2],len(chr_order)),int(x.split("\t")[3]),x))
+    return "".join(header_list+record_list)
+def write_text(text,out_path):
+    if out_path is None:sys.stdout.write(text)
+    else:open(out_path,"w").write(text)
+arg_list=sys.argv[1:]
+path_list=[];out_path=None
+i=1
+while i<len(arg_list):
+    if arg_list[i] in ("-@","-o"):
+        if arg_list[i]=="-o":out_path=arg_list[i+1]
+        i+=2;continue
+    if arg_list[i]!="-" and arg_list[i].startswith("-"):
+        i+=1;continue
+    path_list.append(arg_list[i]);i+=1
+if arg_list[0]=="fasta":	write_text(read_text(path_list[0]),None)
+elif arg_list[0]=="index":	open(path_list[0]+".bai","w").close()
+elif arg_list[0]=="view":	write_text(read_text(path_list[0] if path_list else "-"),out_path)
+elif arg_list[0]=="sort":	write_text(sort_sam([read_text(path_list[0] if path_list else "-")]),out_path)
+elif arg_list[0]=="merge":	write_text(sort_sam([read_text(x) for x in path_list[1:]]),path_list[0])
+'''
+e2e_fake_tool_dict["minimap2"]=r'''
+def read_chr_len(path):
+    chr_len_list=[]
+    with open(path) as f:
+        for line in f:
+            if line.startswith(">"):chr_len_list.append([line[1:].split()[0],0])
+            elif line.startswith("SQ\t"):chr_len_list.append([line.split("\t")[1],int(line.split("\t")[2])])
+            elif chr_len_list:chr_len_list[-1][1]+=len(line.strip())
+    return chr_len_list
+arg_list=sys.argv[1:]
+if "-d" in arg_list:
+    with open(arg_list[arg_list.index("-d")+1],"w") as f:
+        for name,length in read_chr_len(arg_list[-1]):
+            f.write("SQ\t"+name+"\t"+str(length)+"\n")
+    sys.exit()
+for name,length in read_chr_len(arg_list[-2]):
+    print("@SQ\tSN:"+name+"\tLN:"+str(length))
+print("@PG\tID:minimap2\tPN:minimap2")
+for record in open(arg_list[-1]).read().split(">")[1:]:
+    header=record.split("\n",1)[0].split()
+    seq=record.split("\n",1)[1].replace("\n","")
+    chromosome,pos,cigar,strand=header[1].split(":")
+    print("\t".join([header[0],"16" if strand=="-" else "0",chromosome,pos,"60",cigar,"*","0","0",seq,"*"]))
+'''
+e2e_fake_tool_dict["collapse_isoforms_by_sam.py"]=r'''
+import re
+arg_list=sys.argv[1:]
+sam_path=arg_list[arg_list.index("-s")+1]
+out_prefix=arg_list[arg_list.index("-o")+1]
+dict_isoform={}
+for line in open(sam_path):
+    if line.startswith("@"):continue
+    col=line.split("\t")
+    pos=int(col[3]);exon_list=[[pos,pos-1]]
+    for length,op in re.findall(r"(\d+)([MIDNSHP=X])",col[5]):
+        if op in "MD=X":exon_list[-1][1]+=int(length)
+        elif op=="N":exon_list.append([exon_list[-1][1]+int(length)+1,exon_list[-1][1]+int(length)])
+    strand="-" if int(col[1])&16 else "+"
+    key=(col[2],strand,tuple((exon_list[x][1],exon_list[x+1][0]) for x in range(len(exon_list)-1)))
+    isoform=dict_isoform.setdefault(key,[exon_list[0][0],exon_list[-1][1],[]])
+    isoform[0]=min(isoform[0],exon_list[0][0]);isoform[1]=max(isoform[1],exon_list[-1][1]);isoform[2].append(col[0])
+gene_list=[]
+for key,(start,end,read_list) in sorted(dict_isoform.items(),key=lambda x:(x[0][0],x[1][0],x[0])):
+    if gene_list and gene_list[-1][0]==key[0] and gene_list[-1][1]==key[1] and start<=gene_list[-1][2]:
+        gene_list[-1][2]=max(gene_list[-1][2],end);gene_list[-1][3].append((key,start,end,read_list))
+    else:
+        gene_list.append([key[0],key[1],end,[(key,start,end,read_list)]])
+with open(out_prefix+".collapsed.gff","w") as f, open(out_prefix+".collapsed.group.txt","w") as f2:
+    for gene_index,(chromosome,strand,gene_end,isoform_list) in enumerate(gene_list):
+        gene="PB."+str(gene_index+1)
+        for transcript_index,(key,start,end,read_list) in enumerate(isoform_list):
+            transcript=gene+"."+str(transcript_index+1)
+            attribute='transcript_id "'+transcript+'"; gene_id "'+gene+'";'
+            f.write("\t".join([chromosome,"PacBio","transcript",str(start),str(end),".",strand,".",attribute])+"\n")
+            exon_start=start
+            for intron_start,intron_end in key[2]:
+                f.write("\t".join([chromosome,"PacBio","exon",str(exon_start),str(intron_start),".",strand,".",attribute])+"\n")
+                exon_start=intron_end
+            f.write("\t".join([chromosome,"PacBio","exon",str(exon_start),str(end),".",strand,".",attribute])+"\n")
+            f2.write(transcript+"\t"+",".join(sorted(read_list))+"\n")
+'''
+e2e_fake_tool_dict["suppa.py"]=r'''
+arg_list=sys.argv[1:]
+dict_gene={}
+for line in open(arg_list[arg_list.index("-i")+1]):
+    col=line.rstrip("\n").split("\t")
+    if col[2]!="exon":continue
+    transcript=col[8].split('"')[1];gene=col[8].split('"')[3]
+    dict_gene.setdefault((col[0],col[6],gene),{}).setdefault(transcript,[]).append((int(col[3]),int(col[4])))
+with open(arg_list[arg_list.index("-o")+1]+"_SE_strict.ioe","w") as f:
+    f.write("seqname\tgene_id\tevent_id\talternative_transcripts\ttotal_transcripts\n")
+    for (chromosome,strand,gene),dict_transcript in sorted(dict_gene.items(),key=lambda x:x[0][2]):
+        dict_intron={transcript:set((exon_list[x][1],exon_list[x+1][0]) for x in range(len(exon_list)-1)) for transcript,exon_list in dict_transcript.items()}
+        event_set=set()
+        for exon_list in dict_transcript.values():
+            for x in range(1,len(exon_list)-1):
+                event_set.add((exon_list[x-1][1],exon_list[x][0],exon_list[x][1],exon_list[x+1][0]))
+        for e1,s2,e2,s3 in sorted(event_set):
+            include_list=sorted(t for t,intron_set in dict_intron.items() if (e1,s2) in intron_set and (e2,s3) in intron_set)
+            skip_list=sorted(t for t,intron_set in dict_intron.items() if (e1,s3) in intron_set)
+            if include_list and skip_list:
+                event_id=gene+";SE:"+chromosome+":"+str(e1)+"-"+str(s2)+":"+str(e2)+"-"+str(s3)+":"+strand
+                f.write(chromosome+"\t"+gene+"\t"+event_id+"\t"+",".join(include_list)+"\t"+",".join(include_list+skip_list)+"\n")
+'''
+
+def write_e2e_fake_tools(bin_dir):
+    os.makedirs(bin_dir,exist_ok=True)
+    for tool_name,tool_script in e2e_fake_tool_dict.items():
+        with open (os.path.join(bin_dir,tool_name),"w",encoding="utf-8") as f:
+            f.write("#!"+sys.executable+"\nimport sys\nimport os\n"+tool_script)
+        os.chmod(os.path.join(bin_dir,tool_name),0o755)